@@ -1,11 +1,21 @@
-import shutil
 from datetime import datetime
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from database import get_users, save_users, get_movies, save_movies, get_channels, save_channels, get_admins, save_admins, USERS_FILE, MOVIES_FILE, CHANNELS_FILE
+from database import run_db, user_exists, get_user_counts, get_banned_users, get_admins, get_admin_role, add_admin, remove_admin, get_backend, export_json_snapshots, backup_sqlite, DATA_DIR
 from config import ADMIN_IDS
-
+from catalog import get_catalog, catalog_page, code_at, short_id, resolve_code
+from cache import user_state
+from subscription import get_channels, membership_stats
+from outbox import outbox, PRIORITY_MAINTENANCE
+from utils import pagination_rows, keyboard_cache_stats
+from search import index_stats
+from request_context import query_stats
+from router import callback_router
+from inline import inline_cache_stats
+from trending import trending_stats
+
+# Admin panel huquqi faqat config dagi ADMIN_IDS dan (DB dagi rollar menyuni ko'rsatish uchun)
 def is_admin(user_id: str) -> bool:
     return user_id in ADMIN_IDS
 
@@ -23,17 +33,17 @@ async def show_admin_panel(query, user_id: str):
         await query.answer("🚫 Ruxsat yo'q!", show_alert=True)
         return
 
-    total_users = len(get_users())
-    total_movies = len(get_movies())
-    total_channels = len(get_channels())
-    total_admins = len(get_admins())
-
-    users = get_users()
-    movies = get_movies()
-    banned = sum(1 for u in users.values() if u.get("banned"))
+    counts = await run_db(get_user_counts)
+    movies = get_catalog()
+    total_users = counts["users"]
+    total_movies = len(movies)
+    total_channels = len(await run_db(get_channels))
+    total_admins = counts["admins"]
+    banned = counts["banned"]
     total_views = sum(m.get("views", 0) for m in movies.values())
 
     today = datetime.now().strftime("%d.%m.%Y")
+    cache_stats = user_state.stats()
 
     if is_super_admin(user_id):
         role = "👑 SUPER ADMIN"
@@ -56,6 +66,8 @@ async def show_admin_panel(query, user_id: str):
         f"├ 📢 Kanallar: <code>{total_channels}</code>" + NL +
         f"├ 👮 Adminlar: <code>{total_admins}</code>" + NL +
         f"└ 🚫 Bloklangan: <code>{banned}</code>" + NL + NL +
+        f"⚡️ Kesh: <code>{cache_stats['hits']}</code> hit / <code>{cache_stats['misses']}</code> miss "
+        f"(<code>{cache_stats['hit_rate']:.0%}</code>)" + NL + NL +
         f"⚡️ <i>Quyidagi tugmalardan foydalaning:</i>"
     )
 
@@ -220,11 +232,12 @@ async def process_add_movie(update, context):
             await update.message.reply_text("❌ <b>Kod kiriting!</b>", parse_mode='HTML')
             return
 
-        code = text.lower()
-        movies = get_movies()
+        # Kod kiritilgandek saqlanadi; normalize_code faqat qidiruv kaliti (code_norm)
+        code = text.strip().lower()
+        existing = resolve_code(code)
 
-        if code in movies:
-            movie_name = movies[code].get('name', 'Nomalum')
+        if existing is not None:
+            movie_name = get_catalog().get(existing, {}).get('name', 'Nomalum')
             await update.message.reply_text(
                 f"❌ <b>Bu kod mavjud!</b>" + NL + NL +
                 f"🎬 {movie_name}" + NL +
@@ -264,7 +277,8 @@ async def process_add_movie(update, context):
         genre = "" if text.lower() == "skip" else text
 
         try:
-            movies_add_movie(
+            saved = await run_db(
+                movies_add_movie,
                 user_data["code"],
                 user_data["name"],
                 genre,
@@ -272,6 +286,8 @@ async def process_add_movie(update, context):
                 user_data["message_id"],
                 str(update.effective_user.id)
             )
+            if not saved:
+                raise RuntimeError("Kino bazaga saqlanmadi")
 
             context.user_data.pop("adding_movie", None)
 
@@ -310,13 +326,19 @@ async def process_add_movie(update, context):
 # Har sahifada ko'rsatiladigan kinolar soni
 MOVIES_PER_PAGE = 20
 
-async def start_delete_movie(query, context, page: int = 1):
-    """Kino o'chirish paneli - Pagination bilan"""
+def _delete_callback(prefix: str, code: str, after: str = None) -> str:
+    """{prefix}{kod}:{sahifa kursori} - ikkalasi short_id, 64 bayt chegarasiga sig'adi.
+    after - sahifadan oldingi kod (birinchi sahifada bo'sh)"""
+    return f"{prefix}{short_id(code)}:{short_id(after) if after else ''}"
+
+async def start_delete_movie(query, context, page: int = 1, after: str = None, before: str = None):
+    """Kino o'chirish paneli - kod bo'yicha tartiblangan, keyset sahifalash.
+    after/before - oldingi sahifaning chetidagi kod, page - to'g'ridan-to'g'ri o'tish"""
     if not is_admin(str(query.from_user.id)):
         await query.answer("🚫 Ruxsat yo'q!", show_alert=True)
         return
 
-    movies = get_movies()
+    movies = get_catalog()
     if not movies:
         from utils import get_admin_keyboard
         await query.edit_message_text(
@@ -326,23 +348,15 @@ async def start_delete_movie(query, context, page: int = 1):
         )
         return
 
-    # Pagination hisoblash
-    total_movies = len(movies)
+    # Faqat joriy sahifa olinadi (chegaradan chiqqan page oxirgi sahifaga tushadi)
+    current_movies, start_idx, total_movies = catalog_page(after, before, (page - 1) * MOVIES_PER_PAGE, MOVIES_PER_PAGE)
+    if not current_movies:
+        # Oxirgi sahifadagi yagona kino o'chirilgan - oxirgi sahifani ko'rsatamiz
+        current_movies, start_idx, total_movies = catalog_page(offset=total_movies, limit=MOVIES_PER_PAGE)
     total_pages = (total_movies + MOVIES_PER_PAGE - 1) // MOVIES_PER_PAGE  # Yuqoriga yaxlitlash
-
-    # Sahifa chegaralarini tekshirish
-    if page < 1:
-        page = 1
-    if page > total_pages:
-        page = total_pages
-
-    # Joriy sahifadagi kinolarni olish
-    start_idx = (page - 1) * MOVIES_PER_PAGE
-    end_idx = start_idx + MOVIES_PER_PAGE
-
-    # Kinolarni ro'yxatga olish (sorted qilib)
-    movie_items = list(movies.items())
-    current_movies = movie_items[start_idx:end_idx]
+    page = start_idx // MOVIES_PER_PAGE + 1
+    # O'chirgandan keyin shu sahifaga qaytish uchun
+    cursor = code_at(start_idx - 1)
 
     # Klaviatura yaratish
     keyboard = []
@@ -356,35 +370,15 @@ async def start_delete_movie(query, context, page: int = 1):
 
         keyboard.append([InlineKeyboardButton(
             f"🎬 {display_name} ({code}) 👁{views}", 
-            callback_data=f"del_movie_{code}_page_{page}"
+            callback_data=_delete_callback("del_movie_", code, cursor)
         )])
 
-    # Pagination tugmalari (bir qatorda)
-    nav_buttons = []
-
-    # Oldingi sahifa
-    if page > 1:
-        nav_buttons.append(InlineKeyboardButton(
-            "◀️ Oldingi", 
-            callback_data=f"delete_movie_page_{page-1}"
-        ))
-
-    # Joriy sahifa / Jami
-    nav_buttons.append(InlineKeyboardButton(
-        f"📄 {page}/{total_pages}", 
-        callback_data="ignore"
+    # Pagination tugmalari: oldingi/keyingi va sahifaga o'tish
+    keyboard.extend(pagination_rows(
+        current_movies, start_idx, total_movies, MOVIES_PER_PAGE, lambda n: f"delete_movie_page_{n}",
+        after="delete_movie_n_", before="delete_movie_p_", cursor=short_id
     ))
 
-    # Keyingi sahifa
-    if page < total_pages:
-        nav_buttons.append(InlineKeyboardButton(
-            "Keyingi ▶️", 
-            callback_data=f"delete_movie_page_{page+1}"
-        ))
-
-    if nav_buttons:
-        keyboard.append(nav_buttons)
-
     # Statistika tugmasi
     keyboard.append([InlineKeyboardButton(
         f"📊 Jami: {total_movies} ta kino", 
@@ -408,41 +402,9 @@ async def start_delete_movie(query, context, page: int = 1):
     )
 
 
-async def process_delete_movie_callback(query, context):
-    """Kino o'chirish callbacklarini qayta ishlash"""
-    data = query.data
-
-    # Sahifa almashish
-    if data.startswith("delete_movie_page_"):
-        page = int(data.split("_")[-1])
-        await start_delete_movie(query, context, page)
-        await query.answer(f"📄 Sahifa {page}")
-        return
-
-    # Kino o'chirish tasdiqlash
-    if data.startswith("del_movie_"):
-        # Format: del_movie_{code}_page_{page} yoki del_movie_{code}
-        parts = data.split("_")
-        movie_code = parts[2]
-        page = 1
-
-        # Agar page bo'lsa, uni olish
-        if len(parts) >= 5 and parts[3] == "page":
-            page = int(parts[4])
-
-        await confirm_delete_movie(query, context, movie_code, page)
-        return
-
-    # Tasdiqlashdan keyin o'chirish
-    if data.startswith("confirm_delete_"):
-        movie_code = data.replace("confirm_delete_", "")
-        await final_delete_movie(query, context, movie_code)
-        return
-
-
-async def confirm_delete_movie(query, context, movie_code: str, page: int = 1):
-    """Kino o'chirishni tasdiqlash oynasi"""
-    movies = get_movies()
+async def confirm_delete_movie(query, context, movie_code: str, after: str = None):
+    """Kino o'chirishni tasdiqlash oynasi. after - ro'yxatdagi sahifa kursori"""
+    movies = get_catalog()
 
     if movie_code not in movies:
         await query.answer("❌ Kino topilmadi!", show_alert=True)
@@ -453,8 +415,9 @@ async def confirm_delete_movie(query, context, movie_code: str, page: int = 1):
     views = movie_data.get('views', 0)
 
     keyboard = [
-        [InlineKeyboardButton("✅ Ha, o'chirish", callback_data=f"confirm_delete_{movie_code}")],
-        [InlineKeyboardButton("❌ Yo'q, bekor qilish", callback_data=f"delete_movie_page_{page}")]
+        [InlineKeyboardButton("✅ Ha, o'chirish", callback_data=_delete_callback("confirm_delete_", movie_code, after))],
+        [InlineKeyboardButton("❌ Yo'q, bekor qilish",
+                              callback_data=f"delete_movie_n_{short_id(after)}" if after else "delete_movie")]
     ]
 
     text = (
@@ -474,49 +437,84 @@ async def confirm_delete_movie(query, context, movie_code: str, page: int = 1):
     await query.answer()
 
 
-async def final_delete_movie(query, context, movie_code: str):
-    """Kino o'chirishni yakunlash"""
+async def final_delete_movie(query, context, movie_code: str, after: str = None):
+    """Kino o'chirishni yakunlash va ro'yxatning o'sha sahifasiga qaytish"""
     from movies import delete_movie as remove_movie
 
-    if remove_movie(movie_code):
+    if movie_code is not None and await run_db(remove_movie, movie_code):
         await query.answer("✅ Kino o'chirildi!", show_alert=True)
-        # O'chirgandan keyin yana o'sha sahifaga qaytish
-        # Agar o'sha sahifada kinolar qolmasa, oldingi sahifaga o'tish
-        movies = get_movies()
-        total_pages = (len(movies) + MOVIES_PER_PAGE - 1) // MOVIES_PER_PAGE
-
-        # Joriy sahifani aniqlash (avvalgi callbackdan)
-        # Hozircha 1-sahifaga qaytish
-        await start_delete_movie(query, context, page=1)
+        # Kursor sahifadan oldingi kod - o'chirilgan kino o'rniga keyingisi suriladi.
+        # Sahifa bo'shab qolsa start_delete_movie oxirgi sahifani ko'rsatadi
+        await start_delete_movie(query, context, after=after)
     else:
         await query.answer("❌ Xatolik yuz berdi!", show_alert=True)
 
 # ==================== STATISTIKA ====================
 
+def _outbox_stats_text() -> str:
+    stats = outbox.stats()
+    lines = []
+    for name, wait in stats["waits"].items():
+        lines.append(
+            f"├ {name}: <code>{stats['depth'][name]}</code> navbatda, "
+            f"o'rtacha <code>{wait['avg'] * 1000:.0f}</code> ms / max <code>{wait['max'] * 1000:.0f}</code> ms"
+        )
+    lines.append(f"├ RetryAfter: <code>{stats['retry_after']}</code>")
+    inline_stats = inline_cache_stats()
+    lines.append(
+        f"├ Inline kesh: <code>{inline_stats['hits']}</code> hit / <code>{inline_stats['misses']}</code> miss "
+        f"(<code>{inline_stats['hit_rate']:.0%}</code>)"
+    )
+    sub_stats = membership_stats()
+    lines.append(
+        f"├ Obuna keshi: <code>{sub_stats['hits']}</code> hit / <code>{sub_stats['misses']}</code> miss "
+        f"(<code>{sub_stats['hit_rate']:.0%}</code>)"
+    )
+    keyboards = keyboard_cache_stats()
+    if keyboards:
+        lines.append("├ Klaviatura keshi: " + ", ".join(f"{name} <code>{size}</code>" for name, size in keyboards.items()))
+    index = index_stats()
+    lines.append(
+        f"├ Qidiruv indeksi: <code>{index['movies']}</code> kino, <code>{index['tokens']}</code> token, "
+        f"<code>{index['trigrams']}</code> trigramm"
+    )
+    trend = trending_stats()
+    lines.append(f"├ Trend: <code>{trend['movies']}</code> kino 7 kunda, <code>{trend['buckets']}</code> soatlik bucket")
+    queries = query_stats()
+    lines.append(
+        f"└ DB chaqiruvlari: <code>{queries['avg']:.1f}</code> / update "
+        f"(max <code>{queries['max']}</code>, {queries['updates']} update)"
+    )
+    unmatched = callback_router.unmatched_report(5)
+    if unmatched:
+        lines.append("")
+        lines.append("❓ <b>Noma'lum callbacklar</b>")
+        lines.extend(f"• <code>{data}</code> — {count}" for data, count in unmatched)
+    return NL.join(lines)
+
 async def show_stats(query):
     if not is_admin(str(query.from_user.id)):
         await query.answer("🚫 Ruxsat yo'q!", show_alert=True)
         return
 
-    users = get_users()
-    movies = get_movies()
-    channels = get_channels()
-    admins = get_admins()
+    counts = await run_db(get_user_counts)
+    movies = get_catalog()
+    channels = await run_db(get_channels)
 
-    total_users = len(users)
     total_movies = len(movies)
     total_views = sum(m.get("views", 0) for m in movies.values())
-    banned = sum(1 for u in users.values() if u.get("banned"))
 
     text = (
         f"📊 <b>STATISTIKA</b>" + NL +
         f"➖➖➖➖➖➖➖➖➖➖" + NL + NL +
-        f"👥 Foydalanuvchilar: <code>{total_users}</code>" + NL +
+        f"👥 Foydalanuvchilar: <code>{counts['users']}</code>" + NL +
         f"🎬 Kinolar: <code>{total_movies}</code>" + NL +
         f"👁 Ko'rishlar: <code>{total_views}</code>" + NL +
         f"📢 Kanallar: <code>{len(channels)}</code>" + NL +
-        f"👮 Adminlar: <code>{len(admins)}</code>" + NL +
-        f"🚫 Bloklangan: <code>{banned}</code>"
+        f"👮 Adminlar: <code>{counts['admins']}</code>" + NL +
+        f"🚫 Bloklangan: <code>{counts['banned']}</code>" + NL + NL +
+        f"📮 <b>Navbat</b>" + NL +
+        _outbox_stats_text()
     )
 
     from utils import get_admin_keyboard
@@ -549,25 +547,26 @@ async def process_broadcast(update, context):
 
     del context.user_data["broadcasting"]
 
-    users = get_users()
-    sent = 0
-    failed = 0
+    from broadcast import start_broadcast_job
 
     status = await update.message.reply_text("📤 Yuborilmoqda...", parse_mode='HTML')
 
-    for user_id in users:
-        try:
-            await update.message.copy(chat_id=int(user_id))
-            sent += 1
-        except:
-            failed += 1
-
-    await status.edit_text(
-        f"✅ <b>Yakunlandi!</b>" + NL + NL +
-        f"✓ Muvaffaqiyatli: <code>{sent}</code>" + NL +
-        f"✗ Xatolik: <code>{failed}</code>",
-        parse_mode='HTML'
-    )
+    # Yuborish fonda ketadi - handler darhol bo'shaydi, progress status xabarida
+    job_id = await start_broadcast_job(context.bot, update.message, status, str(update.effective_user.id))
+    if job_id is None:
+        await status.edit_text("❌ <b>Broadcast yaratilmadi!</b>", parse_mode='HTML')
+
+async def cancel_broadcast_handler(query, job_id: str):
+    if not is_admin(str(query.from_user.id)):
+        await query.answer("🚫 Ruxsat yo'q!", show_alert=True)
+        return
+
+    from broadcast import cancel_broadcast
+
+    if job_id.isdigit() and await cancel_broadcast(int(job_id)):
+        await query.answer("⛔ Broadcast to'xtatilmoqda...", show_alert=True)
+    else:
+        await query.answer("❌ Broadcast topilmadi yoki tugagan", show_alert=True)
 
 # ==================== KANALLAR ====================
 
@@ -576,7 +575,7 @@ async def manage_channels(query):
         await query.answer("🚫 Ruxsat yo'q!", show_alert=True)
         return
 
-    channels = get_channels()
+    channels = await run_db(get_channels)
 
     if not channels:
         text = "🔒 <b>MAJBURIY OBUNA</b>" + NL + NL + "📭 Kanallar yo'q"
@@ -623,7 +622,7 @@ async def process_add_channel(update, context):
         if not invite_link and chat.username:
             invite_link = f"https://t.me/{chat.username}"
 
-        add_channel(str(chat.id), chat.title, invite_link)
+        await run_db(add_channel, str(chat.id), chat.title, invite_link)
         del context.user_data["adding_channel"]
 
         await update.message.reply_text(
@@ -639,7 +638,7 @@ async def process_add_channel(update, context):
 async def remove_channel_handler(query, channel_id: str):
     from subscription import remove_channel
 
-    if remove_channel(channel_id):
+    if await run_db(remove_channel, channel_id):
         await query.answer("✅ Kanal o'chirildi!", show_alert=True)
 
     await manage_channels(query)
@@ -670,7 +669,7 @@ async def process_add_limit(update, context):
     if step == "user":
         user_id = update.message.text.strip()
 
-        if user_id not in get_users():
+        if not await run_db(user_exists, user_id):
             await update.message.reply_text("❌ Foydalanuvchi topilmadi!", parse_mode='HTML')
             return
 
@@ -683,7 +682,7 @@ async def process_add_limit(update, context):
         try:
             amount = int(update.message.text.strip())
             target = context.user_data["adding_limit"]["target_user"]
-            add_limit(target, amount)
+            await run_db(add_limit, target, amount)
             del context.user_data["adding_limit"]
 
             await update.message.reply_text(
@@ -724,7 +723,7 @@ async def process_ban_user(update, context):
         del context.user_data["banning_user"]
         return
 
-    ban_user(user_id)
+    await run_db(ban_user, user_id)
     del context.user_data["banning_user"]
 
     await update.message.reply_text(f"🚫 <b>{user_id}</b> bloklandi!", parse_mode='HTML')
@@ -734,8 +733,8 @@ async def start_unban_user(query):
         await query.answer("🚫 Ruxsat yo'q!", show_alert=True)
         return
 
-    users = get_users()
-    banned = [(uid, u) for uid, u in users.items() if u.get("banned")]
+    # Faqat ko'rsatiladigan 20 tasi va umumiy soni
+    banned = await run_db(get_banned_users, 20)
 
     if not banned:
         from utils import get_admin_keyboard
@@ -746,9 +745,11 @@ async def start_unban_user(query):
         )
         return
 
+    total_banned = (await run_db(get_user_counts))["banned"]
+
     keyboard = []
-    for uid, u in banned[:20]:
-        name = u.get("first_name", "Nomlum")
+    for uid, name in banned:
+        name = name or "Nomlum"
         keyboard.append([InlineKeyboardButton(
             f"♻️ {name[:20]} ({uid})", 
             callback_data=f"unban_user_{uid}"
@@ -758,7 +759,7 @@ async def start_unban_user(query):
 
     await query.edit_message_text(
         "♻️ <b>UNBAN</b>" + NL + NL +
-        f"Jami: <code>{len(banned)}</code>" + NL + NL +
+        f"Jami: <code>{total_banned}</code>" + NL + NL +
         "Tanlang:",
         reply_markup=InlineKeyboardMarkup(keyboard), 
         parse_mode='HTML'
@@ -767,7 +768,7 @@ async def start_unban_user(query):
 async def unban_user_handler(query, user_id: str):
     from users import unban_user
 
-    unban_user(user_id)
+    await run_db(unban_user, user_id)
     await query.answer("✅ Blokdan chiqarildi!", show_alert=True)
     await start_unban_user(query)
 
@@ -779,8 +780,13 @@ async def create_backup(query):
         return
 
     try:
+        import os
+
         backup_dir = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        shutil.copytree("data", backup_dir)
+        # Ochiq bazani fayl sifatida nusxalash buzilgan nusxa berishi mumkin
+        await run_db(export_json_snapshots, backup_dir)
+        if get_backend() == "sqlite":
+            await run_db(backup_sqlite, os.path.join(backup_dir, "bot.db"))
 
         from utils import get_admin_keyboard
         await query.edit_message_text(
@@ -805,11 +811,15 @@ async def export_data(query):
 
     import os
 
+    files = await run_db(export_json_snapshots, os.path.join(DATA_DIR, "export"))
+
     sent = 0
-    for filename in [USERS_FILE, MOVIES_FILE, CHANNELS_FILE]:
-        if os.path.exists(filename):
+    for filename in files:
+        if os.path.basename(filename) in ("users.json", "movies.json", "channels.json"):
             with open(filename, 'rb') as f:
-                await query.message.reply_document(f)
+                await query.get_bot().send_document(
+                    query.message.chat_id, f, rate_limit_args=PRIORITY_MAINTENANCE
+                )
                 sent += 1
 
     from utils import get_admin_keyboard
@@ -848,20 +858,12 @@ async def process_add_admin(update, context):
         del context.user_data["adding_admin"]
         return
 
-    admins = get_admins()
-
-    if new_id in admins:
+    if await run_db(get_admin_role, new_id) is not None:
         await update.message.reply_text("❌ Allaqachon admin!", parse_mode='HTML')
         del context.user_data["adding_admin"]
         return
 
-    admins[new_id] = {
-        "role": "admin",
-        "added_at": datetime.now().isoformat(),
-        "added_by": str(update.effective_user.id),
-        "source": "manual"
-    }
-    save_admins(admins)
+    await run_db(add_admin, new_id, "admin", str(update.effective_user.id), "manual")
     del context.user_data["adding_admin"]
 
     await update.message.reply_text(f"✅ <b>{new_id}</b> admin qilindi!", parse_mode='HTML')
@@ -871,7 +873,7 @@ async def start_remove_admin(query):
         await query.answer("🚫 Faqat Super Admin!", show_alert=True)
         return
 
-    admins = get_admins()
+    admins = await run_db(get_admins)
     removable = [(aid, a) for aid, a in admins.items() 
                  if a.get("source") == "manual" and aid != str(query.from_user.id)]
 
@@ -898,27 +900,10 @@ async def start_remove_admin(query):
     )
 
 async def remove_admin_handler(query, admin_id: str):
-    admins = get_admins()
+    admins = await run_db(get_admins)
 
     if admin_id in admins and admins[admin_id].get("source") == "manual":
-        del admins[admin_id]
-        save_admins(admins)
+        await run_db(remove_admin, admin_id)
         await query.answer("✅ Admin o'chirildi!", show_alert=True)
 
     await start_remove_admin(query)
-
-
-# ==================== ESKI KOD BILAN MOSLIK ====================
-
-async def delete_movie(query, movie_code: str):
-    """Eski kod bilan moslik uchun - kino o'chirish"""
-    # Bu funksiya eski callbacklar uchun saqlanib qolgan
-    # Aslida final_delete_movie ni chaqiradi
-    from movies import delete_movie as remove_movie
-
-    if remove_movie(movie_code):
-        await query.answer("✅ Kino o'chirildi!", show_alert=True)
-        # O'chirgandan keyin ro'yxatni yangilash
-        await start_delete_movie(query, None, page=1)
-    else:
-        await query.answer("❌ Xatolik yuz berdi!", show_alert=True)
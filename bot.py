@@ -1,26 +1,43 @@
 import logging
+import time
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
+    InlineQueryHandler,
+    TypeHandler,
     ContextTypes,
     filters
 )
 
-from config import BOT_TOKEN, BOT_USERNAME, ADMIN_IDS
-from database import get_users, get_movies
+from config import (
+    BOT_TOKEN, BOT_USERNAME, ADMIN_IDS, CATALOG_LISTEN, BOT_MODE, BOT_API_URL,
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, DROP_PENDING_UPDATES
+)
+from database import init_database, user_exists, run_db, close_pool
+from request_context import begin, finish
+from catalog import get_catalog, load_catalog, start_listener, stop_listener, resolve_code, code_by_short_id
 from users import (
     get_or_create_user, is_admin, is_banned, is_super_admin,
-    check_limit, decrease_limit, add_referral, add_to_history,
+    load_request_user, get_current_user,
+    consume_limit, add_referral, add_to_history,
     toggle_favorite, add_limit, ban_user, unban_user
 )
 from movies import (
-    get_random_movie, get_trending_movies, search_movies,
-    get_movies_by_genre, increment_movie_views, delete_movie
+    get_random_movie, get_ranked_movies, search_movies,
+    get_movies_by_genre, increment_movie_views, delete_movie, search_uses_db
+)
+from search import suggest
+from inline import inline_query, movie_code_from_payload
+from subscription import (
+    check_subscription, load_members, channel_key, is_member_status, record_member,
+    start_member_pruning, stop_member_pruning
 )
-from subscription import check_subscription
+from view_counter import start_flush_loop, stop_flush_loop
+from trending import load_trending
 from utils import (
     get_main_keyboard, get_movie_keyboard, get_admin_keyboard,
     get_genres_keyboard, get_catalog_keyboard, get_subscription_keyboard,
@@ -28,16 +45,19 @@ from utils import (
 )
 from admin import (
     show_admin_panel, start_add_movie, process_add_movie,
-    start_delete_movie, process_delete_movie_callback,
-    confirm_delete_movie, final_delete_movie, delete_movie,
+    start_delete_movie, confirm_delete_movie, final_delete_movie,
     show_stats, start_broadcast, process_broadcast,
     manage_channels, start_add_channel, process_add_channel,
     remove_channel_handler, start_add_limit, process_add_limit,
     start_ban_user, process_ban_user, start_unban_user,
     unban_user_handler, create_backup, export_data,
     start_add_admin, process_add_admin, start_remove_admin,
-    remove_admin_handler
+    remove_admin_handler, cancel_broadcast_handler
 )
+from broadcast import resume_broadcasts, stop_broadcasts
+from outbox import outbox
+from update_processor import PerUserUpdateProcessor
+from router import callback_router
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -45,6 +65,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ==================== UPDATE KONTEKSTI ====================
+
+async def open_request_context(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handlerlardan oldin (group -1): foydalanuvchi qatori, roli va ban holati
+    bir marta yuklanadi; users/utils/admin keyin shu nusxadan o'qiydi"""
+    if update.effective_user is None or not (update.message or update.callback_query):
+        return
+    request = begin(update.effective_user.id)
+    context.request = request
+    await run_db(load_request_user, request)
+
+async def close_request_context(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handlerlardan keyin: update davomidagi DB chaqiruvlarini hisobga olish"""
+    request = finish()
+    if request is not None:
+        logger.debug(
+            f"Update {update.update_id}: {request.queries} ta DB chaqiruvi, "
+            f"{(time.perf_counter() - request.started) * 1000:.1f} ms"
+        )
+
 # ==================== START - CHIROYLI ====================
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -56,11 +96,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Referal
         if context.args and len(context.args) > 0 and context.args[0].startswith("ref"):
             referrer_id = context.args[0].replace("ref", "")
-            users = get_users()
-            if referrer_id in users and referrer_id != user_id and user_id not in users:
-                add_referral(referrer_id)
+            if (referrer_id != user_id
+                    and await run_db(user_exists, referrer_id)
+                    and not get_current_user(user_id)):
+                await run_db(add_referral, referrer_id)
         
-        get_or_create_user(user_id, user.username, first_name)
+        await run_db(get_or_create_user, user_id, user.username, first_name)
         
         if is_banned(user_id):
             await update.message.reply_text(
@@ -80,8 +121,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(text, reply_markup=get_subscription_keyboard(), parse_mode='HTML')
             return
         
+        # Deep link: /start m_<kod> (inline natijalardagi "Ko'rish" tugmasi)
+        if context.args:
+            movie_code = movie_code_from_payload(context.args[0])
+            if movie_code is not None:
+                await send_movie(update, context, movie_code)
+                return
+        
         # Asosiy xush kelibsiz
-        user_data = get_users().get(user_id, {})
+        user_data = get_current_user(user_id)
         limit = "♾️ Cheksiz" if is_admin(user_id) else f"🎟 {user_data.get('limit', 5)} ta"
         
         welcome_text = (
@@ -148,14 +196,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await process_add_admin(update, context)
             return
         
-        # Kino kodi
-        movies = get_movies()
-        if text in movies:
-            await send_movie(update, context, text)
+        # Kino kodi (registr, bo'shliq va o'xshash kirill harflari farqlanmaydi)
+        code = resolve_code(text)
+        if code is not None:
+            await send_movie(update, context, code)
             return
         
         # Qidiruv
-        results = search_movies(text)
+        results = await run_db(search_movies, text) if search_uses_db() else search_movies(text)
         if results:
             if len(results) == 1:
                 await send_movie(update, context, results[0][0])
@@ -168,13 +216,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 keyboard.append([InlineKeyboardButton("🔙 Asosiy menyu", callback_data="main_menu")])
                 await update.message.reply_text(msg, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
         else:
-            # Tavsiya
-            import random
-            similar = random.sample(list(movies.items()), min(5, len(movies))) if movies else []
-            msg = (
-                "❌ <b>Kino topilmadi</b>\n\n"
-                "🤔 <i>Balki quyidagilardan birini izlagandirsiz:</i>\n\n"
-            )
+            # Tavsiya - so'rovga eng yaqin nomlar (vaqt chegarasi bilan)
+            similar = suggest(text)
+            msg = "❌ <b>Kino topilmadi</b>\n\n"
+            if similar:
+                msg += "🤔 <i>Balki quyidagilardan birini izlagandirsiz:</i>\n\n"
             keyboard = []
             for code, data in similar:
                 msg += f"🎬 <code>{code}</code> — {data.get('name', code)}\n"
@@ -190,7 +236,15 @@ async def send_movie(update: Update, context: ContextTypes.DEFAULT_TYPE, movie_c
     try:
         user_id = str(update.effective_user.id)
         
-        if not is_admin(user_id) and not check_limit(user_id):
+        movies = get_catalog()
+        if movie_code not in movies:
+            return
+        
+        movie = movies[movie_code]
+        
+        # Limit bitta atomar so'rovda tekshiriladi va kamaytiriladi
+        remaining = "♾️" if is_admin(user_id) else await run_db(consume_limit, user_id)
+        if remaining is None:
             ref_link = f"https://t.me/{BOT_USERNAME}?start=ref{user_id}"
             text = (
                 "🚫 <b>Limitingiz tugadi!</b>\n\n"
@@ -209,25 +263,21 @@ async def send_movie(update: Update, context: ContextTypes.DEFAULT_TYPE, movie_c
                 ]), parse_mode='HTML')
             return
         
-        movies = get_movies()
-        if movie_code not in movies:
-            return
-        
-        movie = movies[movie_code]
-        
-        await context.bot.forward_message(
-            chat_id=update.effective_chat.id,
-            from_chat_id=movie["channel_id"],
-            message_id=movie["message_id"]
-        )
-        
-        if not is_admin(user_id):
-            decrease_limit(user_id)
+        try:
+            await context.bot.forward_message(
+                chat_id=update.effective_chat.id,
+                from_chat_id=movie["channel_id"],
+                message_id=movie["message_id"]
+            )
+        except Exception:
+            # Kino yetib bormadi - yechilgan limitni qaytarish
+            if not is_admin(user_id):
+                await run_db(add_limit, user_id, 1)
+            raise
         
         increment_movie_views(movie_code)
-        add_to_history(user_id, movie_code)
+        await run_db(add_to_history, user_id, movie_code)
         
-        remaining = "♾️" if is_admin(user_id) else get_users()[user_id]["limit"]
         caption = (
             f"✅ <b>{movie.get('name', movie_code)}</b> yuborildi!\n\n"
             f"🎟 <b>Qolgan limit:</b> <code>{remaining}</code>\n\n"
@@ -249,111 +299,132 @@ async def send_movie(update: Update, context: ContextTypes.DEFAULT_TYPE, movie_c
 
 # ==================== CALLBACKS ====================
 
+async def _not_banned(query, context, user_id: str) -> bool:
+    if is_banned(user_id):
+        await query.answer()
+        await query.edit_message_text("🚫 <b>Siz bloklangansiz!</b>", parse_mode='HTML')
+        return False
+    return True
+
+async def _subscribed(query, context, user_id: str) -> bool:
+    if not await check_subscription(query.from_user.id, context):
+        await query.answer()
+        await query.edit_message_text(
+            "❗️ <b>Avval kanallarga obuna bo'ling!</b>",
+            reply_markup=get_subscription_keyboard(),
+            parse_mode='HTML'
+        )
+        return False
+    return True
+
+async def _admin_only(query, context, user_id: str) -> bool:
+    if not is_admin(user_id):
+        await query.answer("🚫 Ruxsat yo'q!", show_alert=True)
+        return False
+    return True
+
+async def _super_admin_only(query, context, user_id: str) -> bool:
+    if not is_super_admin(user_id):
+        await query.answer("🚫 Faqat Super Admin!", show_alert=True)
+        return False
+    return True
+
+def _parse_delete_target(value: str):
+    """{short_id}:{kursor short_id} (admin._delete_callback) -> (kod, kursor kodi).
+    Kino endi yo'q bo'lsa kod None"""
+    movie, _, after = value.partition(":")
+    return code_by_short_id(movie), code_by_short_id(after) if after else None
+
+async def _noop(query, context, user_id, param):
+    pass
+
+async def check_sub_handler(query, context, user_id: str, param):
+    if await check_subscription(query.from_user.id, context, force=True):
+        await query.answer()
+        await show_main_menu(query, user_id)
+    else:
+        await query.answer("❌ Hali obuna bo'lmagansiz!", show_alert=True)
+
+async def delete_page_handler(query, context, user_id: str, page: int):
+    await start_delete_movie(query, context, page)
+    await query.answer(f"📄 Sahifa {page}")
+
+async def show_catalog_page(query, page: int = 0, after: str = None, before: str = None):
+    await query.edit_message_text(
+        "🎥 <b>Kino katalogi</b>",
+        reply_markup=get_catalog_keyboard(page, after, before),
+        parse_mode='HTML'
+    )
+
+def register_callback_routes(router):
+    """Barcha inline tugmalar. Standart guardlar: ban va majburiy obuna"""
+    router.default_guards = (_not_banned, _subscribed)
+    admin = (_admin_only,)
+    super_admin = (_super_admin_only,)
+
+    # Asosiy menyu
+    router.exact("main_menu", lambda q, c, uid, p: show_main_menu(q, uid))
+    router.exact("check_sub", check_sub_handler, guards=(_not_banned,), answer=False)
+    for data in ("no_action", "no_channels", "ignore", "catalog_page"):
+        router.exact(data, _noop)
+
+    # Foydalanuvchi funksiyalari
+    router.exact("my_limit", lambda q, c, uid, p: show_limit(q, uid))
+    router.exact("random_movie", lambda q, c, uid, p: send_random_movie_by_query(q, c, uid))
+    router.exact("trending", lambda q, c, uid, p: show_trending_list(q, "trending"))
+    router.exact("catalog", lambda q, c, uid, p: show_catalog_page(q))
+    router.prefix("catalog_", lambda q, c, uid, page: show_catalog_page(q, page), parse=int)
+    router.prefix("catalog_n_", lambda q, c, uid, code: show_catalog_page(q, after=code))
+    router.prefix("catalog_p_", lambda q, c, uid, code: show_catalog_page(q, before=code))
+    router.exact("referral", lambda q, c, uid, p: show_referral_info(q, uid))
+    router.exact("new_movies", lambda q, c, uid, p: show_new_movies_list(q))
+    router.exact("popular", lambda q, c, uid, p: show_trending_list(q, "popular"))
+    router.exact("genres", lambda q, c, uid, p: q.edit_message_text(
+        "🎭 <b>Janrni tanlang</b>", reply_markup=get_genres_keyboard(), parse_mode='HTML'))
+    router.prefix("genre_", lambda q, c, uid, genre: show_movies_by_genre_list(q, genre))
+    router.exact("favorites", lambda q, c, uid, p: show_favorites_list(q, uid))
+    router.exact("my_stats", lambda q, c, uid, p: show_user_stats(q, uid))
+
+    # Kino tugmalari
+    router.prefix("movie_", lambda q, c, uid, code: send_movie_by_query_handler(q, c, code, uid))
+    router.prefix("fav_", lambda q, c, uid, code: toggle_favorite_handler(q, uid, code))
+    router.prefix("share_", lambda q, c, uid, code: share_movie_handler(q, code))
+
+    # Admin panel
+    router.exact("admin_panel", lambda q, c, uid, p: show_admin_panel(q, uid), extra_guards=admin)
+    router.exact("add_movie", lambda q, c, uid, p: start_add_movie(q, c), extra_guards=admin)
+    router.exact("delete_movie", lambda q, c, uid, p: start_delete_movie(q, c, page=1), extra_guards=admin)
+    router.prefix("delete_movie_page_", delete_page_handler, parse=int, extra_guards=admin, answer=False)
+    router.prefix("delete_movie_n_", lambda q, c, uid, code: start_delete_movie(q, c, after=code),
+                  parse=code_by_short_id, extra_guards=admin)
+    router.prefix("delete_movie_p_", lambda q, c, uid, code: start_delete_movie(q, c, before=code),
+                  parse=code_by_short_id, extra_guards=admin)
+    router.prefix("del_movie_", lambda q, c, uid, target: confirm_delete_movie(q, c, *target),
+                  parse=_parse_delete_target, extra_guards=admin, answer=False)
+    router.prefix("confirm_delete_", lambda q, c, uid, target: final_delete_movie(q, c, *target),
+                  parse=_parse_delete_target, extra_guards=admin, answer=False)
+    router.exact("stats", lambda q, c, uid, p: show_stats(q), extra_guards=admin)
+    router.exact("top_movies", lambda q, c, uid, p: show_trending_list(q, "top"), extra_guards=admin)
+    router.exact("broadcast", lambda q, c, uid, p: start_broadcast(q, c), extra_guards=admin)
+    router.prefix("bc_cancel_", lambda q, c, uid, job_id: cancel_broadcast_handler(q, job_id), extra_guards=admin)
+    router.exact("manage_channels", lambda q, c, uid, p: manage_channels(q), extra_guards=admin)
+    router.exact("add_channel", lambda q, c, uid, p: start_add_channel(q, c), extra_guards=admin)
+    router.prefix("rem_channel_", lambda q, c, uid, cid: remove_channel_handler(q, cid), extra_guards=admin)
+    router.exact("add_limit", lambda q, c, uid, p: start_add_limit(q, c), extra_guards=admin)
+    router.exact("ban_user", lambda q, c, uid, p: start_ban_user(q, c), extra_guards=admin)
+    # Unban - ban tekshiruvisiz (avvalgidek)
+    router.exact("unban_user", lambda q, c, uid, p: start_unban_user(q), guards=(_subscribed,) + admin)
+    router.prefix("unban_user_", lambda q, c, uid, target: unban_user_handler(q, target), guards=(_subscribed,) + admin)
+    router.exact("backup", lambda q, c, uid, p: create_backup(q), extra_guards=admin)
+    router.exact("export_data", lambda q, c, uid, p: export_data(q), extra_guards=admin)
+    router.exact("add_admin", lambda q, c, uid, p: start_add_admin(q, c), extra_guards=super_admin)
+    router.exact("remove_admin", lambda q, c, uid, p: start_remove_admin(q), extra_guards=super_admin)
+    router.prefix("rem_admin_", lambda q, c, uid, aid: remove_admin_handler(q, aid), extra_guards=super_admin)
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
     try:
-        query = update.callback_query
-        await query.answer()
-        
-        user_id = str(update.effective_user.id)
-        data = query.data
-        
-        if is_banned(user_id) and not data.startswith("unban"):
-            await query.edit_message_text("🚫 <b>Siz bloklangansiz!</b>", parse_mode='HTML')
-            return
-        
-        if not await check_subscription(update.effective_user.id, context) and data != "check_sub":
-            await query.edit_message_text(
-                "❗️ <b>Avval kanallarga obuna bo'ling!</b>",
-                reply_markup=get_subscription_keyboard(),
-                parse_mode='HTML'
-            )
-            return
-        
-        # Asosiy menyu
-        if data == "main_menu":
-            await show_main_menu(query, user_id)
-        elif data == "check_sub":
-            if await check_subscription(update.effective_user.id, context):
-                await show_main_menu(query, user_id)
-            else:
-                await query.answer("❌ Hali obuna bo'lmagansiz!", show_alert=True)
-        
-        # Foydalanuvchi funksiyalari
-        elif data == "my_limit":
-            await show_limit(query, user_id)
-        elif data == "random_movie":
-            await send_random_movie_by_query(query, context, user_id)
-        elif data == "trending":
-            await show_trending_list(query)
-        elif data == "catalog":
-            await query.edit_message_text("🎥 <b>Kino katalogi</b>", reply_markup=get_catalog_keyboard(0), parse_mode='HTML')
-        elif data.startswith("catalog_"):
-            page = int(data.split("_")[1])
-            await query.edit_message_text("🎥 <b>Kino katalogi</b>", reply_markup=get_catalog_keyboard(page), parse_mode='HTML')
-        elif data == "referral":
-            await show_referral_info(query, user_id)
-        elif data == "new_movies":
-            await show_new_movies_list(query)
-        elif data == "popular":
-            await show_trending_list(query)
-        elif data == "genres":
-            await query.edit_message_text("🎭 <b>Janrni tanlang</b>", reply_markup=get_genres_keyboard(), parse_mode='HTML')
-        elif data.startswith("genre_"):
-            await show_movies_by_genre_list(query, data.replace("genre_", ""))
-        elif data == "favorites":
-            await show_favorites_list(query, user_id)
-        elif data == "my_stats":
-            await show_user_stats(query, user_id)
-        
-        # Kino tugmalari
-        elif data.startswith("movie_"):
-            await send_movie_by_query_handler(query, context, data.replace("movie_", ""), user_id)
-        elif data.startswith("fav_"):
-            await toggle_favorite_handler(query, user_id, data.replace("fav_", ""))
-        elif data.startswith("share_"):
-            await share_movie_handler(query, data.replace("share_", ""))
-        
-        # Admin panel
-        elif data == "admin_panel":
-            await show_admin_panel(query, user_id)
-        elif data == "add_movie":
-            await start_add_movie(query, context)
-        elif data == "delete_movie":
-            await start_delete_movie(query, context, page=1)
-        elif data.startswith("del_movie_"):
-            # Eski o'chirish - endi process_delete_movie_callback orqali ishlaydi
-            pass
-        elif data == "stats":
-            await show_stats(query)
-        elif data == "top_movies":
-            await show_trending_list(query)
-        elif data == "broadcast":
-            await start_broadcast(query, context)
-        elif data == "manage_channels":
-            await manage_channels(query)
-        elif data == "add_channel":
-            await start_add_channel(query, context)
-        elif data.startswith("rem_channel_"):
-            await remove_channel_handler(query, data.replace("rem_channel_", ""))
-        elif data == "add_limit":
-            await start_add_limit(query, context)
-        elif data == "ban_user":
-            await start_ban_user(query, context)
-        elif data == "unban_user":
-            await start_unban_user(query)
-        elif data.startswith("unban_user_"):
-            await unban_user_handler(query, data.replace("unban_user_", ""))
-        elif data == "backup":
-            await create_backup(query)
-        elif data == "export_data":
-            await export_data(query)
-        elif data == "add_admin":
-            await start_add_admin(query, context)
-        elif data == "remove_admin":
-            await start_remove_admin(query)
-        elif data.startswith("rem_admin_"):
-            await remove_admin_handler(query, data.replace("rem_admin_", ""))
-            
+        await callback_router.dispatch(query, context, str(update.effective_user.id))
     except Exception as e:
         logger.error(f"Callback error: {e}")
         try:
@@ -364,7 +435,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ==================== YORDAMCHI FUNKSIYALAR ====================
 
 async def show_main_menu(query, user_id: str):
-    user_data = get_users().get(user_id, {})
+    user_data = get_current_user(user_id)
     limit = "♾️ Cheksiz" if is_admin(user_id) else f"🎟 {user_data.get('limit', 5)} ta"
     
     text = (
@@ -385,8 +456,7 @@ async def show_main_menu(query, user_id: str):
     await query.edit_message_text(text, reply_markup=get_main_keyboard(user_id), parse_mode='HTML')
 
 async def show_limit(query, user_id: str):
-    users = get_users()
-    user = users.get(user_id, {})
+    user = get_current_user(user_id)
     
     if is_admin(user_id):
         text = (
@@ -416,7 +486,16 @@ async def send_random_movie_by_query(query, context, user_id: str):
     await send_movie_by_query_handler(query, context, movie[0], user_id)
 
 async def send_movie_by_query_handler(query, context, movie_code: str, user_id: str):
-    if not is_admin(user_id) and not check_limit(user_id):
+    movies = get_catalog()
+    if movie_code not in movies:
+        await query.answer("❌ Kino topilmadi!", show_alert=True)
+        return
+    
+    movie = movies[movie_code]
+    
+    # Limit bitta atomar so'rovda tekshiriladi va kamaytiriladi
+    remaining = "♾️" if is_admin(user_id) else await run_db(consume_limit, user_id)
+    if remaining is None:
         ref_link = f"https://t.me/{BOT_USERNAME}?start=ref{user_id}"
         text = (
             f"🚫 <b>Limitingiz tugadi!</b>\n\n"
@@ -428,27 +507,22 @@ async def send_movie_by_query_handler(query, context, movie_code: str, user_id:
         ]), parse_mode='HTML')
         return
     
-    movies = get_movies()
-    if movie_code not in movies:
-        await query.answer("❌ Kino topilmadi!", show_alert=True)
-        return
-    
-    movie = movies[movie_code]
-    
     try:
-        await context.bot.forward_message(
-            chat_id=query.message.chat_id,
-            from_chat_id=movie["channel_id"],
-            message_id=movie["message_id"]
-        )
-        
-        if not is_admin(user_id):
-            decrease_limit(user_id)
+        try:
+            await context.bot.forward_message(
+                chat_id=query.message.chat_id,
+                from_chat_id=movie["channel_id"],
+                message_id=movie["message_id"]
+            )
+        except Exception:
+            # Kino yetib bormadi - yechilgan limitni qaytarish
+            if not is_admin(user_id):
+                await run_db(add_limit, user_id, 1)
+            raise
         
         increment_movie_views(movie_code)
-        add_to_history(user_id, movie_code)
+        await run_db(add_to_history, user_id, movie_code)
         
-        remaining = "♾️" if is_admin(user_id) else get_users()[user_id]["limit"]
         caption = (
             f"✅ <b>{movie.get('name', movie_code)}</b> yuborildi!\n\n"
             f"🎟 <b>Qolgan limit:</b> <code>{remaining}</code>\n"
@@ -461,25 +535,32 @@ async def send_movie_by_query_handler(query, context, movie_code: str, user_id:
         logger.error(f"Send error: {e}")
         await query.answer("❌ Xatolik!", show_alert=True)
 
-async def show_trending_list(query):
-    trending = get_trending_movies(10)
+# Ro'yxat sarlavhasi va ko'rishlar soni yonidagi izoh
+_RANKING_TITLES = {
+    "trending": ("🔥 <b>Trenddagi filmlar:</b>", " (24 soatda)"),
+    "popular": ("⭐ <b>Haftaning mashhur filmlari:</b>", " (7 kunda)"),
+    "top": ("🏆 <b>Top 10 eng ko'p ko'rilgan filmlar:</b>", ""),
+}
+
+async def show_trending_list(query, kind: str = "trending"):
+    trending = get_ranked_movies(kind, 10)
     if not trending:
         await query.answer("🎬 Hozircha kinolar mavjud emas!", show_alert=True)
         return
     
-    text = "🔥 <b>Top 10 eng ko'p ko'rilgan filmlar:</b>\n\n"
+    title, period = _RANKING_TITLES[kind]
+    text = f"{title}\n\n"
     keyboard = []
-    for i, (code, data) in enumerate(trending, 1):
-        views = data.get("views", 0)
-        text += f"{i}. 🎬 <b>{data.get('name', code)}</b> — 👁 <code>{views}</code>\n"
+    for i, (code, data, views) in enumerate(trending, 1):
+        text += f"{i}. 🎬 <b>{data.get('name', code)}</b> — 👁 <code>{views}</code>{period}\n"
         keyboard.append([InlineKeyboardButton(f"{i}. {data.get('name', code)[:35]}", callback_data=f"movie_{code}")])
     
     keyboard.append([InlineKeyboardButton("🔙 Asosiy menyu", callback_data="main_menu")])
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
 
 async def show_referral_info(query, user_id: str):
-    users = get_users()
-    ref_count = users.get(user_id, {}).get("referrals", 0)
+    user = get_current_user(user_id)
+    ref_count = user.get("referrals", 0)
     ref_link = f"https://t.me/{BOT_USERNAME}?start=ref{user_id}"
     
     text = (
@@ -498,7 +579,7 @@ async def show_referral_info(query, user_id: str):
     await query.edit_message_text(text, reply_markup=keyboard, parse_mode='HTML')
 
 async def show_new_movies_list(query):
-    movies = get_movies()
+    movies = get_catalog()
     sorted_movies = sorted(movies.items(), key=lambda x: x[1].get("added_at", ""), reverse=True)[:10]
     
     if not sorted_movies:
@@ -533,9 +614,9 @@ async def show_movies_by_genre_list(query, genre: str):
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
 
 async def show_favorites_list(query, user_id: str):
-    users = get_users()
-    favorites = users.get(user_id, {}).get("favorites", [])
-    movies = get_movies()
+    user = get_current_user(user_id)
+    favorites = user.get("favorites", [])
+    movies = get_catalog()
     
     if not favorites:
         await query.edit_message_text(
@@ -558,8 +639,7 @@ async def show_favorites_list(query, user_id: str):
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
 
 async def show_user_stats(query, user_id: str):
-    users = get_users()
-    user = users.get(user_id, {})
+    user = get_current_user(user_id)
     
     watched = len(user.get("history", []))
     favs = len(user.get("favorites", []))
@@ -586,13 +666,13 @@ async def show_user_stats(query, user_id: str):
     await query.edit_message_text(text, reply_markup=get_main_keyboard(user_id), parse_mode='HTML')
 
 async def toggle_favorite_handler(query, user_id: str, movie_code: str):
-    is_added = toggle_favorite(user_id, movie_code)
+    is_added = await run_db(toggle_favorite, user_id, movie_code)
     action = "qo'shildi ❤️" if is_added else "olib tashlandi 💔"
     await query.answer(f"Sevimlilarga {action}!", show_alert=True)
     await query.edit_message_reply_markup(reply_markup=get_movie_keyboard(movie_code, user_id))
 
 async def share_movie_handler(query, movie_code: str):
-    movies = get_movies()
+    movies = get_catalog()
     if movie_code not in movies:
         await query.answer("❌ Kino topilmadi!", show_alert=True)
         return
@@ -617,6 +697,40 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ==================== MAIN ====================
 
+# ==================== KANAL A'ZOLARI ====================
+
+async def track_channel_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Majburiy kanallarga qo'shilish/chiqishni a'zolar indeksiga yozish.
+    Bot kanalda admin bo'lsagina chat_member updatelari keladi."""
+    change = update.chat_member
+    channel_id = channel_key(change.chat)
+    if channel_id is None:
+        return
+    member = change.new_chat_member
+    await run_db(record_member, channel_id, member.user.id, is_member_status(member))
+
+async def on_startup(application: Application):
+    """Sxemani tekshirish va fon vazifalarini ishga tushirish"""
+    await run_db(init_database)
+    await run_db(load_catalog)
+    await run_db(load_trending)
+    await run_db(load_members)
+    if CATALOG_LISTEN:
+        start_listener()
+    start_flush_loop()
+    start_member_pruning()
+    resumed = await resume_broadcasts(application.bot)
+    if resumed:
+        logger.info(f"{resumed} ta broadcast davom ettirildi")
+
+async def on_shutdown(application: Application):
+    """Bot to'xtaganda yig'ilgan ko'rishlarni yozib, DB ulanishlarini yopish"""
+    stop_listener()
+    await stop_broadcasts()
+    await stop_member_pruning()
+    await stop_flush_loop()
+    close_pool()
+
 def main():
     import os
     import sys
@@ -631,26 +745,56 @@ def main():
         print(f"Env vars: {[k for k in os.environ.keys() if not k.startswith('_')]}")
         sys.exit(1)
     
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        # Manzilsiz PTB http://<listen>:<port>/... ni setWebhook qiladi va ishlab
+        # turgan webhookni buzadi - ishga tushirmaymiz
+        print("ERROR: BOT_MODE=webhook uchun WEBHOOK_URL kerak!")
+        sys.exit(1)
+    
     print(f"Bot: @{BOT_USERNAME}")
     print(f"Admins: {ADMIN_IDS}")
     
     try:
-        application = Application.builder().token(BOT_TOKEN).build()
+        builder = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .rate_limiter(outbox)
+            .concurrent_updates(PerUserUpdateProcessor())
+            .post_init(on_startup)
+            .post_shutdown(on_shutdown)
+        )
+        if BOT_API_URL:
+            builder = builder.base_url(BOT_API_URL)
+        application = builder.build()
         
+        application.add_handler(TypeHandler(Update, open_request_context), group=-1)
+        application.add_handler(TypeHandler(Update, close_request_context), group=100)
+
         application.add_handler(CommandHandler("start", start))
         application.add_handler(CommandHandler("cancel", cancel))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-
-        # Kino o'chirish callbacklari (pagination bilan)
-        application.add_handler(CallbackQueryHandler(
-            lambda u, c: process_delete_movie_callback(u.callback_query, c),
-            pattern="^(delete_movie_page_|del_movie_|confirm_delete_)"
-        ))
+        # via_bot - inline natija sifatida yuborilgan xabar, qidiruv emas
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & ~filters.VIA_BOT, handle_message))
 
+        register_callback_routes(callback_router)
         application.add_handler(CallbackQueryHandler(button_handler))
-        
-        print("Bot ishga tushdi...")
-        application.run_polling(drop_pending_updates=True)
+        application.add_handler(InlineQueryHandler(inline_query))
+        application.add_handler(ChatMemberHandler(track_channel_member, ChatMemberHandler.CHAT_MEMBER))
+        
+        # chat_member updatelari faqat aniq so'ralganda yuboriladi
+        if BOT_MODE == "webhook":
+            print(f"Bot ishga tushdi (webhook {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH})...")
+            application.run_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET or None,
+                webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+                drop_pending_updates=DROP_PENDING_UPDATES,
+                allowed_updates=Update.ALL_TYPES
+            )
+        else:
+            print("Bot ishga tushdi...")
+            application.run_polling(drop_pending_updates=DROP_PENDING_UPDATES, allowed_updates=Update.ALL_TYPES)
     except Exception as e:
         print(f"Bot xato: {e}")
         raise
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter, Forbidden, BadRequest, NetworkError
+
+from outbox import PRIORITY_BROADCAST, PRIORITY_MAINTENANCE
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PAGE_SIZE, BROADCAST_PROGRESS_INTERVAL
+from database import (
+    run_db, create_broadcast, get_broadcast, get_running_broadcasts,
+    update_broadcast, get_user_ids_after
+)
+
+logger = logging.getLogger(__name__)
+
+NL = chr(10)
+
+# Bitta foydalanuvchiga yuborish urinishlari (RetryAfter / tarmoq xatosi)
+MAX_ATTEMPTS = 3
+# Foydalanuvchilar sahifasini o'qib bo'lmasa kutish (soniya), har xatoda ikki barobar
+PAGE_RETRY_DELAY = 5
+PAGE_RETRY_MAX_DELAY = 300
+
+# job_id -> ishlayotgan asyncio.Task
+_tasks: Dict[int, asyncio.Task] = {}
+
+class SendRateLimiter:
+    """Xabarlar orasini 1/rate soniyadan kam qilmaydi. RetryAfter kelsa
+    pause() barcha yuboruvchilarni birdaniga to'xtatadi."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._next - now)
+            self._next = max(now, self._next) + self.interval
+        if delay:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        self._next = max(self._next, time.monotonic() + seconds)
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+async def _send_one(bot, job: dict, user_id: str, limiter: SendRateLimiter) -> bool:
+    """Xabarni bitta foydalanuvchiga nusxalash. Yuborildi - True"""
+    for attempt in range(MAX_ATTEMPTS):
+        await limiter.wait()
+        try:
+            await bot.copy_message(
+                chat_id=int(user_id),
+                from_chat_id=int(job["from_chat_id"]),
+                message_id=int(job["message_id"]),
+                rate_limit_args=PRIORITY_BROADCAST
+            )
+            return True
+        except RetryAfter as e:
+            # Flood limit - hamma kutadi, shu foydalanuvchi qayta uriniladi
+            limiter.pause(_retry_seconds(e))
+        except (Forbidden, BadRequest, ValueError):
+            # Botni bloklagan / o'chirilgan akkaunt - qayta urinish foydasiz
+            return False
+        except NetworkError:
+            await asyncio.sleep(1 + attempt)
+    return False
+
+def _progress_text(job: dict, sent: int, failed: int, state: str) -> str:
+    title = {
+        "running": "📤 <b>Yuborilmoqda...</b>",
+        "done": "✅ <b>Yakunlandi!</b>",
+        "cancelled": "⛔ <b>To'xtatildi</b>",
+    }.get(state, state)
+    total = job.get("total") or 0
+    percent = f" ({(sent + failed) * 100 // total}%)" if total else ""
+    return (
+        title + NL + NL +
+        f"👥 Jami: <code>{total}</code>{percent}" + NL +
+        f"✓ Muvaffaqiyatli: <code>{sent}</code>" + NL +
+        f"✗ Xatolik: <code>{failed}</code>"
+    )
+
+def _cancel_keyboard(job_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("⛔ To'xtatish", callback_data=f"bc_cancel_{job_id}")]])
+
+async def _edit_status(bot, job: dict, sent: int, failed: int, state: str):
+    try:
+        await bot.edit_message_text(
+            _progress_text(job, sent, failed, state),
+            chat_id=int(job["status_chat_id"]),
+            message_id=int(job["status_message_id"]),
+            reply_markup=_cancel_keyboard(job["id"]) if state == "running" else None,
+            parse_mode='HTML',
+            rate_limit_args=PRIORITY_MAINTENANCE
+        )
+    except Exception as e:
+        # "message is not modified" va o'chirilgan status xabari - e'tiborsiz
+        logger.debug(f"Broadcast status edit error: {e}")
+
+async def run_broadcast(bot, job_id: int):
+    """Vazifani last_user_id dan davom ettirish. Progress har sahifadan keyin
+    saqlanadi - restartda oxirgi tugallanmagan sahifa qayta yuborilishi mumkin."""
+    job = await run_db(get_broadcast, job_id)
+    if not job or job["state"] != "running":
+        return
+
+    limiter = SendRateLimiter(BROADCAST_RATE)
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    sent, failed = job["sent"] or 0, job["failed"] or 0
+    last_user_id = job["last_user_id"] or ""
+    last_progress = 0.0
+
+    async def deliver(user_id: str) -> bool:
+        async with semaphore:
+            return await _send_one(bot, job, user_id, limiter)
+
+    state = "done"
+    retry_delay = PAGE_RETRY_DELAY
+    while True:
+        # To'xtatish tugmasi boshqa workerda bosilgan bo'lishi ham mumkin - holat DB dan
+        current = await run_db(get_broadcast, job_id)
+        if current and current["state"] != "running":
+            state = current["state"]
+            break
+        page = await run_db(get_user_ids_after, last_user_id, BROADCAST_PAGE_SIZE)
+        if page is None:
+            # DB xatosi - ro'yxat tugamagan. Vazifa running holida qoladi va kutib qayta
+            # uriniladi (bot to'xtasa ham resume_broadcasts shu joydan davom ettiradi)
+            logger.warning(f"Broadcast #{job_id}: foydalanuvchilar o'qilmadi, {retry_delay}s dan keyin qayta")
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, PAGE_RETRY_MAX_DELAY)
+            continue
+        retry_delay = PAGE_RETRY_DELAY
+        if not page:
+            break
+        results = await asyncio.gather(*(deliver(uid) for uid in page))
+        sent += sum(results)
+        failed += len(results) - sum(results)
+        last_user_id = page[-1]
+        await run_db(update_broadcast, job_id, last_user_id=last_user_id, sent=sent, failed=failed)
+
+        if time.monotonic() - last_progress >= BROADCAST_PROGRESS_INTERVAL:
+            last_progress = time.monotonic()
+            await _edit_status(bot, job, sent, failed, "running")
+
+    await run_db(update_broadcast, job_id, state=state)
+    await _edit_status(bot, job, sent, failed, state)
+    logger.info(f"Broadcast #{job_id} {state}: sent={sent} failed={failed}")
+
+def _start_task(bot, job_id: int):
+    task = _tasks.get(job_id)
+    if task is None or task.done():
+        task = asyncio.create_task(run_broadcast(bot, job_id))
+        task.add_done_callback(lambda t: _tasks.pop(job_id, None))
+        _tasks[job_id] = task
+
+async def start_broadcast_job(bot, message, status_message, created_by: str) -> Optional[int]:
+    """Yangi vazifani DB ga yozib, fonda ishga tushirish"""
+    job_id = await run_db(
+        create_broadcast, message.chat_id, message.message_id,
+        status_message.chat_id, status_message.message_id, created_by
+    )
+    if job_id is not None:
+        _start_task(bot, job_id)
+    return job_id
+
+async def resume_broadcasts(bot) -> int:
+    """Restartdan keyin tugallanmagan vazifalarni davom ettirish (post_init)"""
+    job_ids = await run_db(get_running_broadcasts)
+    for job_id in job_ids:
+        _start_task(bot, job_id)
+    return len(job_ids)
+
+async def cancel_broadcast(job_id: int) -> bool:
+    """Vazifani to'xtatish - ishlayotgan sikl keyingi sahifadan oldin to'xtaydi"""
+    job = await run_db(get_broadcast, job_id)
+    if not job or job["state"] != "running":
+        return False
+    return await run_db(update_broadcast, job_id, state="cancelled")
+
+async def stop_broadcasts():
+    """Bot to'xtaganda fon vazifalarini to'xtatish - holati running qoladi va keyin davom etadi"""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
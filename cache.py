@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+
+_MISSING = object()
+
+class TTLCache:
+    """Hajmi cheklangan LRU kesh, har bir yozuv ttl soniyadan keyin eskiradi.
+    Handlerlar (event loop) va run_db threadlari birga ishlatgani uchun lock bilan."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING or item[0] <= now:
+                if item is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def update(self, key: Hashable, **fields) -> bool:
+        """Keshdagi dict qiymatning maydonlarini yangilash (muddati o'zgarmaydi).
+        Yozuv bo'lmasa hech narsa qilmaydi."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False
+            self._data[key] = (item[0], {**item[1], **fields})
+            return True
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+# Foydalanuvchi holati: banned, limit, admin, super_admin.
+# Yozadigan funksiyalar (ban/unban, limit, adminlar) tegishli yozuvni o'chiradi.
+user_state = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
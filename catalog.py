@@ -0,0 +1,267 @@
+import base64
+import bisect
+import hashlib
+import logging
+import select
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from database import (
+    load_movies, get_movie, get_backend, connect_listener, CATALOG_CHANNEL,
+    normalize_code, find_movie_code
+)
+
+logger = logging.getLogger(__name__)
+
+# Barcha kinolarning xotiradagi nusxasi: kod -> ma'lumot.
+# O'zgarishlar yangi dict yaratib almashtiriladi (copy-on-write), shuning uchun
+# get_catalog() qaytargan dict ni o'qish xavfsiz, lekin uni o'zgartirmang.
+_movies: Optional[Dict[str, dict]] = None
+# normalize_code(kod) -> kod; _movies bilan birga almashtiriladi
+_codes: Optional[Dict[str, str]] = None
+_version = 0
+# Ko'rishlar snapshot'ga qo'shilganda o'sadi (views ko'rsatadigan keshlar uchun)
+_views_version = 0
+_lock = threading.Lock()
+# Sahifalash uchun kod bo'yicha tartiblangan indeks: (versiya, kalitlar, kodlar).
+# Katalog versiyasi o'zgargandan keyingi birinchi so'rovda qayta quriladi
+_index = (None, [], [])
+# short_id(kod) -> kod: (versiya, dict), _index kabi kerak bo'lganda quriladi
+_short_ids = (None, {})
+# Katalog o'zgarganda chaqiriladi: fn(code, data) - data None bo'lsa o'chirilgan,
+# code None bo'lsa butun katalog qayta yuklangan
+_listeners: List[Callable] = []
+
+def _notify(code: Optional[str], data: Optional[dict]):
+    for listener in _listeners:
+        try:
+            listener(code, data)
+        except Exception as e:
+            logger.error(f"Catalog listener error: {e}")
+
+def add_listener(listener: Callable):
+    """Katalog o'zgarishlariga obuna bo'lish (indekslar uchun)"""
+    _listeners.append(listener)
+
+def _code_key(code: str, data: dict) -> Optional[str]:
+    """Bazadagi code_norm (to'qnashgan kodlarda NULL - faqat o'z kodi bilan topiladi)"""
+    if "code_norm" in data:
+        return data["code_norm"]
+    return normalize_code(code)
+
+def _code_index(movies: Dict[str, dict]) -> Dict[str, str]:
+    return {
+        key: code for code, key in ((code, _code_key(code, data)) for code, data in movies.items())
+        if key
+    }
+
+def load_catalog() -> Dict[str, dict]:
+    """Katalogni DB dan to'liq qayta yuklash. O'qib bo'lmasa joriy snapshot qoladi
+    (hali yuklanmagan bo'lsa bo'sh dict qaytadi, keyingi get_catalog() yana urinadi)"""
+    global _movies, _codes, _version
+    try:
+        movies = load_movies()
+    except Exception as e:
+        logger.error(f"Catalog load error: {e}")
+        return _movies if _movies is not None else {}
+    codes = _code_index(movies)
+    with _lock:
+        _movies = movies
+        _codes = codes
+        _version += 1
+    _notify(None, None)
+    return movies
+
+def get_catalog() -> Dict[str, dict]:
+    """Katalog snapshot'i - birinchi chaqiruvdan keyin DB so'rovisiz"""
+    movies = _movies
+    if movies is None:
+        with _lock:
+            movies = _movies
+        if movies is None:
+            movies = load_catalog()
+    return movies
+
+def resolve_code(text: str) -> Optional[str]:
+    """Foydalanuvchi yozgan kod ("UZB 001") -> katalogdagi kod yoki None.
+    Bitta dict lookup; katalog hali yuklanmagan bo'lsa uni yuklamasdan DB indeksidan"""
+    code_norm = normalize_code(text)
+    if not code_norm:
+        return None
+    codes, movies = _codes, _movies
+    if codes is None or movies is None:
+        return find_movie_code(code_norm)
+    # Aynan katalogdagi kod birinchi - code_norm i NULL (boshqa kod bilan to'qnashgan)
+    # kino faqat shunday topiladi
+    exact = text.strip().lower()
+    if exact in movies:
+        return exact
+    return codes.get(code_norm)
+
+def catalog_version() -> int:
+    """Har bir qo'shish/o'chirish/qayta yuklashda o'sadi"""
+    return _version
+
+def views_version() -> int:
+    """Ko'rishlar soni yangilanganda o'sadi (VIEWS_FLUSH_INTERVAL da bir martadan ko'p emas)"""
+    return _views_version
+
+def _sort_key(code: str) -> tuple:
+    """Raqamli kodlar son bo'yicha (2 < 10), qolganlari ulardan keyin alifbo bo'yicha"""
+    if code.isdigit():
+        return (0, int(code), code)
+    return (1, code.lower(), code)
+
+def _sorted_index() -> tuple:
+    global _index
+    index = _index
+    version = _version
+    if index[0] != version:
+        codes = sorted(get_catalog(), key=_sort_key)
+        index = (version, [_sort_key(code) for code in codes], codes)
+        _index = index
+    return index
+
+def catalog_page(after: str = None, before: str = None, offset: int = 0,
+                 limit: int = 10) -> Tuple[List[Tuple[str, dict]], int, int]:
+    """Kod bo'yicha tartiblangan bitta sahifa: (kinolar, birinchisining o'rni, jami).
+    after - shu koddan keyingilar, before - shu koddan oldingilar (keyset),
+    ikkalasi ham berilmasa offset dan. Kod o'chirilgan bo'lsa ham o'rni topiladi."""
+    _, keys, codes = _sorted_index()
+    total = len(codes)
+    if after is not None:
+        start = bisect.bisect_right(keys, _sort_key(after))
+    elif before is not None:
+        start = max(0, bisect.bisect_left(keys, _sort_key(before)) - limit)
+    else:
+        start = min(max(0, offset), max(0, total - 1) // limit * limit)
+    movies = get_catalog()
+    page = [(code, movies[code]) for code in codes[start:start + limit] if code in movies]
+    return page, start, total
+
+def code_at(position: int) -> Optional[str]:
+    """Tartiblangan katalogdagi shu o'rindagi kod (sahifa kursori uchun)"""
+    _, _, codes = _sorted_index()
+    return codes[position] if 0 <= position < len(codes) else None
+
+def short_id(code: str) -> str:
+    """Callback data uchun 8 belgili barqaror belgi: kod 50 belgigacha (kirillda 100 baytgacha)
+    bo'lishi mumkin, Telegram esa callback_data ni 64 bayt bilan cheklaydi"""
+    return base64.urlsafe_b64encode(hashlib.blake2b(code.encode(), digest_size=6).digest()).decode()
+
+def code_by_short_id(value: str) -> Optional[str]:
+    """short_id -> katalogdagi kod (o'chirilgan bo'lsa None)"""
+    global _short_ids
+    index = _short_ids
+    version = _version
+    if index[0] != version:
+        index = (version, {short_id(code): code for code in get_catalog()})
+        _short_ids = index
+    return index[1].get(value)
+
+def invalidate():
+    """Keyingi get_catalog() DB dan qayta yuklasin"""
+    global _movies, _codes, _version
+    with _lock:
+        _movies = None
+        _codes = None
+        _version += 1
+
+def put_movie(code: str, data: dict):
+    """Bitta kinoni qo'shish yoki yangilash"""
+    global _movies, _codes, _version
+    with _lock:
+        if _movies is None:
+            return
+        movies = dict(_movies)
+        movies[code] = data
+        codes = dict(_codes)
+        key = _code_key(code, data)
+        if key:
+            codes[key] = code
+        _movies, _codes = movies, codes
+        _version += 1
+    _notify(code, data)
+
+def drop_movie(code: str):
+    """Bitta kinoni katalogdan olib tashlash"""
+    global _movies, _codes, _version
+    with _lock:
+        if _movies is None or code not in _movies:
+            return
+        movies = dict(_movies)
+        key = _code_key(code, movies.pop(code))
+        codes = dict(_codes)
+        if key and codes.get(key) == code:
+            del codes[key]
+        _movies, _codes = movies, codes
+        _version += 1
+    _notify(code, None)
+
+def apply_views(deltas: Dict[str, int]):
+    """DB ga yozilgan ko'rishlarni snapshot'ga ham qo'shish (versiya o'zgarmaydi).
+    Boshqa o'zgarishlar kabi yangi dict - oldin olingan snapshot o'zgarmaydi"""
+    global _movies, _views_version
+    with _lock:
+        if _movies is None:
+            return
+        movies = dict(_movies)
+        for code, delta in deltas.items():
+            data = movies.get(code)
+            if data is not None:
+                movies[code] = {**data, "views": (data.get("views") or 0) + delta}
+        _movies = movies
+        _views_version += 1
+
+def refresh_movie(code: str):
+    """Bitta kinoni DB dan qayta o'qib snapshot'ni yangilash"""
+    data = get_movie(code)
+    if data is None:
+        drop_movie(code)
+    else:
+        put_movie(code, data)
+
+# ============ LISTEN/NOTIFY ============
+_listener_thread = None
+_listener_stop = threading.Event()
+
+def _listen_loop():
+    while not _listener_stop.is_set():
+        conn = None
+        try:
+            conn = connect_listener()
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CATALOG_CHANNEL}")
+            # Ulanish uzilgan paytdagi o'zgarishlarni o'tkazib yubormaslik uchun
+            load_catalog()
+            while not _listener_stop.is_set():
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                codes = set()
+                while conn.notifies:
+                    codes.add(conn.notifies.pop(0).payload)
+                for code in codes:
+                    refresh_movie(code)
+        except psycopg2.Error as e:
+            logger.error(f"Catalog listener error: {e}")
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                conn.close()
+
+def start_listener():
+    """Boshqa workerlardagi katalog o'zgarishlarini kuzatishni boshlash"""
+    global _listener_thread
+    if get_backend() != "postgres":
+        return
+    if _listener_thread is None or not _listener_thread.is_alive():
+        _listener_stop.clear()
+        _listener_thread = threading.Thread(target=_listen_loop, name="catalog-listener", daemon=True)
+        _listener_thread.start()
+
+def stop_listener():
+    _listener_stop.set()
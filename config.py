@@ -32,3 +32,109 @@ DATABASE_URL = os.getenv("DATABASE_URL") or os.environ.get("DATABASE_URL", "")
 print(f"✅ Config: @{BOT_USERNAME}")
 print(f"✅ Admins: {ADMIN_IDS}")
 print(f"✅ Database: {DB_HOST}:{DB_PORT}/{DB_NAME}")
+
+# ============ CONNECTION POOL ============
+# Bir vaqtda ochiq turadigan PostgreSQL ulanishlari soni
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN") or 1)
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX") or 10)
+# Shuncha soniya bo'sh turgan ulanish ishlatishdan oldin "SELECT 1" bilan tekshiriladi
+DB_HEALTH_CHECK_INTERVAL = int(os.getenv("DB_HEALTH_CHECK_INTERVAL") or 30)
+# Pool yaratilmasa, qayta urinishdan oldin kutiladigan vaqt (soniya)
+DB_RECONNECT_INTERVAL = int(os.getenv("DB_RECONNECT_INTERVAL") or 15)
+
+# ============ KO'RISHLAR HISOBLAGICHI ============
+# Ko'rishlar xotirada yig'iladi va shuncha soniyada bir marta DB ga yoziladi
+VIEWS_FLUSH_INTERVAL = int(os.getenv("VIEWS_FLUSH_INTERVAL") or 30)
+
+# ============ BACKEND ============
+# auto - DATABASE_URL yoki DB_HOST berilgan bo'lsa PostgreSQL (ishga tushishda ulanmasa ham -
+# pool qayta ulanadi), berilmagan bo'lsa SQLite. Tanlov faqat sozlamaga bog'liq, shuning uchun
+# ma'lumotlar ikki bazaga bo'linib ketmaydi. postgres / sqlite - majburiy
+DB_BACKEND = (os.getenv("DB_BACKEND") or "auto").lower()
+POSTGRES_CONFIGURED = bool(DATABASE_URL or os.getenv("DB_HOST"))
+SQLITE_PATH = os.getenv("SQLITE_PATH") or os.path.join("data", "bot.db")
+
+# ============ KATALOG KESHI ============
+# true bo'lsa PostgreSQL LISTEN/NOTIFY orqali boshqa workerlardagi o'zgarishlar qabul qilinadi
+CATALOG_LISTEN = (os.getenv("CATALOG_LISTEN") or "false").lower() in ("1", "true", "yes")
+
+# ============ FOYDALANUVCHI KESHI ============
+# Ban/admin/limit tekshiruvlari uchun: nechta foydalanuvchi va necha soniya saqlanadi
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE") or 10000)
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL") or 60)
+
+# ============ MAJBURIY OBUNA KESHI ============
+# Obuna bo'lgan / bo'lmagan natija necha soniya eslab qolinadi
+SUB_CACHE_TTL = int(os.getenv("SUB_CACHE_TTL") or 600)
+SUB_NEGATIVE_TTL = int(os.getenv("SUB_NEGATIVE_TTL") or 30)
+SUB_CACHE_SIZE = int(os.getenv("SUB_CACHE_SIZE") or 50000)
+# A'zolar indeksidagi yozuv (chat_member update yoki tasdiqlangan obuna) shuncha soniyadan
+# keyin qayta tekshiriladi - bot o'chiq paytda kelgan "left" updatelar yo'qolishi mumkin
+MEMBER_INDEX_TTL = int(os.getenv("MEMBER_INDEX_TTL") or 6 * 3600)
+# Muddati o'tgan a'zolik yozuvlari (xotira va channel_members) shuncha soniyada bir tozalanadi
+MEMBER_PRUNE_INTERVAL = int(os.getenv("MEMBER_PRUNE_INTERVAL") or 3600)
+# Kanallar ro'yxati DB dan qayta o'qilish oralig'i (soniya)
+CHANNELS_CACHE_TTL = int(os.getenv("CHANNELS_CACHE_TTL") or 300)
+
+# ============ BROADCAST ============
+# Telegram: ~30 xabar/soniya umumiy limit - biroz pastroq qo'yilgan
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE") or 25)
+# Bir vaqtda yuborilayotgan xabarlar soni
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY") or 10)
+# Bir sahifada olinadigan foydalanuvchilar (har sahifadan keyin progress saqlanadi)
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE") or 200)
+# Status xabari necha soniyada bir yangilanadi
+BROADCAST_PROGRESS_INTERVAL = int(os.getenv("BROADCAST_PROGRESS_INTERVAL") or 10)
+
+# ============ CHIQUVCHI XABARLAR NAVBATI ============
+# Bot API so'rovlari umumiy limiti (so'rov/soniya) va yig'ilishi mumkin bo'lgan zaxira
+OUTBOX_RATE = float(os.getenv("OUTBOX_RATE") or 30)
+OUTBOX_BURST = int(os.getenv("OUTBOX_BURST") or 30)
+# RetryAfter dan keyin so'rov necha marta qayta yuboriladi
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES") or 1)
+
+# ============ ISHGA TUSHIRISH REJIMI ============
+# polling - getUpdates (standart); webhook - ichki HTTP server
+BOT_MODE = (os.getenv("BOT_MODE") or "polling").lower()
+# Telegramga beriladigan tashqi manzil (https://bot.example.com). Webhook rejimida majburiy:
+# har bir nusxa bir xil manzil bilan setWebhook chaqiradi (takroriy chaqiruv zararsiz)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") or ""
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN") or "0.0.0.0"
+# Railway/Heroku PORT ni o'zi beradi
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT") or os.getenv("PORT") or 8443)
+WEBHOOK_PATH = (os.getenv("WEBHOOK_PATH") or "telegram").strip("/")
+# X-Telegram-Bot-Api-Secret-Token sarlavhasi bilan tekshiriladi
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or ""
+# Ishga tushishda Telegramdagi navbatni tashlab yuborish. Faqat bitta (deploy qiluvchi)
+# nusxada yoqing - aks holda har bir replika navbatdagi updatelarni (chat_member ham) yo'qotadi
+DROP_PENDING_UPDATES = (os.getenv("DROP_PENDING_UPDATES") or "").lower() in ("1", "true", "yes")
+# Bot API manzili (lokal Bot API server yoki test harness uchun)
+BOT_API_URL = os.getenv("BOT_API_URL") or ""
+
+# ============ UPDATELARNI PARALLEL ISHLASH ============
+# Bir vaqtda ishlanadigan updatelar (bitta foydalanuvchiniki baribir ketma-ket)
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES") or 32)
+
+# ============ QIDIRUV ============
+# memory - xotiradagi indeks (search.py); postgres - so'rov bazada bajariladi
+# (tsvector + pg_trgm), bir nechta worker uchun. SQLite da doim memory
+SEARCH_BACKEND = (os.getenv("SEARCH_BACKEND") or "memory").lower()
+# "Balki shuni izlagandirsiz" tavsiyalari uchun vaqt chegarasi (ms) - oshsa topilgani qaytadi
+SUGGEST_BUDGET_MS = float(os.getenv("SUGGEST_BUDGET_MS") or 5)
+
+# ============ INLINE REJIM ============
+# @bot <so'rov> - bir sahifadagi natijalar (Telegram ko'pi bilan 50 ta qabul qiladi)
+INLINE_PAGE_SIZE = int(os.getenv("INLINE_PAGE_SIZE") or 20)
+# Bitta so'rov uchun jami natijalar (sahifalar shundan kesiladi)
+INLINE_MAX_RESULTS = int(os.getenv("INLINE_MAX_RESULTS") or 50)
+# Telegram serveri javobni necha soniya keshlaydi
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME") or 300)
+# Bot ichidagi kesh: normallashgan so'rov -> natijalar
+INLINE_CACHE_TTL = int(os.getenv("INLINE_CACHE_TTL") or 120)
+INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE") or 2000)
+
+# ============ TREND REYTINGI ============
+# Har bir ro'yxat (trend / haftalik / umumiy) uchun xotirada saqlanadigan top-k
+TRENDING_TOP_K = int(os.getenv("TRENDING_TOP_K") or 50)
+# Trend balli shuncha soatda ikki barobar kamayadi
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS") or 12)
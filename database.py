@@ -1,151 +1,402 @@
+import asyncio
+import contextvars
+import functools
 import json
 import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-# PostgreSQL sozlamalari
-DB_HOST = os.environ.get("DB_HOST", "localhost")
-DB_PORT = os.environ.get("DB_PORT", "5432")
-DB_NAME = os.environ.get("DB_NAME", "telegram_bot")
-DB_USER = os.environ.get("DB_USER", "postgres")
-DB_PASSWORD = os.environ.get("DB_PASSWORD", "")
+# PostgreSQL sozlamalari (config.py .env ni ham o'qiydi)
+from config import (
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DATABASE_URL,
+    DB_POOL_MIN, DB_POOL_MAX, DB_HEALTH_CHECK_INTERVAL, DB_RECONNECT_INTERVAL,
+    DB_BACKEND, SQLITE_PATH, POSTGRES_CONFIGURED
+)
+from cache import user_state
+from request_context import count_query
 
-# JSON fallback uchun (agar PostgreSQL ishlamasa)
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Eski JSON fayllar - faqat bir martalik import va export uchun
+
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
 MOVIES_FILE = os.path.join(DATA_DIR, "movies.json")
 CHANNELS_FILE = os.path.join(DATA_DIR, "channels.json")
 ADMINS_FILE = os.path.join(DATA_DIR, "admins.json")
 REQUESTS_FILE = os.path.join(DATA_DIR, "requests.json")
 
-_connection = None
-
-def get_connection():
-    """PostgreSQL ulanishini olish"""
-    global _connection
-    if _connection is None or _connection.closed:
-        _connection = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
+# ============ CONNECTION POOL ============
+_pool = None
+_pool_lock = threading.Lock()
+# getconn() bo'sh ulanish bo'lmasa kutmaydi (PoolError beradi), shuning uchun
+# ulanishlar sonini semafor bilan cheklab, navbatda kutamiz
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_last_used: Dict[int, float] = {}
+_next_reconnect = 0.0
+
+# Bloklovchi so'rovlar shu pool'da bajariladi - event loop to'xtamaydi
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX, thread_name_prefix="db")
+
+def _connect_kwargs() -> dict:
+    if DATABASE_URL:
+        return {"dsn": DATABASE_URL, "connect_timeout": 5}
+    return {
+        "host": DB_HOST,
+        "port": DB_PORT,
+        "dbname": DB_NAME,
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+        "connect_timeout": 5,
+    }
+
+def connect_listener():
+    """LISTEN uchun pool'dan tashqari alohida autocommit ulanish"""
+    conn = psycopg2.connect(**_connect_kwargs())
+    conn.autocommit = True
+    return conn
+
+def get_pool() -> ThreadedConnectionPool:
+    """Connection pool'ni olish (kerak bo'lsa qayta yaratish)"""
+    global _pool, _next_reconnect
+    if _pool is not None and not _pool.closed:
+        return _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            return _pool
+        # Server o'chiq bo'lsa har bir so'rovda connect_timeout kutmaslik uchun
+        if time.monotonic() < _next_reconnect:
+            raise psycopg2.OperationalError("PostgreSQL vaqtincha mavjud emas")
+        try:
+            _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **_connect_kwargs())
+        except psycopg2.Error:
+            _next_reconnect = time.monotonic() + DB_RECONNECT_INTERVAL
+            raise
+        return _pool
+
+def close_pool():
+    """Barcha ulanishlarni yopish (bot to'xtaganda)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _last_used.clear()
+    _close_sqlite()
+
+def _is_alive(conn) -> bool:
+    if conn.closed:
+        return False
+    idle = time.monotonic() - _last_used.get(id(conn), 0.0)
+    if idle < DB_HEALTH_CHECK_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _checkout(pool: ThreadedConnectionPool):
+    """Pool'dan tirik ulanish olish - o'lik ulanish yopilib, yangisi ochiladi"""
+    conn = pool.getconn()
+    if not _is_alive(conn):
+        _last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+    return conn
+
+@contextmanager
+def _pg_cursor(dict_rows: bool = False):
+    """Pool'dan ulanish olib cursor berish, oxirida commit/rollback qilib qaytarish"""
+    _pool_slots.acquire()
+    pool = None
+    conn = None
+    broken = False
+    try:
+        pool = get_pool()
+        conn = _checkout(pool)
+        cursor = conn.cursor(cursor_factory=RealDictCursor if dict_rows else None)
+        try:
+            yield cursor
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except BaseException:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            try:
+                cursor.close()
+            except psycopg2.Error:
+                pass
+    finally:
+        if conn is not None:
+            _last_used[id(conn)] = time.monotonic()
+            try:
+                pool.putconn(conn, close=broken or bool(conn.closed))
+            except PoolError:
+                pass
+        _pool_slots.release()
+
+# ============ SQLITE (WAL) ============
+# PostgreSQL bo'lmaganda ishlaydigan lokal baza. Har bir thread o'z ulanishiga ega,
+# WAL rejimida o'quvchilar yozuvchini kutmaydi.
+_sqlite_local = threading.local()
+_sqlite_connections = []
+_sqlite_lock = threading.Lock()
+
+def _dict_row(cursor, row) -> dict:
+    return {column[0]: row[i] for i, column in enumerate(cursor.description)}
+
+def _get_sqlite_connection() -> sqlite3.Connection:
+    conn = getattr(_sqlite_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(SQLITE_PATH) or ".", exist_ok=True)
+        # isolation_level=None - tranzaksiyalarni o'zimiz BEGIN/COMMIT bilan boshqaramiz
+        conn = sqlite3.connect(
+            SQLITE_PATH,
+            timeout=10,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256
         )
-    return _connection
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        _sqlite_local.conn = conn
+        with _sqlite_lock:
+            _sqlite_connections.append(conn)
+    return conn
 
-def init_database():
-    """Jadvallarni yaratish"""
+class _SQLiteCursor:
+    """psycopg2 uslubidagi so'rovlarni (%s) sqlite3 ga (?) moslashtirish"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params=()):
+        self._cursor.execute(sql.replace("%s", "?"), tuple(params or ()))
+        return self
+
+    def executemany(self, sql: str, seq):
+        self._cursor.executemany(sql.replace("%s", "?"), seq)
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+@contextmanager
+def _sqlite_cursor(dict_rows: bool = False):
+    conn = _get_sqlite_connection()
+    cursor = conn.cursor()
+    if dict_rows:
+        cursor.row_factory = _dict_row
+    cursor.execute("BEGIN")
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id VARCHAR(50) PRIMARY KEY,
-                first_name VARCHAR(255),
-                username VARCHAR(255),
-                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                limit_count INTEGER DEFAULT 0,
-                favorites TEXT DEFAULT '[]',
-                banned BOOLEAN DEFAULT FALSE,
-                referrals INTEGER DEFAULT 0
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS movies (
-                code VARCHAR(50) PRIMARY KEY,
-                name VARCHAR(500),
-                genre VARCHAR(255),
-                channel_id VARCHAR(100),
-                message_id VARCHAR(50),
-                added_by VARCHAR(50),
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                views INTEGER DEFAULT 0
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS channels (
-                channel_id VARCHAR(100) PRIMARY KEY,
-                name VARCHAR(255),
-                invite_link TEXT
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admins (
-                user_id VARCHAR(50) PRIMARY KEY,
-                role VARCHAR(50) DEFAULT 'admin',
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                added_by VARCHAR(50),
-                source VARCHAR(50) DEFAULT 'manual'
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS requests (
-                request_id SERIAL PRIMARY KEY,
-                user_id VARCHAR(50),
-                movie_name VARCHAR(500),
-                status VARCHAR(50) DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        conn.commit()
+        yield _SQLiteCursor(cursor)
+        cursor.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
         cursor.close()
-        print("✅ PostgreSQL jadvallari yaratildi!")
-        
+
+def backup_sqlite(filename: str):
+    """SQLite bazani ishlayotgan paytda izchil nusxalash"""
+    target = sqlite3.connect(filename)
+    try:
+        _get_sqlite_connection().backup(target)
+    finally:
+        target.close()
+
+def _close_sqlite():
+    with _sqlite_lock:
+        for conn in _sqlite_connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _sqlite_connections.clear()
+    _sqlite_local.__dict__.clear()
+
+# ============ BACKEND ============
+_backend = None
+
+def get_backend() -> str:
+    """Faol backend: "postgres" yoki "sqlite" (jarayon davomida o'zgarmaydi).
+    PostgreSQL ning o'sha paytda ishlayotgani tanlovga ta'sir qilmaydi - aks holda
+    vaqtinchalik uzilishda yozuvlar SQLite ga tushib, keyingi ishga tushishda yo'qolardi"""
+    global _backend
+    if _backend is None:
+        if DB_BACKEND == "sqlite":
+            _backend = "sqlite"
+        elif DB_BACKEND == "postgres" or POSTGRES_CONFIGURED:
+            _backend = "postgres"
+        else:
+            print(f"ℹ️ PostgreSQL sozlanmagan (DATABASE_URL / DB_HOST) - SQLite rejimi: {SQLITE_PATH}")
+            _backend = "sqlite"
+    return _backend
+
+def db_cursor(dict_rows: bool = False):
+    """Faol backend cursori. So'rovlar %s placeholder bilan yoziladi"""
+    count_query()
+    if get_backend() == "sqlite":
+        return _sqlite_cursor(dict_rows)
+    return _pg_cursor(dict_rows)
+
+async def run_db(func, *args, **kwargs):
+    """Bloklovchi DB funksiyasini event loop'ni to'xtatmasdan bajarish.
+    contextvars nusxalanadi - thread ichida ham joriy update konteksti ko'rinadi"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_db_executor, functools.partial(context.run, func, *args, **kwargs))
+
+# ============ BULK WRITE ============
+# Bitta INSERT ga joylanadigan qatorlar soni
+BULK_PAGE_SIZE = 1000
+
+def bulk_upsert(table: str, columns: list, rows: list, conflict: str,
+                update: list = None, do_nothing: bool = False) -> dict:
+    """Ko'p qatorni multi-row VALUES bilan bir necha so'rovda yozish (SQLite'da executemany).
+
+    update - konfliktda yangilanadigan ustunlar (default: kalitdan boshqa hammasi),
+    do_nothing=True bo'lsa mavjud qatorlar o'zgarmaydi.
+    Natija: {"table", "rows", "elapsed"}
+    """
+    started = time.perf_counter()
+    if rows:
+        if do_nothing:
+            on_conflict = f"ON CONFLICT ({conflict}) DO NOTHING"
+        else:
+            update = update or [c for c in columns if c != conflict]
+            assignments = ", ".join(f"{c} = EXCLUDED.{c}" for c in update)
+            on_conflict = f"ON CONFLICT ({conflict}) DO UPDATE SET {assignments}"
+        with db_cursor() as cursor:
+            if get_backend() == "sqlite":
+                # SQLite'da tarmoq yo'q - bitta tranzaksiyadagi executemany yetarli
+                placeholders = ", ".join(["%s"] * len(columns))
+                cursor.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) {on_conflict}",
+                    rows
+                )
+            else:
+                execute_values(
+                    cursor,
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s {on_conflict}",
+                    rows,
+                    page_size=BULK_PAGE_SIZE
+                )
+    return {"table": table, "rows": len(rows), "elapsed": time.perf_counter() - started}
+
+def format_bulk_report(report: dict) -> str:
+    return f"{report['table']}: {report['rows']} ta qator, {report['elapsed']:.2f}s"
+
+def init_database():
+    """Sxema versiyasini tekshirish, kerak bo'lsa migratsiyalarni qo'llash.
+    Sxema LATEST_VERSION ga yetmasa RuntimeError - eski sxemada bot ishlamaydi"""
+    from migrations import LATEST_VERSION, get_schema_version, apply_migrations, ensure_search_schema
+    version = get_schema_version()
+    if version < LATEST_VERSION:
+        try:
+            applied = apply_migrations()
+        except Exception as e:
+            raise RuntimeError(f"Migratsiya xatosi ({get_backend()}): {e}") from e
+        current = get_schema_version()
+        if current < LATEST_VERSION:
+            raise RuntimeError(f"Sxema v{current} da qoldi, kerak v{LATEST_VERSION}")
+        print(f"✅ Sxema yangilandi: v{version} -> v{LATEST_VERSION} ({len(applied)} ta migratsiya)")
+    else:
+        print(f"✅ Sxema versiyasi: v{version}")
+    ensure_search_schema()
+
+    try:
         # JSON'dan ma'lumotlarni ko'chirish
         migrate_from_json()
         
+        if get_backend() == "postgres" and os.path.exists(SQLITE_PATH):
+            print(f"⚠️ {SQLITE_PATH} mavjud: undagi ma'lumotlar PostgreSQL ga avtomatik ko'chirilmaydi")
+        
     except Exception as e:
-        print(f"❌ Database xatosi: {e}")
-        print("⚠️ JSON rejimida ishlanmoqda...")
+        print(f"❌ Database xatosi ({get_backend()}): {e}")
+
+def _needs_import(filename: str) -> bool:
+    if not os.path.exists(filename):
+        return False
+    # SQLite ga import qilingan fayl joyida qoladi (PostgreSQL ga o'tilganda yana kerak)
+    return get_backend() == "postgres" or not os.path.exists(filename + ".sqlite-imported")
+
+def _mark_imported(filename: str):
+    """Import qilingan faylni qayta import qilinmasligi uchun belgilash: PostgreSQL da
+    nomi o'zgartiriladi, SQLite da yoniga belgi fayl qo'yiladi"""
+    if get_backend() == "postgres":
+        os.replace(filename, filename + ".imported")
+    else:
+        open(filename + ".sqlite-imported", "w").close()
 
 def migrate_from_json():
-    """Eski JSON ma'lumotlarni PostgreSQL'ga ko'chirish"""
+    """Eski JSON ma'lumotlarni bazaga bir marta ko'chirish"""
     try:
         # Users
-        if os.path.exists(USERS_FILE):
+        if _needs_import(USERS_FILE):
             users = load_json(USERS_FILE)
-            for uid, data in users.items():
-                add_user(uid, data.get('first_name'), data.get('username'))
-            print(f"✅ {len(users)} ta user ko'chirildi")
+            rows = [
+                (uid, data.get('first_name'), data.get('username'), data.get('limit', 0),
+                 json.dumps(data.get('favorites', [])), json.dumps(data.get('history', [])),
+                 data.get('banned', False), data.get('referrals', 0))
+                for uid, data in users.items()
+            ]
+            report = bulk_upsert(
+                "users",
+                ["user_id", "first_name", "username", "limit_count", "favorites", "history", "banned", "referrals"],
+                rows, conflict="user_id", update=["first_name", "username"]
+            )
+            print(f"✅ {len(users)} ta user ko'chirildi ({format_bulk_report(report)})")
+            _mark_imported(USERS_FILE)
         
         # Movies
-        if os.path.exists(MOVIES_FILE):
+        if _needs_import(MOVIES_FILE):
             movies = load_json(MOVIES_FILE)
-            for code, data in movies.items():
-                add_movie(
-                    code, 
-                    data.get('name'), 
-                    data.get('genre'), 
-                    data.get('channel_id'), 
-                    data.get('message_id'), 
-                    data.get('added_by')
-                )
-            print(f"✅ {len(movies)} ta movie ko'chirildi")
+            report = bulk_upsert("movies", _MOVIE_WRITE_COLUMNS, _movie_rows(movies), conflict="code", do_nothing=True)
+            print(f"✅ {len(movies)} ta movie ko'chirildi ({format_bulk_report(report)})")
+            _mark_imported(MOVIES_FILE)
         
         # Channels
-        if os.path.exists(CHANNELS_FILE):
+        if _needs_import(CHANNELS_FILE):
             channels = load_json(CHANNELS_FILE)
-            for cid, data in channels.items():
-                add_channel(cid, data.get('name'), data.get('invite_link'))
-            print(f"✅ {len(channels)} ta channel ko'chirildi")
+            rows = [(cid, data.get('name'), data.get('invite_link')) for cid, data in channels.items()]
+            report = bulk_upsert("channels", ["channel_id", "name", "invite_link"], rows, conflict="channel_id")
+            print(f"✅ {len(channels)} ta channel ko'chirildi ({format_bulk_report(report)})")
+            _mark_imported(CHANNELS_FILE)
         
         # Admins
-        if os.path.exists(ADMINS_FILE):
+        if _needs_import(ADMINS_FILE):
             admins = load_json(ADMINS_FILE)
-            for aid, data in admins.items():
-                add_admin(aid, data.get('role', 'admin'), data.get('added_by'), data.get('source', 'manual'))
-            print(f"✅ {len(admins)} ta admin ko'chirildi")
+            rows = [
+                (aid, data.get('role', 'admin'), datetime.now(), data.get('added_by'), data.get('source', 'manual'))
+                for aid, data in admins.items()
+            ]
+            report = bulk_upsert(
+                "admins", ["user_id", "role", "added_at", "added_by", "source"], rows,
+                conflict="user_id", update=["role", "added_by", "source"]
+            )
+            print(f"✅ {len(admins)} ta admin ko'chirildi ({format_bulk_report(report)})")
+            _mark_imported(ADMINS_FILE)
             
     except Exception as e:
         print(f"Migration xatosi: {e}")
@@ -164,133 +415,422 @@ def load_json(filename: str) -> dict:
 def save_json(filename: str, data: dict):
     try:
         with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+            json.dump(data, f, ensure_ascii=False, indent=4, default=str)
     except Exception as e:
         print(f"Error saving {filename}: {e}")
 
+def export_json_snapshots(directory: str) -> list:
+    """Jadvallarni JSON fayllarga yozish (admin export/backup uchun)"""
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for name, getter in (("users", get_users), ("movies", get_movies),
+                         ("channels", get_channels), ("admins", get_admins)):
+        filename = os.path.join(directory, f"{name}.json")
+        save_json(filename, getter())
+        files.append(filename)
+    return files
+
 # ============ USERS ============
+# users.py dagi maydon nomlari -> users jadvali ustunlari
+USER_COLUMNS = {
+    "first_name": "first_name",
+    "username": "username",
+    "joined_at": "joined_at",
+    "last_activity": "last_active",
+    "limit": "limit_count",
+    "favorites": "favorites",
+    "history": "history",
+    "banned": "banned",
+    "referrals": "referrals",
+}
+_USER_JSON_FIELDS = ("favorites", "history")
+
+def _user_from_row(row) -> dict:
+    """DB qatorini users.py kutadigan ko'rinishga keltirish"""
+    user = {"user_id": str(row["user_id"])}
+    for field, column in USER_COLUMNS.items():
+        if column in row:
+            user[field] = row[column]
+    for field in _USER_JSON_FIELDS:
+        value = user.get(field)
+        if isinstance(value, str):
+            user[field] = json.loads(value)
+        elif value is None:
+            user[field] = []
+    # SQLite BOOLEAN ni 0/1 qilib qaytaradi
+    user["banned"] = bool(user.get("banned"))
+    for field in ("joined_at", "last_activity"):
+        if isinstance(user.get(field), datetime):
+            user[field] = user[field].isoformat()
+    return user
+
+def _user_columns(fields: dict) -> Dict[str, Any]:
+    """Maydonlarni ustun -> qiymat ko'rinishiga o'tkazish"""
+    values = {}
+    for field, value in fields.items():
+        if field not in USER_COLUMNS:
+            raise ValueError(f"Noma'lum user maydoni: {field}")
+        if field in _USER_JSON_FIELDS and not isinstance(value, str):
+            value = json.dumps(value)
+        values[USER_COLUMNS[field]] = value
+    return values
+
 def get_users() -> dict:
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM users")
-        rows = cursor.fetchall()
-        cursor.close()
+        with db_cursor(dict_rows=True) as cursor:
+            cursor.execute("SELECT * FROM users")
+            rows = cursor.fetchall()
         
         users = {}
         for row in rows:
-            uid = str(row['user_id'])
-            users[uid] = dict(row)
-            if isinstance(users[uid].get('favorites'), str):
-                users[uid]['favorites'] = json.loads(users[uid]['favorites'])
+            user = _user_from_row(row)
+            users[user["user_id"]] = user
         return users
-    except:
-        return load_json(USERS_FILE)
+    except Exception as e:
+        print(f"Error loading users: {e}")
+        return {}
 
-def save_users(users: dict):
+def save_users(users: dict) -> dict:
+    rows = []
+    for uid, data in users.items():
+        fav = json.dumps(data.get('favorites', [])) if isinstance(data.get('favorites'), list) else data.get('favorites', '[]')
+        history = json.dumps(data.get('history', [])) if isinstance(data.get('history'), list) else data.get('history', '[]')
+        rows.append((uid, data.get('first_name'), data.get('username'),
+                     data.get('limit', 0), fav, history, data.get('banned', False),
+                     data.get('referrals', 0)))
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        for uid, data in users.items():
-            fav = json.dumps(data.get('favorites', [])) if isinstance(data.get('favorites'), list) else data.get('favorites', '[]')
-            cursor.execute("""
-                INSERT INTO users (user_id, first_name, username, limit_count, favorites, banned, referrals)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (user_id) DO UPDATE SET
-                    first_name = EXCLUDED.first_name,
-                    username = EXCLUDED.username,
-                    limit_count = EXCLUDED.limit_count,
-                    favorites = EXCLUDED.favorites,
-                    banned = EXCLUDED.banned,
-                    referrals = EXCLUDED.referrals
-            """, (uid, data.get('first_name'), data.get('username'), 
-                  data.get('limit_count', 0), fav, data.get('banned', False), 
-                  data.get('referrals', 0)))
-        conn.commit()
-        cursor.close()
+        report = bulk_upsert(
+            "users",
+            ["user_id", "first_name", "username", "limit_count", "favorites", "history", "banned", "referrals"],
+            rows, conflict="user_id"
+        )
+        user_state.clear()
+        return report
     except Exception as e:
         print(f"Error saving users: {e}")
-        save_json(USERS_FILE, users)
+        return {"table": "users", "rows": 0, "elapsed": 0.0}
+
+def get_user(user_id: str) -> Optional[dict]:
+    """Bitta foydalanuvchini PRIMARY KEY bo'yicha olish"""
+    try:
+        with db_cursor(dict_rows=True) as cursor:
+            cursor.execute("SELECT * FROM users WHERE user_id = %s", (str(user_id),))
+            row = cursor.fetchone()
+        return _user_from_row(row) if row else None
+    except Exception as e:
+        print(f"Error loading user: {e}")
+        return None
+
+def user_exists(user_id: str) -> bool:
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("SELECT 1 FROM users WHERE user_id = %s", (str(user_id),))
+            return cursor.fetchone() is not None
+    except Exception as e:
+        print(f"Error loading user: {e}")
+        return False
+
+def get_user_counts() -> dict:
+    """Statistika uchun sonlar - jadvallarni xotiraga yuklamasdan"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT (SELECT COUNT(*) FROM users),
+                       (SELECT COUNT(*) FROM users WHERE banned),
+                       (SELECT COUNT(*) FROM admins)
+            """)
+            users, banned, admins = cursor.fetchone()
+        return {"users": users, "banned": banned, "admins": admins}
+    except Exception as e:
+        print(f"Error counting users: {e}")
+        return {"users": 0, "banned": 0, "admins": 0}
+
+def get_banned_users(limit: int) -> list:
+    """Bloklanganlar: [(user_id, first_name)] (idx_users_banned bo'yicha)"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(
+                "SELECT user_id, first_name FROM users WHERE banned ORDER BY user_id LIMIT %s",
+                (limit,)
+            )
+            return [(str(uid), name) for uid, name in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error loading banned users: {e}")
+        return []
+
+def create_user(user_id: str, **fields) -> bool:
+    """Yangi foydalanuvchi qo'shish. Mavjud bo'lsa hech narsa o'zgarmaydi"""
+    values = _user_columns(fields)
+    columns = ["user_id"] + list(values)
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO users ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))}) "
+                f"ON CONFLICT (user_id) DO NOTHING",
+                [str(user_id)] + list(values.values())
+            )
+            return cursor.rowcount > 0
+    except Exception as e:
+        print(f"Error creating user: {e}")
+        return False
+
+def update_user(user_id: str, **fields) -> bool:
+    """Faqat berilgan maydonlarni bitta qatorda yangilash"""
+    if not fields:
+        return False
+    values = _user_columns(fields)
+    assignments = ", ".join(f"{column} = %s" for column in values)
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(
+                f"UPDATE users SET {assignments} WHERE user_id = %s",
+                list(values.values()) + [str(user_id)]
+            )
+            return cursor.rowcount > 0
+    except Exception as e:
+        print(f"Error updating user: {e}")
+        return False
+
+def consume_user_limit(user_id: str) -> Optional[int]:
+    """Limit > 0 bo'lsa bittaga kamaytirish va qolganini qaytarish, aks holda None"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("""
+                UPDATE users SET limit_count = limit_count - 1
+                WHERE user_id = %s AND limit_count > 0
+                RETURNING limit_count
+            """, (str(user_id),))
+            row = cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        print(f"Error consuming limit: {e}")
+        return None
+
+def increment_user(user_id: str, **deltas) -> bool:
+    """Sonli maydonlarni atomar oshirish (limit, referrals)"""
+    if not deltas:
+        return False
+    values = _user_columns(deltas)
+    assignments = ", ".join(f"{column} = COALESCE({column}, 0) + %s" for column in values)
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(
+                f"UPDATE users SET {assignments} WHERE user_id = %s",
+                list(values.values()) + [str(user_id)]
+            )
+            return cursor.rowcount > 0
+    except Exception as e:
+        print(f"Error updating user: {e}")
+        return False
 
 def add_user(user_id: str, first_name: str = None, username: str = None):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO users (user_id, first_name, username, joined_at, last_active)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (user_id) DO UPDATE SET
-                first_name = EXCLUDED.first_name,
-                username = EXCLUDED.username,
-                last_active = CURRENT_TIMESTAMP
-        """, (user_id, first_name, username, datetime.now(), datetime.now()))
-        conn.commit()
-        cursor.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO users (user_id, first_name, username, joined_at, last_active)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    first_name = EXCLUDED.first_name,
+                    username = EXCLUDED.username,
+                    last_active = CURRENT_TIMESTAMP
+            """, (user_id, first_name, username, datetime.now(), datetime.now()))
     except Exception as e:
         print(f"Error adding user: {e}")
 
 # ============ MOVIES ============
-def get_movies() -> dict:
+# Kino qo'shilganda/o'chirilganda shu kanalga NOTIFY yuboriladi (payload - kod)
+CATALOG_CHANNEL = "movies_changed"
+
+def _notify_movie_changed(cursor, code: str):
+    if get_backend() == "postgres":
+        cursor.execute("SELECT pg_notify(%s, %s)", (CATALOG_CHANNEL, code))
+
+# Lotin harflariga o'xshash kirill harflari (kodni telefonda terganda adashtiriladi)
+_CODE_LOOKALIKES = str.maketrans("авекмнорстухіјѕё", "abekmhopctyxijse")
+
+def normalize_code(text) -> str:
+    """Kod kaliti (code_norm): NFKC, bo'shliqlarsiz, kichik harf, o'xshash kirill -> lotin.
+    "UZB 001", "uzb001" va kirillcha "UZВ001" bir xil kalit beradi"""
+    text = unicodedata.normalize("NFKC", str(text or ""))
+    return "".join(text.split()).lower().translate(_CODE_LOOKALIKES)
+
+def _movie_rows(movies: dict) -> list:
+    """save_movies / JSON import qatorlari. code_norm bir xil bo'lib qolgan
+    kodlarning birinchisidan boshqasiga NULL (unique indeks buzilmasin)"""
+    rows, seen = [], set()
+    for code, data in movies.items():
+        code_norm = normalize_code(code)
+        if code_norm in seen:
+            print(f"⚠️ Kod {code!r} boshqa kod bilan bir xil normallashadi ({code_norm!r})")
+            code_norm = None
+        seen.add(code_norm)
+        rows.append((
+            code, code_norm, data.get('name'), data.get('genre'), str(data.get('channel_id')),
+            str(data.get('message_id')), data.get('added_by'),
+            data.get('added_at', datetime.now()), data.get('views', 0)
+        ))
+    return rows
+
+_MOVIE_WRITE_COLUMNS = ["code", "code_norm", "name", "genre", "channel_id", "message_id", "added_by", "added_at", "views"]
+
+# search_vector (v6) kabi xizmat ustunlari katalogga yuklanmaydi. code_norm - katalogdagi
+# kod indeksi find_movie_code bilan bir xil kalitlarni bersin (to'qnashuvda ham)
+MOVIE_COLUMNS = ["code", "code_norm", "name", "genre", "channel_id", "message_id", "added_by", "added_at", "views"]
+_MOVIE_SELECT = ", ".join(MOVIE_COLUMNS)
+
+def get_movie(code: str) -> Optional[dict]:
+    try:
+        with db_cursor(dict_rows=True) as cursor:
+            cursor.execute(f"SELECT {_MOVIE_SELECT} FROM movies WHERE code = %s", (code,))
+            row = cursor.fetchone()
+        return dict(row) if row else None
+    except Exception as e:
+        print(f"Error loading movie: {e}")
+        return None
+
+def find_movie_code(code_norm: str) -> Optional[str]:
+    """normalize_code() natijasi -> bazadagi kod (idx_movies_code_norm)"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM movies")
+        with db_cursor() as cursor:
+            cursor.execute("SELECT code FROM movies WHERE code_norm = %s", (code_norm,))
+            row = cursor.fetchone()
+        return str(row[0]) if row else None
+    except Exception as e:
+        print(f"Error finding movie code: {e}")
+        return None
+
+def load_movies() -> dict:
+    """Barcha kinolar: code -> dict. Xato bo'lsa exception (bo'sh natija emas) -
+    katalog vaqtinchalik xatoni "kino yo'q" deb saqlab qo'ymasligi uchun"""
+    with db_cursor(dict_rows=True) as cursor:
+        cursor.execute(f"SELECT {_MOVIE_SELECT} FROM movies")
         rows = cursor.fetchall()
-        cursor.close()
-        
-        movies = {}
-        for row in rows:
-            code = str(row['code'])
-            movies[code] = dict(row)
-        return movies
-    except:
-        return load_json(MOVIES_FILE)
+    return {str(row['code']): dict(row) for row in rows}
 
-def save_movies(movies: dict):
+def get_movies() -> dict:
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        for code, data in movies.items():
-            cursor.execute("""
-                INSERT INTO movies (code, name, genre, channel_id, message_id, added_by, added_at, views)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (code) DO UPDATE SET
-                    name = EXCLUDED.name,
-                    genre = EXCLUDED.genre,
-                    channel_id = EXCLUDED.channel_id,
-                    message_id = EXCLUDED.message_id,
-                    views = EXCLUDED.views
-            """, (code, data.get('name'), data.get('genre'), str(data.get('channel_id')),
-                  str(data.get('message_id')), data.get('added_by'), 
-                  data.get('added_at', datetime.now()), data.get('views', 0)))
-        conn.commit()
-        cursor.close()
+        return load_movies()
+    except Exception as e:
+        print(f"Error loading movies: {e}")
+        return {}
+
+def save_movies(movies: dict) -> dict:
+    rows = _movie_rows(movies)
+    try:
+        return bulk_upsert(
+            "movies", _MOVIE_WRITE_COLUMNS, rows, conflict="code",
+            update=["name", "genre", "channel_id", "message_id", "views"]
+        )
     except Exception as e:
         print(f"Error saving movies: {e}")
-        save_json(MOVIES_FILE, movies)
+        return {"table": "movies", "rows": 0, "elapsed": 0.0}
 
 def add_movie(code: str, name: str, genre: str, channel_id: str, message_id: str, added_by: str):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO movies (code, name, genre, channel_id, message_id, added_by, added_at, views)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (code, name, genre, str(channel_id), str(message_id), added_by, datetime.now(), 0))
-        conn.commit()
-        cursor.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO movies (code, code_norm, name, genre, channel_id, message_id, added_by, added_at, views)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (code, normalize_code(code), name, genre, str(channel_id), str(message_id), added_by, datetime.now(), 0))
+            _notify_movie_changed(cursor, code)
         return True
     except Exception as e:
         print(f"Error adding movie: {e}")
         return False
 
+def add_movie_views(deltas: Dict[str, int], hourly: Dict[int, Dict[str, int]] = None) -> bool:
+    """Bir nechta kinoning ko'rishlarini bitta so'rovda oshirish.
+    hourly - soat -> {kod: soni} (v8, trend uchun), shu tranzaksiyada yoziladi"""
+    try:
+        with db_cursor() as cursor:
+            if get_backend() == "sqlite":
+                cursor.executemany(
+                    "UPDATE movies SET views = COALESCE(views, 0) + %s WHERE code = %s",
+                    [(delta, code) for code, delta in deltas.items()]
+                )
+            else:
+                execute_values(cursor, """
+                    UPDATE movies AS m SET views = COALESCE(m.views, 0) + v.delta
+                    FROM (VALUES %s) AS v(code, delta)
+                    WHERE m.code = v.code
+                """, list(deltas.items()))
+            if hourly:
+                _add_hourly_views(cursor, hourly)
+        return True
+    except Exception as e:
+        print(f"Error adding views: {e}")
+        return False
+
+def _add_hourly_views(cursor, hourly: Dict[int, Dict[str, int]]):
+    rows = [(code, hour, delta) for hour, deltas in hourly.items() for code, delta in deltas.items()]
+    sql = """
+        INSERT INTO movie_views_hourly (code, hour, views) VALUES {values}
+        ON CONFLICT (code, hour) DO UPDATE SET views = movie_views_hourly.views + excluded.views
+    """
+    if get_backend() == "sqlite":
+        cursor.executemany(sql.format(values="(%s, %s, %s)"), rows)
+    else:
+        execute_values(cursor, sql.format(values="%s"), rows)
+
+def prune_hourly_views(before_hour: int) -> int:
+    """Trend oynasidan chiqqan soatlik ko'rishlarni o'chirish (soatiga bir marta)"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("DELETE FROM movie_views_hourly WHERE hour < %s", (before_hour,))
+            return cursor.rowcount
+    except Exception as e:
+        print(f"Error pruning hourly views: {e}")
+        return 0
+
+def get_hourly_views(since_hour: int) -> list:
+    """since_hour dan beri soatlik ko'rishlar: [(code, hour, views)]"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(
+                "SELECT code, hour, views FROM movie_views_hourly WHERE hour >= %s",
+                (since_hour,)
+            )
+            return [(str(code), hour, views) for code, hour, views in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error loading hourly views: {e}")
+        return []
+
+def search_movies_db(query: str, limit: int = 10) -> list:
+    """PostgreSQL da qidirish (v6: search_vector, pg_trgm, uz_normalize).
+    To'liq matn mosligi + so'z o'xshashligi bo'yicha tartiblangan eng yaxshi limit ta: [(code, dict)]"""
+    if get_backend() != "postgres" or not query.strip():
+        return []
+    try:
+        with db_cursor(dict_rows=True) as cursor:
+            cursor.execute(f"""
+                SELECT {_MOVIE_SELECT},
+                       ts_rank(search_vector, tsq) * 2
+                       + word_similarity(q, uz_normalize(COALESCE(name, '')))
+                       + CASE WHEN uz_normalize(code) = q THEN 2 ELSE 0 END AS score
+                FROM movies, uz_normalize(%s) AS q, plainto_tsquery('simple', uz_normalize(%s)) AS tsq
+                WHERE search_vector @@ tsq
+                   OR q <%% uz_normalize(COALESCE(name, ''))
+                   OR uz_normalize(code) %% q
+                ORDER BY score DESC, views DESC
+                LIMIT %s
+            """, (query, query, limit))
+            rows = cursor.fetchall()
+        results = []
+        for row in rows:
+            row = dict(row)
+            row.pop("score", None)
+            results.append((str(row["code"]), row))
+        return results
+    except Exception as e:
+        print(f"Error searching movies: {e}")
+        return []
+
 def delete_movie(code: str) -> bool:
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM movies WHERE code = %s", (code,))
-        conn.commit()
-        cursor.close()
+        with db_cursor() as cursor:
+            cursor.execute("DELETE FROM movies WHERE code = %s", (code,))
+            _notify_movie_changed(cursor, code)
         return True
     except Exception as e:
         print(f"Error deleting movie: {e}")
@@ -299,51 +839,37 @@ def delete_movie(code: str) -> bool:
 # ============ CHANNELS ============
 def get_channels() -> dict:
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM channels")
-        rows = cursor.fetchall()
-        cursor.close()
+        with db_cursor(dict_rows=True) as cursor:
+            cursor.execute("SELECT * FROM channels")
+            rows = cursor.fetchall()
         
         channels = {}
         for row in rows:
             cid = str(row['channel_id'])
             channels[cid] = dict(row)
         return channels
-    except:
-        return load_json(CHANNELS_FILE)
+    except Exception as e:
+        print(f"Error loading channels: {e}")
+        return {}
 
-def save_channels(channels: dict):
+def save_channels(channels: dict) -> dict:
+    rows = [(cid, data.get('name'), data.get('invite_link')) for cid, data in channels.items()]
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        for cid, data in channels.items():
+        return bulk_upsert("channels", ["channel_id", "name", "invite_link"], rows, conflict="channel_id")
+    except Exception as e:
+        print(f"Error saving channels: {e}")
+        return {"table": "channels", "rows": 0, "elapsed": 0.0}
+
+def add_channel(channel_id: str, name: str, invite_link: str = ""):
+    try:
+        with db_cursor() as cursor:
             cursor.execute("""
                 INSERT INTO channels (channel_id, name, invite_link)
                 VALUES (%s, %s, %s)
                 ON CONFLICT (channel_id) DO UPDATE SET
                     name = EXCLUDED.name,
                     invite_link = EXCLUDED.invite_link
-            """, (cid, data.get('name'), data.get('invite_link')))
-        conn.commit()
-        cursor.close()
-    except Exception as e:
-        print(f"Error saving channels: {e}")
-        save_json(CHANNELS_FILE, channels)
-
-def add_channel(channel_id: str, name: str, invite_link: str = ""):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO channels (channel_id, name, invite_link)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (channel_id) DO UPDATE SET
-                name = EXCLUDED.name,
-                invite_link = EXCLUDED.invite_link
-        """, (channel_id, name, invite_link))
-        conn.commit()
-        cursor.close()
+            """, (channel_id, name, invite_link))
         return True
     except Exception as e:
         print(f"Error adding channel: {e}")
@@ -351,38 +877,94 @@ def add_channel(channel_id: str, name: str, invite_link: str = ""):
 
 def remove_channel(channel_id: str) -> bool:
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM channels WHERE channel_id = %s", (channel_id,))
-        conn.commit()
-        cursor.close()
+        with db_cursor() as cursor:
+            cursor.execute("DELETE FROM channels WHERE channel_id = %s", (channel_id,))
+            cursor.execute("DELETE FROM channel_members WHERE channel_id = %s", (channel_id,))
         return True
     except Exception as e:
         print(f"Error removing channel: {e}")
         return False
 
+# ============ CHANNEL MEMBERS ============
+def get_channel_members() -> dict:
+    """(channel_id, user_id) -> (obuna bo'lganmi, updated_at - unix vaqt)"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("SELECT channel_id, user_id, subscribed, updated_at FROM channel_members")
+            rows = cursor.fetchall()
+        members = {}
+        for cid, uid, subscribed, updated_at in rows:
+            if isinstance(updated_at, str):
+                # SQLite vaqtni matn sifatida qaytaradi
+                updated_at = datetime.fromisoformat(updated_at)
+            members[(str(cid), int(uid))] = (bool(subscribed), updated_at.timestamp() if updated_at else 0.0)
+        return members
+    except Exception as e:
+        print(f"Error loading channel members: {e}")
+        return {}
+
+def prune_channel_members(before: datetime) -> int:
+    """before dan beri yangilanmagan a'zolik yozuvlarini o'chirish"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("DELETE FROM channel_members WHERE updated_at < %s", (before,))
+            return cursor.rowcount
+    except Exception as e:
+        print(f"Error pruning channel members: {e}")
+        return 0
+
+def set_channel_member(channel_id: str, user_id: int, subscribed: bool) -> bool:
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO channel_members (channel_id, user_id, subscribed, updated_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (channel_id, user_id) DO UPDATE SET
+                    subscribed = EXCLUDED.subscribed,
+                    updated_at = EXCLUDED.updated_at
+            """, (channel_id, str(user_id), subscribed, datetime.now()))
+        return True
+    except Exception as e:
+        print(f"Error saving channel member: {e}")
+        return False
+
 # ============ ADMINS ============
 def get_admins() -> dict:
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM admins")
-        rows = cursor.fetchall()
-        cursor.close()
+        with db_cursor(dict_rows=True) as cursor:
+            cursor.execute("SELECT * FROM admins")
+            rows = cursor.fetchall()
         
         admins = {}
         for row in rows:
             uid = str(row['user_id'])
             admins[uid] = dict(row)
         return admins
-    except:
-        return load_json(ADMINS_FILE)
+    except Exception as e:
+        print(f"Error loading admins: {e}")
+        return {}
 
-def save_admins(admins: dict):
+def save_admins(admins: dict) -> dict:
+    rows = [
+        (uid, data.get('role', 'admin'), data.get('added_at', datetime.now()),
+         data.get('added_by'), data.get('source', 'manual'))
+        for uid, data in admins.items()
+    ]
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        for uid, data in admins.items():
+        report = bulk_upsert(
+            "admins", ["user_id", "role", "added_at", "added_by", "source"], rows,
+            conflict="user_id", update=["role", "added_by", "source"]
+        )
+        for uid in admins:
+            user_state.invalidate(uid)
+        return report
+    except Exception as e:
+        print(f"Error saving admins: {e}")
+        return {"table": "admins", "rows": 0, "elapsed": 0.0}
+
+def add_admin(user_id: str, role: str = "admin", added_by: str = None, source: str = "manual"):
+    try:
+        with db_cursor() as cursor:
             cursor.execute("""
                 INSERT INTO admins (user_id, role, added_at, added_by, source)
                 VALUES (%s, %s, %s, %s, %s)
@@ -390,28 +972,8 @@ def save_admins(admins: dict):
                     role = EXCLUDED.role,
                     added_by = EXCLUDED.added_by,
                     source = EXCLUDED.source
-            """, (uid, data.get('role', 'admin'), data.get('added_at', datetime.now()),
-                  data.get('added_by'), data.get('source', 'manual')))
-        conn.commit()
-        cursor.close()
-    except Exception as e:
-        print(f"Error saving admins: {e}")
-        save_json(ADMINS_FILE, admins)
-
-def add_admin(user_id: str, role: str = "admin", added_by: str = None, source: str = "manual"):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO admins (user_id, role, added_at, added_by, source)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (user_id) DO UPDATE SET
-                role = EXCLUDED.role,
-                added_by = EXCLUDED.added_by,
-                source = EXCLUDED.source
-        """, (user_id, role, datetime.now(), added_by, source))
-        conn.commit()
-        cursor.close()
+            """, (user_id, role, datetime.now(), added_by, source))
+        user_state.invalidate(user_id)
         return True
     except Exception as e:
         print(f"Error adding admin: {e}")
@@ -419,24 +981,31 @@ def add_admin(user_id: str, role: str = "admin", added_by: str = None, source: s
 
 def remove_admin(user_id: str) -> bool:
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM admins WHERE user_id = %s", (user_id,))
-        conn.commit()
-        cursor.close()
+        with db_cursor() as cursor:
+            cursor.execute("DELETE FROM admins WHERE user_id = %s", (user_id,))
+        user_state.invalidate(user_id)
         return True
     except Exception as e:
         print(f"Error removing admin: {e}")
         return False
 
+def get_admin_role(user_id: str) -> Optional[str]:
+    """admins jadvalidagi rol yoki admin bo'lmasa None"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("SELECT role FROM admins WHERE user_id = %s", (str(user_id),))
+            result = cursor.fetchone()
+        return result[0] if result else None
+    except Exception as e:
+        print(f"Error getting admin role: {e}")
+        return None
+
 def is_admin_db(user_id: str) -> bool:
     """Database'dan admin tekshirish"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM admins WHERE user_id = %s", (str(user_id),))
-        result = cursor.fetchone()
-        cursor.close()
+        with db_cursor() as cursor:
+            cursor.execute("SELECT 1 FROM admins WHERE user_id = %s", (str(user_id),))
+            result = cursor.fetchone()
         return result is not None
     except:
         return False
@@ -444,76 +1013,111 @@ def is_admin_db(user_id: str) -> bool:
 def is_super_admin_db(user_id: str) -> bool:
     """Database'dan super admin tekshirish"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT role FROM admins WHERE user_id = %s", (str(user_id),))
-        result = cursor.fetchone()
-        cursor.close()
+        with db_cursor() as cursor:
+            cursor.execute("SELECT role FROM admins WHERE user_id = %s", (str(user_id),))
+            result = cursor.fetchone()
         return result is not None and result[0] == 'super_admin'
     except:
         return False
 
+# ============ BROADCASTS ============
+BROADCAST_COLUMNS = ["id", "from_chat_id", "message_id", "status_chat_id", "status_message_id",
+                     "created_by", "state", "last_user_id", "total", "sent", "failed"]
+
+def create_broadcast(from_chat_id, message_id, status_chat_id, status_message_id, created_by) -> Optional[int]:
+    """Yangi broadcast vazifasi. total - yaratilgan paytdagi foydalanuvchilar soni"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO broadcasts (from_chat_id, message_id, status_chat_id, status_message_id,
+                                        created_by, state, last_user_id, total, created_at, updated_at)
+                VALUES (%s, %s, %s, %s, %s, 'running', '', (SELECT COUNT(*) FROM users), %s, %s)
+                RETURNING id
+            """, (str(from_chat_id), str(message_id), str(status_chat_id), str(status_message_id),
+                  str(created_by), datetime.now(), datetime.now()))
+            return cursor.fetchone()[0]
+    except Exception as e:
+        print(f"Error creating broadcast: {e}")
+        return None
+
+def get_broadcast(job_id: int) -> Optional[dict]:
+    try:
+        with db_cursor(dict_rows=True) as cursor:
+            cursor.execute(f"SELECT {', '.join(BROADCAST_COLUMNS)} FROM broadcasts WHERE id = %s", (job_id,))
+            row = cursor.fetchone()
+        return dict(row) if row else None
+    except Exception as e:
+        print(f"Error loading broadcast: {e}")
+        return None
+
+def get_running_broadcasts() -> list:
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("SELECT id FROM broadcasts WHERE state = 'running' ORDER BY id")
+            return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error loading broadcasts: {e}")
+        return []
+
+def update_broadcast(job_id: int, **fields) -> bool:
+    """Progressni saqlash: last_user_id, sent, failed, state"""
+    if not fields:
+        return False
+    fields["updated_at"] = datetime.now()
+    assignments = ", ".join(f"{column} = %s" for column in fields)
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(f"UPDATE broadcasts SET {assignments} WHERE id = %s", (*fields.values(), job_id))
+        return True
+    except Exception as e:
+        print(f"Error updating broadcast: {e}")
+        return False
+
+def get_user_ids_after(last_user_id: str, limit: int) -> Optional[list]:
+    """Keyset sahifa: last_user_id dan keyingi user_id lar (broadcast uchun).
+    Xato bo'lsa None - bo'sh ro'yxat "foydalanuvchilar tugadi" degani"""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute(
+                "SELECT user_id FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s",
+                (last_user_id, limit)
+            )
+            return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Error loading user ids: {e}")
+        return None
+
 # ============ REQUESTS ============
 def get_requests() -> dict:
     try:
-        conn = get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("SELECT * FROM requests ORDER BY created_at DESC")
-        rows = cursor.fetchall()
-        cursor.close()
+        with db_cursor(dict_rows=True) as cursor:
+            cursor.execute("SELECT * FROM requests ORDER BY created_at DESC")
+            rows = cursor.fetchall()
         
         requests = {}
         for row in rows:
             rid = str(row['request_id'])
             requests[rid] = dict(row)
         return requests
-    except:
-        return load_json(REQUESTS_FILE)
+    except Exception as e:
+        print(f"Error loading requests: {e}")
+        return {}
 
-def save_requests(requests: dict):
+def save_requests(requests: dict) -> dict:
+    rows = [
+        (rid, data.get('user_id'), data.get('movie_name'),
+         data.get('status', 'pending'), data.get('created_at', datetime.now()))
+        for rid, data in requests.items()
+    ]
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        for rid, data in requests.items():
-            cursor.execute("""
-                INSERT INTO requests (request_id, user_id, movie_name, status, created_at)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (request_id) DO UPDATE SET
-                    user_id = EXCLUDED.user_id,
-                    movie_name = EXCLUDED.movie_name,
-                    status = EXCLUDED.status,
-                    created_at = EXCLUDED.created_at
-            """, (rid, data.get('user_id'), data.get('movie_name'), 
-                  data.get('status', 'pending'), data.get('created_at', datetime.now())))
-        conn.commit()
-        cursor.close()
+        return bulk_upsert(
+            "requests", ["request_id", "user_id", "movie_name", "status", "created_at"], rows,
+            conflict="request_id"
+        )
     except Exception as e:
         print(f"Error saving requests: {e}")
-        save_json(REQUESTS_FILE, requests)
+        return {"table": "requests", "rows": 0, "elapsed": 0.0}
 
 # Initialize
 if __name__ == "__main__":
     init_database()
-
-def is_admin_db(user_id: str) -> bool:
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM admins WHERE user_id = %s", (str(user_id),))
-        result = cursor.fetchone()
-        cursor.close()
-        return result is not None
-    except:
-        return False
-
-def is_super_admin_db(user_id: str) -> bool:
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT role FROM admins WHERE user_id = %s", (str(user_id),))
-        result = cursor.fetchone()
-        cursor.close()
-        return result is not None and result[0] == 'super_admin'
-    except:
-        return False
-
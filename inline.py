@@ -0,0 +1,142 @@
+import base64
+import binascii
+import html
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from telegram import (
+    Update, InlineKeyboardMarkup, InlineKeyboardButton,
+    InlineQueryResultArticle, InputTextMessageContent
+)
+from telegram.ext import ContextTypes
+
+from config import (
+    BOT_USERNAME, INLINE_PAGE_SIZE, INLINE_MAX_RESULTS, INLINE_CACHE_TIME,
+    INLINE_CACHE_TTL, INLINE_CACHE_SIZE
+)
+from cache import TTLCache
+from catalog import get_catalog, catalog_version, resolve_code
+from database import run_db, normalize_code
+from movies import search_movies, search_uses_db, get_trending_movies
+from search import tokenize
+from users import is_banned
+
+logger = logging.getLogger(__name__)
+
+# (katalog versiyasi, so'rov tokenlari, normallashgan kod) -> kodlar ro'yxati,
+# (katalog versiyasi, so'rov tokenlari, normallashgan kod, offset) -> (natijalar, next_offset).
+# Katalog o'zgarsa versiya o'zgaradi - eski yozuvlar TTL bilan chiqib ketadi
+_results = TTLCache(INLINE_CACHE_SIZE, INLINE_CACHE_TTL)
+
+_SAFE_PAYLOAD = re.compile(r"[A-Za-z0-9_-]{1,62}")
+
+# ---------- deep link ----------
+
+def movie_start_payload(code: str) -> Optional[str]:
+    """/start parametri: m_<kod>, kodda ruxsat etilmagan belgi bo'lsa mb_<base64>"""
+    if _SAFE_PAYLOAD.fullmatch(code):
+        return f"m_{code}"
+    payload = "mb_" + base64.urlsafe_b64encode(code.encode()).decode().rstrip("=")
+    return payload if len(payload) <= 64 else None
+
+def movie_code_from_payload(payload: str) -> Optional[str]:
+    """m_<kod> / mb_<base64> -> katalogdagi kod (topilmasa None)"""
+    if payload.startswith("m_"):
+        return resolve_code(payload[2:])
+    if payload.startswith("mb_"):
+        encoded = payload[3:]
+        try:
+            code = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            return None
+        return resolve_code(code)
+    return None
+
+def movie_link(code: str) -> Optional[str]:
+    payload = movie_start_payload(code)
+    return f"https://t.me/{BOT_USERNAME}?start={payload}" if payload else None
+
+# ---------- natijalar ----------
+
+def _article(position: int, code: str, data: dict) -> InlineQueryResultArticle:
+    name = data.get("name") or code
+    description = f"📌 Kod: {code} · 👁 {data.get('views') or 0}"
+    if data.get("genre"):
+        description += f" · 🎭 {data['genre']}"
+    link = movie_link(code)
+    return InlineQueryResultArticle(
+        id=str(position),
+        title=f"🎬 {name}",
+        description=description,
+        input_message_content=InputTextMessageContent(
+            f"🎬 <b>{html.escape(name)}</b>\n📌 Kod: <code>{html.escape(code)}</code>\n\n👉 @{BOT_USERNAME}",
+            parse_mode='HTML'
+        ),
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("▶️ Ko'rish", url=link)]]) if link else None,
+    )
+
+async def _ranked_codes(text: str, key: tuple) -> List[str]:
+    """So'rov bo'yicha eng mos INLINE_MAX_RESULTS ta kod (keshlanadi)"""
+    codes = _results.get(key)
+    if codes is not None:
+        return codes
+    empty = not key[1] and not key[2]
+    if empty:
+        # Bo'sh so'rov - mashhur kinolar
+        found = get_trending_movies(INLINE_MAX_RESULTS)
+    elif not key[1]:
+        # Faqat [a-z0-9] dan tashqari belgilar - qidiruvga token yo'q, faqat aniq kod
+        found = []
+    elif search_uses_db():
+        found = await run_db(search_movies, text, INLINE_MAX_RESULTS)
+    else:
+        found = search_movies(text, INLINE_MAX_RESULTS)
+    codes = [code for code, _ in found]
+    exact = None if empty else resolve_code(text)
+    if exact is not None:
+        # Aniq kod birinchi turadi
+        codes = [exact] + [code for code in codes if code != exact][:INLINE_MAX_RESULTS - 1]
+    _results.set(key, codes)
+    return codes
+
+async def inline_results(text: str, offset: int) -> Tuple[list, str]:
+    """(natijalar, next_offset) - sahifa ham keshlanadi"""
+    # Tokenlar bir xil, kodlar har xil bo'lgan so'rovlar (masalan faqat belgilardan iborat)
+    # bitta kalitga tushmasligi uchun normallashgan kod ham kalitda
+    key = (catalog_version(), " ".join(tokenize(text)), normalize_code(text))
+    page_key = key + (offset,)
+    page = _results.get(page_key)
+    if page is not None:
+        return page
+    codes = await _ranked_codes(text, key)
+    movies = get_catalog()
+    results = [
+        _article(position, code, movies[code])
+        for position, code in enumerate(codes[offset:offset + INLINE_PAGE_SIZE], offset)
+        if code in movies
+    ]
+    end = offset + INLINE_PAGE_SIZE
+    page = (results, str(end) if end < len(codes) else "")
+    _results.set(page_key, page)
+    return page
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """@bot <so'rov> - search_movies bilan bir xil indeksdan, offset bo'yicha sahifalab"""
+    query = update.inline_query
+    try:
+        # Inline so'rov kontekstsiz keladi - keshda yo'q bo'lsa DB ga boriladi
+        if await run_db(is_banned, str(query.from_user.id)):
+            await query.answer([], cache_time=INLINE_CACHE_TIME, is_personal=True)
+            return
+        offset = int(query.offset) if query.offset.isdigit() else 0
+        results, next_offset = await inline_results(query.query, offset)
+        # is_personal - Telegram javobni boshqa foydalanuvchilarga bermaydi, aks holda
+        # bloklangan foydalanuvchi ham cache_time davomida keshdan natija olardi.
+        # Qayta hisoblash bot ichidagi keshdan (_results) olinadi
+        await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True, next_offset=next_offset)
+    except Exception as e:
+        logger.error(f"Inline query error: {e}")
+
+def inline_cache_stats() -> dict:
+    return _results.stats()
@@ -0,0 +1,344 @@
+from datetime import datetime
+from typing import List
+
+from psycopg2.extras import execute_values
+
+from config import SEARCH_BACKEND
+from database import db_cursor, get_backend, normalize_code
+
+# Bir vaqtda ikki worker migratsiya qilmasligi uchun advisory lock kaliti
+MIGRATION_LOCK_ID = 7_100_2024
+
+# SQLite uchun 1-migratsiya: jadvallar darhol yakuniy ko'rinishda
+# (SQLite'da ALTER COLUMN yo'q), 2-migratsiya shuning uchun bo'sh
+_SQLITE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id VARCHAR(50) PRIMARY KEY,
+        first_name VARCHAR(255),
+        username VARCHAR(255),
+        joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        limit_count INTEGER DEFAULT 5,
+        favorites TEXT DEFAULT '[]',
+        history TEXT DEFAULT '[]',
+        banned BOOLEAN DEFAULT FALSE,
+        referrals INTEGER DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS movies (
+        code VARCHAR(50) PRIMARY KEY,
+        name VARCHAR(500),
+        genre VARCHAR(255),
+        channel_id VARCHAR(100),
+        message_id VARCHAR(50),
+        added_by VARCHAR(50),
+        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        views INTEGER DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS channels (
+        channel_id VARCHAR(100) PRIMARY KEY,
+        name VARCHAR(255),
+        invite_link TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS admins (
+        user_id VARCHAR(50) PRIMARY KEY,
+        role VARCHAR(50) DEFAULT 'admin',
+        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        added_by VARCHAR(50),
+        source VARCHAR(50) DEFAULT 'manual'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS requests (
+        request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id VARCHAR(50),
+        movie_name VARCHAR(500),
+        status VARCHAR(50) DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# last_user_id - oxirgi yuborilgan user_id (keyset), restartdan keyin shu joydan davom etadi
+_BROADCASTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id {id},
+        from_chat_id VARCHAR(50),
+        message_id VARCHAR(50),
+        status_chat_id VARCHAR(50),
+        status_message_id VARCHAR(50),
+        created_by VARCHAR(50),
+        state VARCHAR(20) DEFAULT 'running',
+        last_user_id VARCHAR(50) DEFAULT '',
+        total INTEGER DEFAULT 0,
+        sent INTEGER DEFAULT 0,
+        failed INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# uz_normalize() - search.normalize() ning SQL nusxasi: kirill -> lotin, apostroflarsiz.
+# Bazaning LC_CTYPE i "C" bo'lsa lower() kirillni kichraytirmaydi - katta harflar ham beriladi
+_UZ_DIGRAPHS = (("ё", "yo"), ("ц", "ts"), ("ч", "ch"), ("ш", "sh"), ("щ", "sh"), ("ю", "yu"), ("я", "ya"))
+_UZ_LETTERS = ("абвгғдежзийкқлмноўпрстуфхҳыэ", "abvggdejziykqlmnooprstufxhie")
+_UZ_DROPPED = "ъьЪЬ'`ʻʼ‘’´"
+
+def _uz_normalize_function() -> str:
+    expr = "lower(value)"
+    for cyrillic, latin in _UZ_DIGRAPHS:
+        expr = f"replace(replace({expr}, '{cyrillic}', '{latin}'), '{cyrillic.upper()}', '{latin}')"
+    source = (_UZ_LETTERS[0] + _UZ_LETTERS[0].upper() + _UZ_DROPPED).replace("'", "''")
+    target = _UZ_LETTERS[1] * 2
+    return f"""
+        CREATE OR REPLACE FUNCTION uz_normalize(value text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $fn$ SELECT translate({expr}, '{source}', '{target}') $fn$
+    """
+
+# SEARCH_BACKEND=postgres uchun qidiruv sxemasi (PostgreSQL 12+, pg_trgm kengaytmasi).
+# Majburiy migratsiyalar zanjirida emas - ensure_search_schema() faqat shu sozlamada qo'llaydi
+SEARCH_SCHEMA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    _uz_normalize_function(),
+    """
+    ALTER TABLE movies ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', uz_normalize(COALESCE(name, ''))), 'A') ||
+        setweight(to_tsvector('simple', uz_normalize(code)), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_movies_search_vector ON movies USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS idx_movies_name_trgm ON movies USING gin (uz_normalize(COALESCE(name, '')) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS idx_movies_code_trgm ON movies USING gin (uz_normalize(code) gin_trgm_ops)",
+]
+
+def _backfill_code_norm(cursor):
+    """Mavjud kinolarga code_norm. Bir xil normallashgan kodlardan eskisi oladi,
+    qolganlari NULL qoladi (faqat o'z kodi bilan topiladi)"""
+    cursor.execute("SELECT code FROM movies ORDER BY added_at, code")
+    rows, seen = [], set()
+    for (code,) in cursor.fetchall():
+        code_norm = normalize_code(code)
+        if code_norm in seen:
+            print(f"⚠️ Kod {code!r} boshqa kod bilan bir xil normallashadi ({code_norm!r}) - code_norm bo'sh qoldi")
+            continue
+        seen.add(code_norm)
+        rows.append((code_norm, str(code)))
+    if not rows:
+        return
+    if get_backend() == "sqlite":
+        cursor.executemany("UPDATE movies SET code_norm = %s WHERE code = %s", rows)
+    else:
+        execute_values(cursor, """
+            UPDATE movies AS m SET code_norm = v.code_norm
+            FROM (VALUES %s) AS v(code_norm, code)
+            WHERE m.code = v.code
+        """, rows)
+
+# Har bir migratsiya: (versiya, tavsif, qadamlar)
+# Qadamlar - SQL satri yoki cursor qabul qiladigan funksiyalar ro'yxati, yoki
+# backendlar farq qilsa {"postgres": [...], "sqlite": [...]}.
+# Qo'llangan migratsiyani o'zgartirmang - yangisini ro'yxat oxiriga qo'shing.
+MIGRATIONS = [
+    (1, "Asosiy jadvallar", {"sqlite": _SQLITE_TABLES, "postgres": [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id VARCHAR(50) PRIMARY KEY,
+            first_name VARCHAR(255),
+            username VARCHAR(255),
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            limit_count INTEGER DEFAULT 0,
+            favorites TEXT DEFAULT '[]',
+            banned BOOLEAN DEFAULT FALSE,
+            referrals INTEGER DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS movies (
+            code VARCHAR(50) PRIMARY KEY,
+            name VARCHAR(500),
+            genre VARCHAR(255),
+            channel_id VARCHAR(100),
+            message_id VARCHAR(50),
+            added_by VARCHAR(50),
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            views INTEGER DEFAULT 0
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS channels (
+            channel_id VARCHAR(100) PRIMARY KEY,
+            name VARCHAR(255),
+            invite_link TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS admins (
+            user_id VARCHAR(50) PRIMARY KEY,
+            role VARCHAR(50) DEFAULT 'admin',
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            added_by VARCHAR(50),
+            source VARCHAR(50) DEFAULT 'manual'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS requests (
+            request_id SERIAL PRIMARY KEY,
+            user_id VARCHAR(50),
+            movie_name VARCHAR(500),
+            status VARCHAR(50) DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]}),
+    (2, "users: history ustuni, limit_count default 5", {"sqlite": [], "postgres": [
+        # users.py "limit" deb ataydigan maydon - limit_count (LIMIT SQL kalit so'zi)
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS history TEXT DEFAULT '[]'",
+        "ALTER TABLE users ALTER COLUMN limit_count SET DEFAULT 5",
+        "UPDATE users SET history = '[]' WHERE history IS NULL",
+    ]}),
+    (3, "Asosiy so'rovlar uchun indekslar", [
+        # Yangi filmlar
+        "CREATE INDEX IF NOT EXISTS idx_movies_added_at ON movies (added_at DESC)",
+        # Trend / mashhur
+        "CREATE INDEX IF NOT EXISTS idx_movies_views ON movies (views DESC)",
+        # Janr bo'yicha
+        "CREATE INDEX IF NOT EXISTS idx_movies_genre ON movies (genre)",
+        # Kodni registrsiz qidirish
+        "CREATE INDEX IF NOT EXISTS idx_movies_code_lower ON movies (LOWER(code))",
+        # Bloklanganlar ro'yxati - ular juda kam, shuning uchun partial index
+        "CREATE INDEX IF NOT EXISTS idx_users_banned ON users (user_id) WHERE banned",
+    ]),
+    (4, "Kanal a'zolari (chat_member updatelaridan)", [
+        """
+        CREATE TABLE IF NOT EXISTS channel_members (
+            channel_id VARCHAR(100),
+            user_id VARCHAR(50),
+            subscribed BOOLEAN NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (channel_id, user_id)
+        )
+        """,
+    ]),
+    (5, "Broadcast vazifalari", {
+        "postgres": [_BROADCASTS_TABLE.format(id="SERIAL PRIMARY KEY")],
+        "sqlite": [_BROADCASTS_TABLE.format(id="INTEGER PRIMARY KEY AUTOINCREMENT")],
+    }),
+    # Qidiruv sxemasi bu yerdan SEARCH_SCHEMA ga ko'chirildi: u faqat SEARCH_BACKEND=postgres
+    # da kerak, bu yerda esa xatosi (eski PG, pg_trgm huquqi yo'q) keyingi migratsiyalarni
+    # to'xtatib qo'yardi. Qo'llangan bazalarda natija o'zgarmaydi, versiya raqami band qoladi
+    (6, "Kino qidiruvi: tsvector va trigramm indekslari", []),
+    (7, "movies.code_norm: normallashgan kod bo'yicha qidirish", {
+        "postgres": [
+            "ALTER TABLE movies ADD COLUMN IF NOT EXISTS code_norm VARCHAR(50)",
+            _backfill_code_norm,
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_movies_code_norm ON movies (code_norm)",
+        ],
+        "sqlite": [
+            "ALTER TABLE movies ADD COLUMN code_norm VARCHAR(50)",
+            _backfill_code_norm,
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_movies_code_norm ON movies (code_norm)",
+        ],
+    }),
+    # hour - epoch soat (unix vaqt // 3600). Trend reytingi oxirgi 7 kunni o'qiydi
+    (8, "Soatlik ko'rishlar (trend reytingi uchun)", [
+        """
+        CREATE TABLE IF NOT EXISTS movie_views_hourly (
+            code VARCHAR(50),
+            hour INTEGER,
+            views INTEGER DEFAULT 0,
+            PRIMARY KEY (code, hour)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_movie_views_hourly_hour ON movie_views_hourly (hour)",
+    ]),
+    # Kod endi code_norm (v7, unique) bo'yicha qidiriladi - LOWER(code) indeksidan foydalanilmaydi
+    (9, "idx_movies_code_lower ni o'chirish", [
+        "DROP INDEX IF EXISTS idx_movies_code_lower",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _steps_for_backend(steps) -> list:
+    if isinstance(steps, dict):
+        return steps.get(get_backend(), [])
+    return steps
+
+def get_schema_version() -> int:
+    """Bazadagi sxema versiyasi (schema_version bo'lmasa 0)"""
+    with db_cursor() as cursor:
+        if get_backend() == "sqlite":
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")
+            if cursor.fetchone() is None:
+                return 0
+        else:
+            cursor.execute("SELECT to_regclass('schema_version')")
+            if cursor.fetchone()[0] is None:
+                return 0
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return cursor.fetchone()[0]
+
+def apply_migrations() -> List[int]:
+    """Qo'llanmagan migratsiyalarni tartib bilan bajarish.
+    Har bir migratsiya alohida tranzaksiyada - xato bo'lsa o'sha joyda to'xtaydi."""
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        with db_cursor() as cursor:
+            if get_backend() == "postgres":
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            _ensure_version_table(cursor)
+            cursor.execute("SELECT 1 FROM schema_version WHERE version = %s", (version,))
+            if cursor.fetchone():
+                continue
+            for step in _steps_for_backend(steps):
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                (version, description, datetime.now())
+            )
+            print(f"✅ Migratsiya v{version}: {description}")
+            applied.append(version)
+    return applied
+
+def ensure_search_schema() -> bool:
+    """SEARCH_BACKEND=postgres bo'lsa qidiruv sxemasini yaratish (bor bo'lsa tegmaydi).
+    Yaratilmasa RuntimeError - aks holda har qidiruv xato beradi"""
+    if SEARCH_BACKEND != "postgres" or get_backend() != "postgres":
+        return False
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            # Oxirgi qadam - bitta tranzaksiyada bo'lgani uchun u bor bo'lsa hammasi bor
+            cursor.execute("SELECT to_regclass('idx_movies_code_trgm')")
+            if cursor.fetchone()[0] is not None:
+                return False
+            for step in SEARCH_SCHEMA:
+                cursor.execute(step)
+    except Exception as e:
+        raise RuntimeError(
+            "SEARCH_BACKEND=postgres uchun qidiruv sxemasi yaratilmadi "
+            f"(PostgreSQL 12+ va CREATE EXTENSION pg_trgm huquqi kerak; yoki SEARCH_BACKEND=memory): {e}"
+        ) from e
+    print("✅ Qidiruv sxemasi yaratildi (SEARCH_BACKEND=postgres)")
+    return True
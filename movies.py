@@ -1,56 +1,66 @@
 import random
 from typing import List, Optional, Tuple
-from database import get_movies, save_movies
-from datetime import datetime
+from config import SEARCH_BACKEND
+from database import add_movie as db_add_movie, delete_movie as db_delete_movie, search_movies_db, get_backend
+from catalog import get_catalog, refresh_movie, drop_movie
+from view_counter import record_view
+from trending import ranking
+from search import search
 
 def get_random_movie() -> Optional[Tuple[str, dict]]:
-    movies = get_movies()
+    movies = get_catalog()
     if not movies:
         return None
     return random.choice(list(movies.items()))
 
+def get_ranked_movies(kind: str, limit: int = 10) -> List[Tuple[str, dict, int]]:
+    """trending / popular / top ro'yxati: [(code, dict, ko'rishlar soni)].
+    trending.py dagi tayyor top-k dan o'qiladi; kam bo'lsa umumiy reyting bilan to'ldiriladi
+    (ular bu oynada ko'rilmagan - soni 0)"""
+    movies = get_catalog()
+    ranked = [(code, movies[code], count) for code, count in ranking(kind) if code in movies][:limit]
+    if len(ranked) < limit and kind != "top":
+        seen = {code for code, _, _ in ranked}
+        ranked += [
+            (code, movies[code], 0) for code, _ in ranking("top")
+            if code in movies and code not in seen
+        ][:limit - len(ranked)]
+    return ranked
+
 def get_trending_movies(limit: int = 10) -> List[Tuple[str, dict]]:
-    movies = get_movies()
-    sorted_movies = sorted(movies.items(), key=lambda x: x[1].get("views", 0), reverse=True)
-    return sorted_movies[:limit]
-
-def search_movies(query: str) -> List[Tuple[str, dict]]:
-    movies = get_movies()
-    results = []
-    query_lower = query.lower()
-    for code, data in movies.items():
-        if query_lower in code.lower() or query_lower in data.get("name", "").lower():
-            results.append((code, data))
-    return results
+    return [(code, data) for code, data, _ in get_ranked_movies("trending", limit)]
+
+def search_uses_db() -> bool:
+    """SEARCH_BACKEND=postgres va baza PostgreSQL - qidiruv bloklovchi (run_db orqali chaqiring)"""
+    return SEARCH_BACKEND == "postgres" and get_backend() == "postgres"
+
+def search_movies(query: str, limit: int = 10) -> List[Tuple[str, dict]]:
+    # Natijalar mosligi bo'yicha tartiblangan: xotiradagi indeks (search.py) yoki
+    # PostgreSQL (faqat eng yaxshi limit ta qator keladi)
+    if search_uses_db():
+        return search_movies_db(query, limit)
+    return search(query, limit)
 
 def get_movies_by_genre(genre: str) -> List[Tuple[str, dict]]:
-    movies = get_movies()
+    movies = get_catalog()
     return [(c, d) for c, d in movies.items() if d.get("genre") == genre]
 
 def increment_movie_views(movie_code: str):
-    movies = get_movies()
-    if movie_code in movies:
-        movies[movie_code]["views"] = movies[movie_code].get("views", 0) + 1
-        save_movies(movies)
-
-def add_movie(code: str, name: str, genre: str, channel_id: int, message_id: int, added_by: str):
-    movies = get_movies()
-    movies[code] = {
-        "code": code,
-        "name": name,
-        "genre": genre,
-        "channel_id": channel_id,
-        "message_id": message_id,
-        "views": 0,
-        "added_at": datetime.now().isoformat(),
-        "added_by": added_by
-    }
-    save_movies(movies)
+    # Xotirada yig'iladi, view_counter davriy ravishda DB ga yozadi
+    # (trend reytingini ham yangilaydi)
+    record_view(movie_code)
+
+def add_movie(code: str, name: str, genre: str, channel_id: int, message_id: int, added_by: str) -> bool:
+    if not db_add_movie(code, name, genre, channel_id, message_id, added_by):
+        return False
+    # Katalogga DB dagi ko'rinishda qo'shish
+    refresh_movie(code)
+    return True
 
 def delete_movie(code: str) -> bool:
-    movies = get_movies()
-    if code in movies:
-        del movies[code]
-        save_movies(movies)
-        return True
-    return False
+    if code not in get_catalog():
+        return False
+    if not db_delete_movie(code):
+        return False
+    drop_movie(code)
+    return True
@@ -0,0 +1,185 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import OUTBOX_RATE, OUTBOX_BURST, OUTBOX_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Ustuvorlik sinflari - kichik son oldin yuboriladi.
+# Handlerlar bot metodlariga rate_limit_args=PRIORITY_... beradi
+PRIORITY_INTERACTIVE = 0   # kino yuborish, javoblar, obuna tekshiruvi
+PRIORITY_MENU = 1          # menyu tahrirlash
+PRIORITY_BROADCAST = 2     # ommaviy xabarlar
+PRIORITY_MAINTENANCE = 3   # progress, backup va h.k.
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_MENU: "menu",
+    PRIORITY_BROADCAST: "broadcast",
+    PRIORITY_MAINTENANCE: "maintenance",
+}
+
+# rate_limit_args berilmaganda endpoint bo'yicha
+_MENU_ENDPOINTS = {"editMessageText", "editMessageReplyMarkup", "editMessageCaption", "deleteMessage"}
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """Barcha Bot API so'rovlari uchun umumiy navbat.
+
+    - global token bucket (rate so'rov/soniya, burst gacha yig'iladi);
+    - token bo'shaganda eng yuqori ustuvorlikdagi so'rov o'tadi, bir sinf ichida FIFO;
+    - bitta chatga so'rovlar kelgan tartibida yuboriladi;
+    - RetryAfter kelsa butun navbat to'xtaydi va so'rov qayta yuboriladi.
+    """
+
+    def __init__(self, rate: float = OUTBOX_RATE, burst: int = OUTBOX_BURST, max_retries: int = OUTBOX_MAX_RETRIES):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._queue = []  # (priority, seq, enqueued_at, future)
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._chat_locks: Dict[Any, list] = {}  # chat_id -> [Lock, foydalanuvchilar soni]
+        self._waits = {p: {"count": 0, "total": 0.0, "max": 0.0} for p in PRIORITY_NAMES}
+        self.retry_after_count = 0
+
+    async def initialize(self):
+        if self._dispatcher is not None and not self._dispatcher.done():
+            # Application va ExtBot ikkalasi ham initialize qilishi mumkin
+            return
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for _, _, _, future in self._queue:
+            if not future.done():
+                future.cancel()
+        self._queue.clear()
+
+    # ---------- token bucket ----------
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Flood limit: shuncha soniya hech narsa yuborilmaydi"""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    async def _dispatch_loop(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            priority, _, enqueued_at, future = heapq.heappop(self._queue)
+            if future.done():
+                # Kutayotgan so'rov bekor qilingan
+                continue
+            self._tokens -= 1
+            wait = time.monotonic() - enqueued_at
+            stats = self._waits[priority]
+            stats["count"] += 1
+            stats["total"] += wait
+            stats["max"] = max(stats["max"], wait)
+            future.set_result(None)
+
+    async def _acquire(self, priority: int):
+        if self._dispatcher is None:
+            # initialize() chaqirilmagan (masalan, Application tashqarisida) - cheklovsiz
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), time.monotonic(), future))
+        self._wakeup.set()
+        await future
+
+    # ---------- chat tartibi ----------
+
+    @asynccontextmanager
+    async def _chat_order(self, chat_id):
+        if chat_id is None:
+            yield
+            return
+        entry = self._chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # asyncio.Lock kutganlarni FIFO tartibda qo'yadi
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._chat_locks.pop(chat_id, None)
+
+    # ---------- BaseRateLimiter ----------
+
+    def _priority(self, endpoint: str, rate_limit_args: Optional[int]) -> int:
+        if rate_limit_args in PRIORITY_NAMES:
+            return rate_limit_args
+        return PRIORITY_MENU if endpoint in _MENU_ENDPOINTS else PRIORITY_INTERACTIVE
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = self._priority(endpoint, rate_limit_args)
+        async with self._chat_order(data.get("chat_id")):
+            for attempt in range(self.max_retries + 1):
+                await self._acquire(priority)
+                try:
+                    return await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    self.retry_after_count += 1
+                    self.pause(_retry_seconds(e))
+                    logger.warning(f"RetryAfter {e.retry_after}s ({endpoint}), navbat to'xtatildi")
+                    if attempt >= self.max_retries:
+                        raise
+
+    # ---------- metrikalar ----------
+
+    def stats(self) -> dict:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in self._queue:
+            if not future.done():
+                depth[PRIORITY_NAMES[priority]] += 1
+        waits = {}
+        for priority, data in self._waits.items():
+            waits[PRIORITY_NAMES[priority]] = {
+                "count": data["count"],
+                "avg": data["total"] / data["count"] if data["count"] else 0.0,
+                "max": data["max"],
+            }
+        return {
+            "depth": depth,
+            "waits": waits,
+            "tokens": round(self._tokens, 2),
+            "chats": len(self._chat_locks),
+            "retry_after": self.retry_after_count,
+        }
+
+# Application.builder().rate_limiter(outbox) bilan ulanadi
+outbox = PriorityRateLimiter()
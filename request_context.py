@@ -0,0 +1,75 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+# Joriy update konteksti. run_db kontekstni threadga nusxalaydi, shuning uchun
+# DB funksiyalari ham shu obyektni ko'radi
+_current: ContextVar[Optional["RequestContext"]] = ContextVar("request_context", default=None)
+
+# Barcha updatelar bo'yicha yig'ma: nechta update, nechta DB chaqiruvi
+_totals = {"updates": 0, "queries": 0, "max_queries": 0}
+
+class RequestContext:
+    """Bitta update uchun bir marta yuklanadigan ma'lumotlar:
+    user - users qatori (yo'q bo'lsa None), state - banned/limit/admin/super_admin,
+    subscribed - majburiy obuna natijasi (birinchi tekshiruvda to'ldiriladi)."""
+
+    __slots__ = ("user_id", "user", "state", "subscribed", "queries", "started")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.user = None
+        self.state = None
+        self.subscribed = None
+        self.queries = 0
+        self.started = time.perf_counter()
+
+    def patch_user(self, **fields):
+        """Update davomidagi yozuvlarni xotiradagi nusxaga ham qo'llash"""
+        if self.user is not None:
+            self.user.update(fields)
+        if self.state is not None:
+            for key in ("banned", "limit"):
+                if key in fields:
+                    self.state[key] = fields[key]
+
+def begin(user_id: str) -> RequestContext:
+    request = RequestContext(str(user_id))
+    _current.set(request)
+    return request
+
+def finish() -> Optional[RequestContext]:
+    """Update tugadi - statistikaga qo'shish va kontekstni tozalash"""
+    request = _current.get()
+    if request is None:
+        return None
+    _current.set(None)
+    _totals["updates"] += 1
+    _totals["queries"] += request.queries
+    _totals["max_queries"] = max(_totals["max_queries"], request.queries)
+    return request
+
+def current() -> Optional[RequestContext]:
+    return _current.get()
+
+def for_user(user_id) -> Optional[RequestContext]:
+    """Joriy kontekst shu foydalanuvchiniki bo'lsa - o'zi, aks holda None"""
+    request = _current.get()
+    if request is not None and request.user_id == str(user_id):
+        return request
+    return None
+
+def count_query():
+    """db_cursor har chaqirilganda"""
+    request = _current.get()
+    if request is not None:
+        request.queries += 1
+
+def query_stats() -> dict:
+    updates = _totals["updates"]
+    return {
+        "updates": updates,
+        "queries": _totals["queries"],
+        "avg": _totals["queries"] / updates if updates else 0.0,
+        "max": _totals["max_queries"],
+    }
@@ -0,0 +1,126 @@
+import logging
+import time
+from collections import Counter
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Trie tugunidagi marshrut kaliti (belgi bo'la olmaydi)
+_ROUTE = None
+
+class Route:
+    """Bitta callback marshruti.
+    handler(query, context, user_id, param) - param prefiksdan keyingi qism, parse bilan o'girilgan.
+    guards - handlerdan oldin ketma-ket chaqiriladi: async (query, context, user_id) -> bool,
+    False qaytarsa foydalanuvchiga javob berilgan va handler chaqirilmaydi.
+    answer=False - query.answer() ni handlerning o'zi chaqiradi."""
+
+    __slots__ = ("key", "handler", "parse", "guards", "answer")
+
+    def __init__(self, key: str, handler: Callable, parse: Optional[Callable], guards: tuple, answer: bool):
+        self.key = key
+        self.handler = handler
+        self.parse = parse
+        self.guards = guards
+        self.answer = answer
+
+class CallbackRouter:
+    """callback_data -> handler: avval aniq moslik (dict), keyin eng uzun prefiks (trie).
+    Topilmagan va parametri noto'g'ri callbacklar unmatched da sanaladi."""
+
+    def __init__(self, default_guards: tuple = ()):
+        self.default_guards = tuple(default_guards)
+        self._exact = {}
+        self._trie = {}
+        self._order = []  # ro'yxatga olish tartibi (benchmark uchun)
+        self.unmatched = Counter()
+
+    def _route(self, key, handler, parse, guards, extra_guards, answer) -> Route:
+        guards = self.default_guards if guards is None else tuple(guards)
+        route = Route(key, handler, parse, guards + tuple(extra_guards), answer)
+        self._order.append(route)
+        return route
+
+    def exact(self, data: str, handler: Callable, *, guards: tuple = None, extra_guards: tuple = (), answer: bool = True):
+        self._exact[data] = self._route(data, handler, None, guards, extra_guards, answer)
+
+    def prefix(self, prefix: str, handler: Callable, *, parse: Callable = str, guards: tuple = None,
+               extra_guards: tuple = (), answer: bool = True):
+        node = self._trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[_ROUTE] = self._route(prefix, handler, parse, guards, extra_guards, answer)
+
+    def resolve(self, data: str) -> Tuple[Optional[Route], object]:
+        """(marshrut, parametr) yoki (None, None). Parametr parse qilinmasa ham None"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, None
+        node, found, depth = self._trie, None, 0
+        for index, char in enumerate(data):
+            node = node.get(char)
+            if node is None:
+                break
+            if _ROUTE in node:
+                found, depth = node[_ROUTE], index + 1
+        if found is None:
+            return None, None
+        try:
+            return found, found.parse(data[depth:])
+        except (ValueError, TypeError):
+            return None, None
+
+    async def dispatch(self, query, context, user_id: str) -> bool:
+        """Marshrutni topib, guardlar va handlerni bajarish. Topilmasa False"""
+        route, param = self.resolve(query.data or "")
+        if route is None:
+            self.unmatched[(query.data or "")[:64]] += 1
+            logger.warning(f"Noma'lum callback: {query.data!r}")
+            await query.answer()
+            return False
+        for guard in route.guards:
+            if not await guard(query, context, user_id):
+                return True
+        if route.answer:
+            await query.answer()
+        await route.handler(query, context, user_id, param)
+        return True
+
+    def unmatched_report(self, limit: int = 10) -> list:
+        return self.unmatched.most_common(limit)
+
+    def _linear_resolve(self, data: str):
+        """Eski elif zanjiriga teng: marshrutlar tartib bilan ==/startswith"""
+        for route in self._order:
+            if route.parse is None:
+                if data == route.key:
+                    return route
+            elif data.startswith(route.key):
+                return route
+        return None
+
+def benchmark(router: CallbackRouter, samples: list, rounds: int = 20000) -> dict:
+    """Bitta callbackni topish narxi (ns): router vs ketma-ket tekshirish"""
+    results = {}
+    for name, resolve in (("router", router.resolve), ("linear", router._linear_resolve)):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for data in samples:
+                resolve(data)
+        results[name] = (time.perf_counter() - started) / (rounds * len(samples)) * 1e9
+    return results
+
+# bot.py marshrutlarni shu obyektga yozadi; admin statistikasi unmatched ni o'qiydi
+callback_router = CallbackRouter()
+
+if __name__ == "__main__":
+    from bot import register_callback_routes
+
+    register_callback_routes(callback_router)
+    samples = [route.key + ("" if route.parse is None else ("2" if route.parse is int else "A1")) for route in callback_router._order]
+    for name, ns in benchmark(callback_router, samples).items():
+        print(f"{name:7s} {ns:8.1f} ns / callback")
+    # Eng yomon holat - ro'yxat oxiridagi admin callbacklari
+    tail = samples[-5:]
+    for name, ns in benchmark(callback_router, tail).items():
+        print(f"{name:7s} {ns:8.1f} ns / callback (oxirgi 5 ta)")
@@ -0,0 +1,266 @@
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+from itertools import combinations, islice
+from typing import Dict, List, Optional, Set, Tuple
+
+from catalog import get_catalog, add_listener
+from config import SUGGEST_BUDGET_MS
+
+# Kirill -> lotin (o'zbek imlosi). Apostroflar olib tashlanadi, shuning uchun
+# "o'zbek", "oʻzbek", "o`zbek", "ozbek" va "ўзбек" bir xil token beradi
+_CYRILLIC = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "ғ": "g", "д": "d", "е": "e", "ё": "yo",
+    "ж": "j", "з": "z", "и": "i", "й": "y", "к": "k", "қ": "q", "л": "l", "м": "m",
+    "н": "n", "о": "o", "ў": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "x", "ҳ": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "",
+    "ь": "", "ы": "i", "э": "e", "ю": "yu", "я": "ya",
+}
+_APOSTROPHES = "'`ʻʼ‘’´"
+_TRANSLATE = str.maketrans({**_CYRILLIC, **{char: "" for char in _APOSTROPHES}})
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# So'rov tokeni trigrammlarining shuncha qismi lug'atdagi tokenda bo'lsa - o'xshash
+# (xato yozilgan yoki boshlanishi) deb hisoblanadi
+MIN_SIMILARITY = 0.5
+# Bitta so'rov tokeniga eng ko'pi bilan shuncha o'xshash token
+MAX_EXPANSIONS = 20
+# So'rovning eng kam uchraydigan shuncha tokeni hisobga olinadi
+MAX_QUERY_TOKENS = 5
+# Tavsiya: bitta so'rov tokeniga edit distance bilan tekshiriladigan lug'at tokenlari
+SUGGEST_CANDIDATES = 50
+# Tavsiya: bitta lug'at tokenidan olinadigan kinolar
+SUGGEST_PER_TOKEN = 50
+
+# Joriy indeks (SearchIndex). To'liq qayta qurish yangi obyektda bajarilib
+# keyin almashtiriladi, shuning uchun qidiruv qurilish vaqtida to'xtamaydi
+_index = None
+# Qo'shish/o'chirish va qidiruv bir vaqtda bo'lmasligi uchun
+_lock = threading.Lock()
+
+def normalize(text: str) -> str:
+    """Kichik harf, kirill -> lotin, apostroflarsiz"""
+    return (text or "").lower().translate(_TRANSLATE)
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(normalize(text))
+
+def trigrams(token: str) -> Set[str]:
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# ---------- indeks ----------
+
+def _discard(index: dict, key: str, value: str) -> bool:
+    """Qiymatni olib tashlash; to'plam bo'shab qolsa True"""
+    values = index.get(key)
+    if values is None:
+        return False
+    values.discard(value)
+    if not values:
+        del index[key]
+        return True
+    return False
+
+class SearchIndex:
+    """docs: code -> (normallashgan nom, tokenlar)
+    tokens: token -> kodlar (inverted index)
+    trigrams: trigramm -> lug'atdagi tokenlar (kinolar emas - lug'at ancha kichik)"""
+
+    def __init__(self, movies: Dict[str, dict] = None):
+        self.docs: Dict[str, Tuple[str, frozenset]] = {}
+        self.tokens: Dict[str, Set[str]] = defaultdict(set)
+        self.trigrams: Dict[str, Set[str]] = defaultdict(set)
+        for code, data in (movies or {}).items():
+            self.add(code, data)
+
+    def add(self, code: str, data: dict):
+        self.remove(code)
+        name = normalize(data.get("name") or "")
+        tokens = frozenset(tokenize(f"{data.get('name') or ''} {code}"))
+        self.docs[code] = (name, tokens)
+        for token in tokens:
+            if token not in self.tokens:
+                for gram in trigrams(token):
+                    self.trigrams[gram].add(token)
+            self.tokens[token].add(code)
+
+    def remove(self, code: str):
+        doc = self.docs.pop(code, None)
+        if doc is None:
+            return
+        for token in doc[1]:
+            if _discard(self.tokens, token, code):
+                # Token boshqa kinoda qolmadi - lug'atdan ham chiqarish
+                for gram in trigrams(token):
+                    _discard(self.trigrams, gram, token)
+
+    def expand(self, token: str) -> Dict[str, float]:
+        """So'rov tokeni -> {lug'atdagi token: o'xshashlik}. To'liq moslik 1.0,
+        qolganlari so'rov trigrammlarining qancha qismi tokenda borligi (< 1.0)"""
+        matches = {token: 1.0} if token in self.tokens else {}
+        if len(token) < 3:
+            return matches
+        grams = trigrams(token)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for candidate in self.trigrams.get(gram, ()):
+                shared[candidate] += 1
+        needed = MIN_SIMILARITY * len(grams)
+        similar = [(count, candidate) for candidate, count in shared.items() if count >= needed and candidate != token]
+        for count, candidate in heapq.nlargest(MAX_EXPANSIONS, similar):
+            # To'liq mos tokendan doim pastroq
+            matches[candidate] = 0.9 * count / len(grams)
+        return matches
+
+    def score(self, query: str, limit: int) -> Dict[str, float]:
+        """code -> ball: har bir so'rov tokeni uchun kinodagi eng o'xshash tokenning bali
+        (+0.5 butun so'rov nom ichida uchrasa). Faqat nomzodlar baholanadi."""
+        expanded = []
+        for token in set(tokenize(query)):
+            matches = self.expand(token)
+            if matches:
+                codes = set().union(*(self.tokens[match] for match in matches))
+                expanded.append((len(codes), matches, codes))
+        if not expanded:
+            return {}
+        # Kam uchraydigan tokenlar muhimroq; juda uzun so'rovlarda ko'p uchraydiganlari tashlanadi
+        expanded.sort(key=lambda item: item[0])
+        expanded = expanded[:MAX_QUERY_TOKENS]
+
+        candidates = _candidates([codes for _, _, codes in expanded], limit)
+        scores: Dict[str, float] = dict.fromkeys(candidates, 0.0)
+        for _, matches, _ in expanded:
+            # O'xshashlik o'sish tartibida - kinoda bir nechta mos token bo'lsa eng yaxshisi qoladi
+            best: Dict[str, float] = {}
+            for match, similarity in sorted(matches.items(), key=lambda item: item[1]):
+                best.update(dict.fromkeys(self.tokens[match] & candidates, similarity))
+            if len(expanded) == 1:
+                scores = best
+            else:
+                for code, similarity in best.items():
+                    scores[code] += similarity
+
+        # Butun so'rov nom ichida uchrasa (bir tokenli so'rovda bu token mosligining o'zi)
+        phrase = normalize(query).strip()
+        if len(expanded) > 1 and phrase:
+            for code in candidates:
+                if phrase in self.docs[code][0]:
+                    scores[code] += 0.5
+        return scores
+
+    def nearest(self, token: str, deadline: float) -> Dict[str, float]:
+        """Lug'atdagi eng yaqin tokenlar -> o'xshashlik (1 - edit distance / uzunlik).
+        Nomzodlar kamida bitta umumiy trigramm bo'yicha, ko'p umumiylari oldin"""
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in trigrams(token):
+            for candidate in self.trigrams.get(gram, ()):
+                shared[candidate] += 1
+        max_distance = max(1, len(token) // 3)
+        nearest = {}
+        for candidate in heapq.nlargest(SUGGEST_CANDIDATES, shared, key=shared.get):
+            if time.perf_counter() > deadline:
+                break
+            distance = edit_distance(token, candidate, max_distance)
+            if distance <= max_distance:
+                nearest[candidate] = 1.0 - distance / max(len(token), len(candidate))
+        return nearest
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein masofasi; limit dan oshishi aniq bo'lsa limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def _rebuild() -> SearchIndex:
+    global _index
+    index = SearchIndex(get_catalog())
+    with _lock:
+        _index = index
+    return index
+
+def _on_catalog_change(code: Optional[str], data: Optional[dict]):
+    if code is None:
+        # Katalog DB dan qayta yuklandi (odatda run_db yoki listener threadida)
+        _rebuild()
+        return
+    with _lock:
+        if _index is None:
+            return
+        if data is None:
+            _index.remove(code)
+        else:
+            _index.add(code, data)
+
+add_listener(_on_catalog_change)
+
+# ---------- qidiruv ----------
+
+def _candidates(token_sets: List[Set[str]], limit: int) -> Set[str]:
+    """Eng ko'p so'rov tokeniga mos keladigan kinolar: avval hammasiga mos,
+    ular limitdan kam bo'lsa bittasi kam va h.k. Bitta tokenga mos kinolar kam
+    uchraydigan tokendan boshlab, limitga yetguncha olinadi. To'plam amallari C da."""
+    found: Set[str] = set()
+    for need in range(len(token_sets), 0, -1):
+        for group in combinations(token_sets, need):
+            found |= set.intersection(*group) if need > 1 else group[0]
+            if need == 1 and len(found) >= limit:
+                break
+        if len(found) >= limit:
+            break
+    return found
+
+def search(query: str, limit: int = 10) -> List[Tuple[str, dict]]:
+    """Eng mos kinolar (ball, keyin ko'rishlar bo'yicha)"""
+    movies = get_catalog()
+    index = _index or _rebuild()
+    with _lock:
+        scores = index.score(query, limit)
+    ranked = heapq.nlargest(
+        limit, (code for code in scores if code in movies),
+        key=lambda code: (scores[code], movies[code].get("views") or 0)
+    )
+    return [(code, movies[code]) for code in ranked]
+
+def suggest(query: str, limit: int = 5, budget_ms: float = SUGGEST_BUDGET_MS) -> List[Tuple[str, dict]]:
+    """Qidiruv hech narsa topmaganda: so'rov tokenlariga eng yaqin tokenli kinolar.
+    budget_ms dan oshsa shu paytgacha topilgani qaytadi"""
+    deadline = time.perf_counter() + budget_ms / 1000
+    movies = get_catalog()
+    index = _index
+    if index is None:
+        # Indeks hali qurilmagan - tavsiya uchun uni qurib kutmaymiz
+        return []
+    scores: Dict[str, float] = defaultdict(float)
+    with _lock:
+        for token in set(tokenize(query)):
+            if len(token) < 2 or time.perf_counter() > deadline:
+                continue
+            # Har bir so'rov tokeni uchun kinodagi eng yaqin token hisoblanadi
+            best: Dict[str, float] = {}
+            for match, similarity in index.nearest(token, deadline).items():
+                for code in islice(index.tokens.get(match, ()), SUGGEST_PER_TOKEN):
+                    best[code] = max(best.get(code, 0.0), similarity)
+            for code, similarity in best.items():
+                scores[code] += similarity
+    ranked = heapq.nlargest(
+        limit, (code for code in scores if code in movies),
+        key=lambda code: (scores[code], movies[code].get("views") or 0)
+    )
+    return [(code, movies[code]) for code in ranked]
+
+def index_stats() -> dict:
+    index = _index
+    if index is None:
+        return {"movies": 0, "tokens": 0, "trigrams": 0}
+    return {"movies": len(index.docs), "tokens": len(index.tokens), "trigrams": len(index.trigrams)}
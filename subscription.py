@@ -1,32 +1,198 @@
-from database import get_channels, save_channels
-from datetime import datetime
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
 
-async def check_subscription(user_id: int, context) -> bool:
-    """Majburiy obunani tekshirish"""
+from database import get_channels as db_get_channels, add_channel as db_add_channel, remove_channel as db_remove_channel, run_db
+from database import get_channel_members, set_channel_member, prune_channel_members
+from cache import TTLCache
+from request_context import for_user
+from config import (
+    SUB_CACHE_SIZE, SUB_CACHE_TTL, SUB_NEGATIVE_TTL, CHANNELS_CACHE_TTL, MEMBER_INDEX_TTL,
+    MEMBER_PRUNE_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+# (channel_id, user_id) -> (obuna bo'lganmi, qachongacha ishoniladi - time.time()).
+# chat_member updatelari va tasdiqlangan obunalardan to'ldiriladi, channel_members
+# jadvalida saqlanadi. Muddati o'tgan yozuv yo'qdek - kanal qayta tekshiriladi.
+# run_db threadlaridan ham yoziladi - o'zgartirish va aylanib chiqish _members_lock ostida
+_members = {}
+_members_lock = threading.Lock()
+_prune_task = None
+
+# Indeksda yo'q foydalanuvchilar uchun get_chat_member natijalari. Obuna bo'lganlar
+# uzoqroq, bo'lmaganlar qisqa muddat saqlanadi - obuna bo'lgach tez o'tib ketishi uchun
+_membership = TTLCache(SUB_CACHE_SIZE, SUB_CACHE_TTL)
+
+# Majburiy kanallar ro'yxati - har xabarda DB ga bormaslik uchun
+_channels = {}
+_channels_loaded_at = None
+_channels_version = 0
+_channels_lock = threading.Lock()
+
+def _channels_fresh() -> bool:
+    return _channels_loaded_at is not None and time.monotonic() - _channels_loaded_at < CHANNELS_CACHE_TTL
+
+def get_channels() -> dict:
+    """Majburiy kanallar (keshdan, CHANNELS_CACHE_TTL soniyada bir yangilanadi)"""
+    global _channels, _channels_loaded_at, _channels_version
+    if _channels_fresh():
+        return _channels
+    channels = db_get_channels()
+    with _channels_lock:
+        if channels != _channels:
+            _channels_version += 1
+        _channels = channels
+        _channels_loaded_at = time.monotonic()
+    return _channels
+
+def channels_version() -> int:
+    """Kanallar ro'yxati o'zgarganda oshadi (klaviatura keshlari uchun)"""
+    return _channels_version
+
+def invalidate_channels():
+    global _channels_loaded_at
+    _channels_loaded_at = None
+
+def load_members() -> int:
+    """channel_members jadvalini xotiraga yuklash (startupda)"""
+    global _members
+    members = {
+        key: (subscribed, updated_at + MEMBER_INDEX_TTL)
+        for key, (subscribed, updated_at) in get_channel_members().items()
+    }
+    with _members_lock:
+        _members = members
+    return len(members)
+
+def prune_members() -> int:
+    """Muddati o'tgan yozuvlarni indeksdan va channel_members dan o'chirish (run_db orqali)"""
+    now = time.time()
+    with _members_lock:
+        expired = [key for key, (_, expires) in _members.items() if expires < now]
+        for key in expired:
+            del _members[key]
+    prune_channel_members(datetime.now() - timedelta(seconds=MEMBER_INDEX_TTL))
+    return len(expired)
+
+async def _prune_loop(interval: int):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_db(prune_members)
+        except Exception as e:
+            logger.error(f"Members prune error: {e}")
+
+def start_member_pruning(interval: int = MEMBER_PRUNE_INTERVAL):
+    """Davriy tozalashni ishga tushirish (event loop ichida chaqiriladi)"""
+    global _prune_task
+    if _prune_task is None or _prune_task.done():
+        _prune_task = asyncio.create_task(_prune_loop(interval))
+
+async def stop_member_pruning():
+    global _prune_task
+    if _prune_task is not None:
+        _prune_task.cancel()
+        try:
+            await _prune_task
+        except asyncio.CancelledError:
+            pass
+        _prune_task = None
+
+def _indexed(channel_id: str, user_id: int):
+    """Indeksdagi holat; yo'q yoki muddati o'tgan bo'lsa None"""
+    entry = _members.get((channel_id, user_id))
+    if entry is None or entry[1] < time.time():
+        return None
+    return entry[0]
+
+def channel_key(chat):
+    """Telegram chat -> channels jadvalidagi kalit (ID yoki @username), majburiy bo'lmasa None"""
     channels = get_channels()
+    if str(chat.id) in channels:
+        return str(chat.id)
+    if chat.username and f"@{chat.username}" in channels:
+        return f"@{chat.username}"
+    return None
+
+def is_member_status(member) -> bool:
+    if member.status in ['left', 'kicked']:
+        return False
+    # restricted foydalanuvchi kanalda bo'lmasligi ham mumkin
+    return getattr(member, "is_member", True) is not False
+
+def record_member(channel_id: str, user_id: int, subscribed: bool):
+    """Indeksni yangilash va DB ga yozish (run_db orqali chaqiring)"""
+    with _members_lock:
+        _members[(channel_id, user_id)] = (subscribed, time.time() + MEMBER_INDEX_TTL)
+    _membership.invalidate((user_id, channel_id))
+    set_channel_member(channel_id, user_id, subscribed)
+
+def _chat_id(channel_id: str):
+    # ID bo'lsa integer ga o'tkazamiz, aks holda username @channel ko'rinishida
+    return int(channel_id) if channel_id.lstrip('-').isdigit() else channel_id
+
+async def _probe(user_id: int, channel_id: str, context):
+    """Bitta kanalni Bot API orqali tekshirish. Xato bo'lsa None (keshlanmaydi)"""
+    try:
+        member = await context.bot.get_chat_member(_chat_id(channel_id), user_id)
+    except Exception as e:
+        print(f"Kanal tekshirish xatosi {channel_id}: {e}")
+        return None
+    subscribed = is_member_status(member)
+    if subscribed:
+        # Tasdiqlangan obuna indeksga yoziladi - chiqib ketsa chat_member update keladi,
+        # kelmay qolsa MEMBER_INDEX_TTL dan keyin qayta tekshiriladi
+        await run_db(record_member, channel_id, user_id, True)
+    else:
+        _membership.set((user_id, channel_id), False, SUB_NEGATIVE_TTL)
+    return subscribed
+
+async def check_subscription(user_id: int, context, force: bool = False) -> bool:
+    """Majburiy obunani tekshirish (bitta update ichida bir marta - natija kontekstda).
+    Avval a'zolar indeksi, keyin kesh; ikkalasida ham yo'q kanallar parallel
+    tekshiriladi. force=True - faqat obuna emas deb belgilanganlar qayta tekshiriladi
+    ("Obunani tekshirish" tugmasi), natija keyingi updatelar uchun eslab qolinadi."""
+    request = for_user(user_id)
+    if request is not None and request.subscribed is not None and not force:
+        return request.subscribed
+    subscribed = await _check_channels(user_id, context, force)
+    if request is not None:
+        request.subscribed = subscribed
+    return subscribed
+
+async def _check_channels(user_id: int, context, force: bool) -> bool:
+    channels = _channels if _channels_fresh() else await run_db(get_channels)
     if not channels:
         return True
-    
-    for channel_id, info in channels.items():
-        try:
-            # ID bo'lsa integer ga o'tkazamiz
-            if channel_id.lstrip('-').isdigit():
-                ch_id = int(channel_id)
-            else:
-                ch_id = channel_id  # Username @channel ko'rinishida
-            
-            member = await context.bot.get_chat_member(ch_id, user_id)
-            if member.status in ['left', 'kicked']:
-                return False
-        except Exception as e:
-            print(f"Kanal tekshirish xatosi {channel_id}: {e}")
-            continue
+
+    missing = []
+    for channel_id in channels:
+        cached = _indexed(channel_id, user_id)
+        if cached is None:
+            cached = _membership.get((user_id, channel_id))
+        if force and cached is False:
+            cached = None
+        if cached is False:
+            return False
+        if cached is None:
+            missing.append(channel_id)
+
+    if missing:
+        results = await asyncio.gather(*(_probe(user_id, cid, context) for cid in missing))
+        # Xato (None) bo'lgan kanal avvalgidek o'tkazib yuboriladi
+        if any(result is False for result in results):
+            return False
     return True
 
+def membership_stats() -> dict:
+    return _membership.stats()
+
 def add_channel(channel_id: str, name: str, invite_link: str = ""):
     """Kanal qo'shish - ID yoki username bo'lishi mumkin"""
-    channels = get_channels()
-    
     # Agar username bo'lsa (@ bilan boshlansa)
     if channel_id.startswith('@'):
         clean_id = channel_id
@@ -38,19 +204,17 @@ def add_channel(channel_id: str, name: str, invite_link: str = ""):
         clean_id = channel_id
     else:
         clean_id = channel_id
-    
-    channels[clean_id] = {
-        "name": name,
-        "invite_link": invite_link,
-        "added_at": datetime.now().isoformat()
-    }
-    save_channels(channels)
+
+    db_add_channel(clean_id, name, invite_link)
+    invalidate_channels()
 
 def remove_channel(channel_id: str) -> bool:
     """Kanal o'chirish"""
     channels = get_channels()
-    if channel_id in channels:
-        del channels[channel_id]
-        save_channels(channels)
+    if channel_id in channels and db_remove_channel(channel_id):
+        with _members_lock:
+            for key in [k for k in _members if k[0] == channel_id]:
+                del _members[key]
+        invalidate_channels()
         return True
     return False
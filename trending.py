@@ -0,0 +1,227 @@
+import heapq
+import threading
+import time
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+
+from catalog import get_catalog
+from config import TRENDING_TOP_K, TRENDING_HALF_LIFE_HOURS
+from database import get_hourly_views
+
+HOUR = 3600
+DAY_HOURS = 24
+WEEK_HOURS = 7 * 24
+# Forward decay og'irligi 2 ** shundan oshsa ballar qayta masshtablanadi (float chegarasidan uzoqda)
+_RESCALE_EXPONENT = 40
+
+# Ro'yxatlar: trending - vaqt o'tishi bilan so'nadigan ball (yangi ko'rishlar og'irroq),
+# popular - oxirgi 7 kun, top - umumiy ko'rishlar
+KINDS = ("trending", "popular", "top")
+
+# Joriy holat (TrendState). DB dan qayta yuklash yangi obyektda bajarilib keyin almashtiriladi
+_state = None
+# Oxirgi marta DB dan yuklangan soat
+_loaded_hour = None
+# Qayta yuklash davomidagi yetkazishlar [(kod, vaqt)] - yangi holatga qayta qo'shiladi
+_replay: Optional[List[Tuple[str, float]]] = None
+_lock = threading.Lock()
+
+def current_hour(now: float = None) -> int:
+    """Epoch soat (movie_views_hourly.hour)"""
+    return int((time.time() if now is None else now) // HOUR)
+
+def _subtract(scores: Dict[str, int], bucket: Dict[str, int]):
+    for code, count in bucket.items():
+        left = scores.get(code, 0) - count
+        if left > 0:
+            scores[code] = left
+        else:
+            scores.pop(code, None)
+
+class Leaderboard:
+    """Eng katta size ta ball. update - ball faqat oshganda (ko'pi bilan O(k)),
+    ranked - tayyor tartiblangan ro'yxat (O(k)). Ball kamaysa rebuild."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.top: Dict[str, float] = {}
+        self.floor = 0.0  # top to'la bo'lsa - undagi eng kichik ball
+        self._ranked: Optional[List[str]] = None
+
+    def update(self, code: str, score: float):
+        top = self.top
+        if code in top:
+            old = top[code]
+            top[code] = score
+            if old <= self.floor and len(top) >= self.size:
+                self.floor = min(top.values())
+        elif len(top) < self.size:
+            top[code] = score
+            if len(top) >= self.size:
+                self.floor = min(top.values())
+        elif score > self.floor:
+            del top[min(top, key=top.get)]
+            top[code] = score
+            self.floor = min(top.values())
+        else:
+            return
+        self._ranked = None
+
+    def rebuild(self, scores: Dict[str, float]):
+        self.top = dict(heapq.nlargest(self.size, scores.items(), key=itemgetter(1)))
+        self.floor = min(self.top.values()) if len(self.top) >= self.size else 0.0
+        self._ranked = None
+
+    def ranked(self) -> List[str]:
+        if self._ranked is None:
+            self._ranked = sorted(self.top, key=self.top.get, reverse=True)
+        return self._ranked
+
+class TrendState:
+    """buckets: soat -> {kod: ko'rishlar} (oxirgi WEEK_HOURS soat)
+    day / week: oxirgi 24 soat / 7 kun yig'indisi - soat almashganda eskirgan bucket ayriladi
+    decay: sum(2 ** ((t - base) / half_life)) - forward decay, ballar faqat oshadi
+    total: umumiy ko'rishlar (katalog + yangi ko'rishlar)"""
+
+    def __init__(self, hour: int, size: int = TRENDING_TOP_K, half_life: float = TRENDING_HALF_LIFE_HOURS):
+        self.hour = hour
+        self.half_life = half_life
+        self.base = float(hour - WEEK_HOURS)
+        self.buckets: Dict[int, Dict[str, int]] = {}
+        self.day: Dict[str, int] = {}
+        self.week: Dict[str, int] = {}
+        self.decay: Dict[str, float] = {}
+        self.total: Dict[str, int] = {}
+        self.boards = {kind: Leaderboard(size) for kind in KINDS}
+
+    def scores(self, kind: str) -> dict:
+        """Reyting shu ball bo'yicha"""
+        return {"trending": self.decay, "popular": self.week, "top": self.total}[kind]
+
+    def counts(self, kind: str) -> dict:
+        """Ro'yxatda ko'rsatiladigan son: trend uchun oxirgi 24 soat"""
+        return {"trending": self.day, "popular": self.week, "top": self.total}[kind]
+
+    def add(self, code: str, count: int, hour: int, at: float = None):
+        """hour soatidagi count ta ko'rish; at - aniq vaqt (soatlarda), bo'lmasa soat o'rtasi"""
+        if hour <= self.hour - WEEK_HOURS:
+            return
+        bucket = self.buckets.setdefault(hour, {})
+        bucket[code] = bucket.get(code, 0) + count
+        if hour > self.hour - DAY_HOURS:
+            self.day[code] = self.day.get(code, 0) + count
+        self.week[code] = self.week.get(code, 0) + count
+        at = hour + 0.5 if at is None else at
+        if (at - self.base) / self.half_life > _RESCALE_EXPONENT:
+            self._rescale(at)
+        self.decay[code] = self.decay.get(code, 0.0) + count * 2.0 ** ((at - self.base) / self.half_life)
+
+    def record(self, code: str, now: float):
+        """Bitta yetkazilgan kino: oynalar va top-k lar shu kod bo'yicha yangilanadi"""
+        hour = current_hour(now)
+        if hour > self.hour:
+            self.advance(hour)
+        self.add(code, 1, hour, now / HOUR)
+        self.total[code] = self.total.get(code, 0) + 1
+        for kind, board in self.boards.items():
+            board.update(code, self.scores(kind)[code])
+
+    def advance(self, hour: int):
+        """Soat almashdi: oynadan chiqqan bucketlarni ayirib, top-k larni qayta qurish"""
+        for bucket_hour in sorted(self.buckets):
+            if bucket_hour > hour - DAY_HOURS:
+                break
+            if bucket_hour > self.hour - DAY_HOURS:
+                _subtract(self.day, self.buckets[bucket_hour])
+            if bucket_hour <= hour - WEEK_HOURS:
+                _subtract(self.week, self.buckets.pop(bucket_hour))
+        self.hour = hour
+        self.rebuild()
+
+    def _rescale(self, at: float):
+        factor = 2.0 ** (-(at - self.base) / self.half_life)
+        for code in self.decay:
+            self.decay[code] *= factor
+        self.base = at
+        self.boards["trending"].rebuild(self.decay)
+
+    def rebuild(self):
+        for kind, board in self.boards.items():
+            board.rebuild(self.scores(kind))
+
+def _catalog_views() -> Dict[str, int]:
+    """Umumiy reyting boshlanishi - katalogdagi barcha kinolar (ko'rilmaganlari ham)"""
+    return {code: data.get("views") or 0 for code, data in get_catalog().items()}
+
+def build_state(rows: list, totals: Dict[str, int], pending: Dict[int, Dict[str, int]] = None,
+                now: float = None) -> TrendState:
+    """rows - [(code, hour, views)] (get_hourly_views), totals - umumiy ko'rishlar,
+    pending - DB ga hali yozilmagan ko'rishlar: soat -> {kod: soni}"""
+    now = time.time() if now is None else now
+    state = TrendState(current_hour(now))
+    for code, hour, views in rows:
+        state.add(code, views, hour)
+    for hour, counts in (pending or {}).items():
+        for code, count in counts.items():
+            state.add(code, count, hour)
+            totals[code] = totals.get(code, 0) + count
+    state.total = totals
+    state.rebuild()
+    return state
+
+def begin_reload():
+    """Bundan keyingi yetkazishlar eslab qolinadi va load_trending ularni yangi holatga
+    ham qo'shadi. pending nusxasi bilan bir vaqtda (view_counter lock ostida) chaqiriladi"""
+    global _replay
+    with _lock:
+        _replay = []
+
+def load_trending(pending: Dict[int, Dict[str, int]] = None) -> TrendState:
+    """Oxirgi 7 kunni DB dan qayta yuklash (bloklovchi - run_db orqali).
+    Soat almashganda qayta chaqiriladi - boshqa workerlarning ko'rishlari ham qo'shiladi"""
+    global _state, _loaded_hour, _replay
+    rows = get_hourly_views(current_hour() - WEEK_HOURS + 1)
+    state = build_state(rows, _catalog_views(), pending)
+    with _lock:
+        # Qurish paytida eski holatga yozilganlar
+        for code, at in _replay or ():
+            state.record(code, at)
+        _replay = None
+        _state = state
+        _loaded_hour = state.hour
+    return state
+
+def needs_reload() -> bool:
+    """Shu soatda DB dan hali yuklanmagan"""
+    return _loaded_hour != current_hour()
+
+def _current_state() -> TrendState:
+    global _state
+    if _state is None:
+        # load_trending hali chaqirilmagan - faqat katalogdagi umumiy ko'rishlar bilan
+        _state = build_state([], _catalog_views())
+    return _state
+
+def record_delivery(code: str):
+    """Kino yuborildi (view_counter.record_view, uning lock i ostida)"""
+    now = time.time()
+    with _lock:
+        _current_state().record(code, now)
+        if _replay is not None:
+            _replay.append((code, now))
+
+def ranking(kind: str) -> List[Tuple[str, int]]:
+    """Tayyor top-k: [(kod, ko'rsatiladigan son)], eng yuqorisi birinchi"""
+    with _lock:
+        state = _current_state()
+        hour = current_hour()
+        if hour > state.hour:
+            state.advance(hour)
+        counts = state.counts(kind)
+        return [(code, counts.get(code, 0)) for code in state.boards[kind].ranked()]
+
+def trending_stats() -> dict:
+    state = _state
+    if state is None:
+        return {"hour": None, "movies": 0, "buckets": 0}
+    return {"hour": state.hour, "movies": len(state.week), "buckets": len(state.buckets)}
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, Awaitable, Dict
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config import MAX_CONCURRENT_UPDATES
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Updatelar parallel ishlanadi, lekin bitta foydalanuvchining updatelari
+    kelgan tartibida, ketma-ket (limit, sevimlilar, context.user_data dagi
+    admin wizardlari buzilmasligi uchun).
+
+    Bazaviy semafor faqat qabul qilingan updatelar sonini cheklaydi; haqiqiy
+    parallellik foydalanuvchi lockidan KEYIN olinadigan semafor bilan - aks holda
+    bitta foydalanuvchining navbatda turgan updatelari boshqalarning joyini egallaydi.
+    """
+
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates * 4)
+        self.concurrency = max_concurrent_updates
+        self._active = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks: Dict[Any, list] = {}  # kalit -> [Lock, kutayotganlar soni]
+
+    @staticmethod
+    def _key(update: object):
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                return update.effective_user.id
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._key(update)
+        if key is None:
+            async with self._active:
+                await coroutine
+            return
+
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # asyncio.Lock kutganlarni FIFO tartibda uyg'otadi
+            async with entry[0]:
+                async with self._active:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(key, None)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "users": len(self._locks),
+            "waiting": sum(count for _, count in self._locks.values()) - len(self._locks),
+        }
@@ -1,6 +1,9 @@
 from datetime import datetime
-from database import get_users, save_users
+from typing import Optional
+from database import get_user, create_user, update_user, increment_user, consume_user_limit, get_admin_role
 from config import ADMIN_IDS
+from cache import user_state
+from request_context import for_user
 
 def is_admin(user_id: str) -> bool:
     return user_id in ADMIN_IDS
@@ -8,14 +11,62 @@ def is_admin(user_id: str) -> bool:
 def is_super_admin(user_id: str) -> bool:
     return ADMIN_IDS and user_id == ADMIN_IDS[0]
 
+def _build_state(user_id: str, user: dict) -> dict:
+    """Foydalanuvchi qatoridan holat. Admin roli user_state keshidan (bo'lmasa 1 so'rov)"""
+    cached = user_state.get(user_id)
+    if cached is None:
+        role = get_admin_role(user_id)
+        admin = user_id in ADMIN_IDS or role is not None
+        super_admin = bool(ADMIN_IDS and user_id == ADMIN_IDS[0]) or role == "super_admin"
+    else:
+        admin, super_admin = cached["admin"], cached["super_admin"]
+    state = {
+        "banned": bool(user.get("banned", False)),
+        "limit": user.get("limit", 0),
+        "admin": admin,
+        "super_admin": super_admin,
+    }
+    user_state.set(user_id, state)
+    return state
+
+def load_request_user(request) -> dict:
+    """Update boshida: foydalanuvchi qatori va holatini bir marta yuklash"""
+    request.user = get_user(request.user_id)
+    request.state = dict(_build_state(request.user_id, request.user or {}))
+    return request.state
+
+def get_current_user(user_id: str) -> dict:
+    """Joriy update uchun yuklangan qator (boshqa foydalanuvchi bo'lsa - DB dan)"""
+    request = for_user(user_id)
+    if request is not None and request.state is not None:
+        # Yuklangan, lekin qator yo'q bo'lsa ham qayta so'ramaymiz
+        return request.user if request.user is not None else {}
+    return get_user(user_id) or {}
+
+def _patch_request(user_id: str, **fields):
+    request = for_user(user_id)
+    if request is not None:
+        request.patch_user(**fields)
+
+def get_user_state(user_id: str) -> dict:
+    """Har bir update oldidan kerak bo'ladigan holat (banned, limit, admin, super_admin).
+    Joriy update kontekstidan, keyin keshdan, aks holda DB dan yuklanadi."""
+    request = for_user(user_id)
+    if request is not None and request.state is not None:
+        return request.state
+    state = user_state.get(user_id)
+    if state is None:
+        state = _build_state(user_id, get_user(user_id) or {})
+    return state
+
 def is_banned(user_id: str) -> bool:
-    users = get_users()
-    return users.get(user_id, {}).get("banned", False)
+    return get_user_state(user_id)["banned"]
 
 def get_or_create_user(user_id: str, username: str = None, first_name: str = None) -> dict:
-    users = get_users()
-    if user_id not in users:
-        users[user_id] = {
+    request = for_user(user_id)
+    user = request.user if request is not None and request.user is not None else get_user(user_id)
+    if user is None:
+        user = {
             "user_id": user_id,
             "username": username,
             "first_name": first_name,
@@ -27,68 +78,70 @@ def get_or_create_user(user_id: str, username: str = None, first_name: str = Non
             "history": [],
             "banned": False
         }
-        save_users(users)
+        create_user(user_id, **{k: v for k, v in user.items() if k != "user_id"})
+        # Keshdagi "qator yo'q" holatini yangi qator bilan almashtirish
+        state = _build_state(user_id, user)
+        if request is not None:
+            request.user = user
+            request.state = dict(state)
     else:
-        users[user_id]["last_activity"] = datetime.now().isoformat()
+        fields = {"last_activity": datetime.now().isoformat()}
         if username:
-            users[user_id]["username"] = username
+            fields["username"] = username
         if first_name:
-            users[user_id]["first_name"] = first_name
-        save_users(users)
-    return users[user_id]
-
-def check_limit(user_id: str) -> bool:
-    users = get_users()
-    user = users.get(user_id, {})
-    return user.get("limit", 0) > 0
+            fields["first_name"] = first_name
+        update_user(user_id, **fields)
+        user.update(fields)
+    return user
 
-def decrease_limit(user_id: str):
-    users = get_users()
-    if user_id in users and users[user_id]["limit"] > 0:
-        users[user_id]["limit"] -= 1
-        save_users(users)
+def consume_limit(user_id: str) -> Optional[int]:
+    """Limitdan bittasini yechish. Qolgan limit yoki tugagan bo'lsa None"""
+    remaining = consume_user_limit(user_id)
+    user_state.update(user_id, limit=remaining or 0)
+    _patch_request(user_id, limit=remaining or 0)
+    return remaining
 
 def add_limit(user_id: str, amount: int):
-    users = get_users()
-    if user_id in users:
-        users[user_id]["limit"] += amount
-        save_users(users)
+    increment_user(user_id, limit=amount)
+    user_state.invalidate(user_id)
+    request = for_user(user_id)
+    if request is not None and request.user is not None:
+        request.patch_user(limit=request.user.get("limit", 0) + amount)
 
 def add_referral(referrer_id: str):
-    users = get_users()
-    if referrer_id in users:
-        users[referrer_id]["referrals"] += 1
-        users[referrer_id]["limit"] += 5
-        save_users(users)
+    increment_user(referrer_id, referrals=1, limit=5)
+    user_state.invalidate(referrer_id)
 
 def add_to_history(user_id: str, movie_code: str):
-    users = get_users()
-    if user_id in users:
-        if movie_code not in users[user_id]["history"]:
-            users[user_id]["history"].insert(0, movie_code)
-            users[user_id]["history"] = users[user_id]["history"][:20]
-            save_users(users)
+    user = get_current_user(user_id)
+    if user:
+        history = list(user.get("history", []))
+        if movie_code not in history:
+            history.insert(0, movie_code)
+            update_user(user_id, history=history[:20])
+            _patch_request(user_id, history=history[:20])
 
 def toggle_favorite(user_id: str, movie_code: str) -> bool:
-    users = get_users()
-    if user_id in users:
-        if movie_code in users[user_id]["favorites"]:
-            users[user_id]["favorites"].remove(movie_code)
-            save_users(users)
+    user = get_current_user(user_id)
+    if user:
+        favorites = list(user.get("favorites", []))
+        if movie_code in favorites:
+            favorites.remove(movie_code)
+            update_user(user_id, favorites=favorites)
+            _patch_request(user_id, favorites=favorites)
             return False
         else:
-            users[user_id]["favorites"].append(movie_code)
-            save_users(users)
+            favorites.append(movie_code)
+            update_user(user_id, favorites=favorites)
+            _patch_request(user_id, favorites=favorites)
             return True
 
 def ban_user(user_id: str):
-    users = get_users()
-    if user_id in users:
-        users[user_id]["banned"] = True
-        save_users(users)
+    update_user(user_id, banned=True)
+    user_state.invalidate(user_id)
+    _patch_request(user_id, banned=True)
 
 def unban_user(user_id: str):
-    users = get_users()
-    if user_id in users:
-        users[user_id]["banned"] = False
-        save_users(users)
+    update_user(user_id, banned=False)
+    user_state.invalidate(user_id)
+    _patch_request(user_id, banned=False)
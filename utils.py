@@ -1,28 +1,40 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from database import get_users, get_movies, get_channels, is_admin_db, is_super_admin_db
-from config import ADMIN_IDS
+from subscription import get_channels, channels_version
+from users import get_user_state, get_current_user
+from catalog import get_catalog, catalog_version, views_version, catalog_page
 
 def is_admin(user_id: str) -> bool:
-    """Config va database'dan admin tekshirish"""
-    # Avval config'dan tekshirish
-    if user_id in ADMIN_IDS:
-        return True
-    # Keyin database'dan tekshirish
-    return is_admin_db(user_id)
+    """Config va database'dan admin tekshirish (user_state keshi orqali)"""
+    return get_user_state(user_id)["admin"]
 
 def is_super_admin(user_id: str) -> bool:
-    """Config va database'dan super admin tekshirish"""
-    # Config'dagi birinchi ID super admin
-    if ADMIN_IDS and user_id == ADMIN_IDS[0]:
-        return True
-    # Database'dan tekshirish
-    return is_super_admin_db(user_id)
+    """Config va database'dan super admin tekshirish (user_state keshi orqali)"""
+    return get_user_state(user_id)["super_admin"]
 
-# ... qolgan funksiyalar o'zgarishsiz qoladi
+# Tayyor klaviaturalar: nomi -> (versiya, {kalit: InlineKeyboardMarkup}).
+# Versiya (katalog / kanallar) o'zgarsa o'sha turdagi hammasi tashlanadi.
+# InlineKeyboardMarkup o'zgarmas obyekt - bir nechta xabarda ishlatish xavfsiz.
+_keyboards = {}
 
+def _memo(name: str, version, key, build) -> InlineKeyboardMarkup:
+    cached = _keyboards.get(name)
+    if cached is None or cached[0] != version:
+        cached = (version, {})
+        _keyboards[name] = cached
+    markup = cached[1].get(key)
+    if markup is None:
+        markup = cached[1][key] = build()
+    return markup
+
+def keyboard_cache_stats() -> dict:
+    return {name: len(entries) for name, (_, entries) in _keyboards.items()}
 
 def get_main_keyboard(user_id: str) -> InlineKeyboardMarkup:
-    """Asosiy menyu - Zamonaviy dizayn"""
+    """Asosiy menyu - Zamonaviy dizayn (admin / oddiy uchun bittadan)"""
+    admin = is_admin(user_id)
+    return _memo("main", None, admin, lambda: _build_main_keyboard(admin))
+
+def _build_main_keyboard(admin: bool) -> InlineKeyboardMarkup:
     buttons = [
         [InlineKeyboardButton("🎟 Мening limitim", callback_data="my_limit"),
          InlineKeyboardButton("🎬 Random film", callback_data="random_movie")],
@@ -36,15 +48,15 @@ def get_main_keyboard(user_id: str) -> InlineKeyboardMarkup:
         [InlineKeyboardButton("📊 Mening statistikam", callback_data="my_stats")]
     ]
     
-    if is_admin(user_id):
+    if admin:
         buttons.append([InlineKeyboardButton("🛠 Admin panel", callback_data="admin_panel")])
     
     return InlineKeyboardMarkup(buttons)
 
 def get_movie_keyboard(movie_code: str, user_id: str) -> InlineKeyboardMarkup:
     """Kino yuborilganda chiqqan tugmalar"""
-    users = get_users()
-    is_fav = movie_code in users.get(user_id, {}).get("favorites", [])
+    user = get_current_user(user_id)
+    is_fav = movie_code in user.get("favorites", [])
     fav_text = "💔 Olib tashlash" if is_fav else "❤️ Saqlash"
     fav_data = f"remove_fav_{movie_code}" if is_fav else f"add_fav_{movie_code}"
     
@@ -60,7 +72,10 @@ def get_movie_keyboard(movie_code: str, user_id: str) -> InlineKeyboardMarkup:
 
 def get_admin_keyboard(user_id: str = None) -> InlineKeyboardMarkup:
     """Admin panel - Super Admin uchun maxsus"""
-    
+    super_admin = bool(user_id and is_super_admin(user_id))
+    return _memo("admin", None, super_admin, lambda: _build_admin_keyboard(super_admin))
+
+def _build_admin_keyboard(super_admin: bool) -> InlineKeyboardMarkup:
     # Asosiy admin tugmalari
     buttons = [
         [InlineKeyboardButton("➕ Kino qo'shish", callback_data="add_movie"),
@@ -76,7 +91,7 @@ def get_admin_keyboard(user_id: str = None) -> InlineKeyboardMarkup:
     ]
     
     # Super Admin uchun qo'shimcha tugmalar
-    if user_id and is_super_admin(user_id):
+    if super_admin:
         buttons.append([
             InlineKeyboardButton("👑 Admin qo'shish", callback_data="add_admin"),
             InlineKeyboardButton("❌ Admin o'chirish", callback_data="remove_admin")
@@ -88,8 +103,11 @@ def get_admin_keyboard(user_id: str = None) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(buttons)
 
 def get_genres_keyboard() -> InlineKeyboardMarkup:
-    """Janrlar - Chiroyli dizayn"""
-    movies = get_movies()
+    """Janrlar - Chiroyli dizayn (katalog o'zgarguncha keshda)"""
+    return _memo("genres", catalog_version(), None, _build_genres_keyboard)
+
+def _build_genres_keyboard() -> InlineKeyboardMarkup:
+    movies = get_catalog()
     genres = list(set(m.get("genre", "🎬 Boshqa") for m in movies.values() if m.get("genre")))
     
     # Emoji tanlash
@@ -126,16 +144,44 @@ def get_genres_keyboard() -> InlineKeyboardMarkup:
     buttons.append([InlineKeyboardButton("🔙 Asosiy menyu", callback_data="main_menu")])
     return InlineKeyboardMarkup(buttons)
 
-def get_catalog_keyboard(page: int = 0) -> InlineKeyboardMarkup:
-    """Kino katalogi - Sahifalash"""
-    movies = get_movies()
-    movie_list = list(movies.items())
+def pagination_rows(items: list, start: int, total: int, per_page: int, jump, after: str, before: str,
+                    indicator: str = "ignore", cursor=str) -> list:
+    """Sahifa tugmalari: oldingi/keyingi - chetdagi kod bo'yicha (keyset),
+    jump(n) - n-sahifaga o'tish callbacki (1, ±10, oxirgi), cursor(kod) - callbackdagi ko'rinishi"""
+    if not items:
+        return []
+    page = start // per_page + 1
+    total_pages = max(1, (total + per_page - 1) // per_page)
+    rows = []
+
+    nav_buttons = []
+    if start > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Oldingi", callback_data=f"{before}{cursor(items[0][0])}"))
+    if total_pages > 1:
+        nav_buttons.append(InlineKeyboardButton(f"📄 {page}/{total_pages}", callback_data=indicator))
+    if start + len(items) < total:
+        nav_buttons.append(InlineKeyboardButton("Keyingi ➡️", callback_data=f"{after}{cursor(items[-1][0])}"))
+    if nav_buttons:
+        rows.append(nav_buttons)
+
+    if total_pages > 2:
+        targets = sorted({n for n in (1, page - 10, page + 10, total_pages) if 1 <= n <= total_pages and n != page})
+        labels = {1: "⏮ 1", total_pages: f"{total_pages} ⏭"}
+        rows.append([
+            InlineKeyboardButton(labels.get(n, f"⏪ {n}" if n < page else f"{n} ⏩"), callback_data=jump(n))
+            for n in targets
+        ])
+    return rows
+
+def get_catalog_keyboard(page: int = 0, after: str = None, before: str = None) -> InlineKeyboardMarkup:
+    """Kino katalogi - kod bo'yicha tartiblangan, keyset sahifalash.
+    Sahifalar katalog yoki ko'rishlar o'zgarguncha keshda"""
+    return _memo("catalog", (catalog_version(), views_version()), (page, after, before),
+                 lambda: _build_catalog_keyboard(page, after, before))
+
+def _build_catalog_keyboard(page: int, after: str, before: str) -> InlineKeyboardMarkup:
     per_page = 10
-    total_pages = (len(movie_list) + per_page - 1) // per_page
-    
-    start = page * per_page
-    end = start + per_page
-    current_movies = movie_list[start:end]
+    current_movies, start, total = catalog_page(after, before, page * per_page, per_page)
     
     buttons = []
     
@@ -148,27 +194,21 @@ def get_catalog_keyboard(page: int = 0) -> InlineKeyboardMarkup:
         text = f"🎬 {short_name} ({code}) 👁{views}"
         buttons.append([InlineKeyboardButton(text, callback_data=f"movie_{code}")])
     
-    # Navigatsiya tugmalari
-    nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Oldingi", callback_data=f"catalog_{page-1}"))
-    
-    # Sahifa raqami
-    if total_pages > 1:
-        nav_buttons.append(InlineKeyboardButton(f"📄 {page+1}/{total_pages}", callback_data="catalog_page"))
-    
-    if end < len(movie_list):
-        nav_buttons.append(InlineKeyboardButton("Keyingi ➡️", callback_data=f"catalog_{page+1}"))
-    
-    if nav_buttons:
-        buttons.append(nav_buttons)
+    # Navigatsiya tugmalari (catalog_{n} - 0 dan boshlanadi)
+    buttons.extend(pagination_rows(
+        current_movies, start, total, per_page, lambda n: f"catalog_{n - 1}",
+        after="catalog_n_", before="catalog_p_", indicator="catalog_page"
+    ))
     
     buttons.append([InlineKeyboardButton("🔙 Asosiy menyu", callback_data="main_menu")])
     return InlineKeyboardMarkup(buttons)
 
 def get_subscription_keyboard() -> InlineKeyboardMarkup:
-    """Majburiy obuna - Chiroyli"""
+    """Majburiy obuna - Chiroyli (kanallar ro'yxati o'zgarguncha keshda)"""
     channels = get_channels()
+    return _memo("subscription", channels_version(), None, lambda: _build_subscription_keyboard(channels))
+
+def _build_subscription_keyboard(channels: dict) -> InlineKeyboardMarkup:
     buttons = []
     
     if not channels:
@@ -194,6 +234,9 @@ def get_subscription_keyboard() -> InlineKeyboardMarkup:
 def get_channels_keyboard() -> InlineKeyboardMarkup:
     """Kanallar boshqaruvi"""
     channels = get_channels()
+    return _memo("channels", channels_version(), None, lambda: _build_channels_keyboard(channels))
+
+def _build_channels_keyboard(channels: dict) -> InlineKeyboardMarkup:
     buttons = []
     
     if not channels:
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import threading
+from typing import Dict
+
+from config import VIEWS_FLUSH_INTERVAL
+from database import add_movie_views, prune_hourly_views, run_db
+from catalog import apply_views
+from trending import WEEK_HOURS, current_hour, needs_reload, begin_reload, load_trending, record_delivery
+
+logger = logging.getLogger(__name__)
+
+# Hali DB ga yozilmagan ko'rishlar: kod -> soni
+_pending: Dict[str, int] = {}
+# Xuddi shular ko'rilgan soati bo'yicha (trend uchun): soat -> {kod: soni}
+_pending_hours: Dict[int, Dict[str, int]] = {}
+_lock = threading.Lock()
+_flush_task = None
+
+def record_view(movie_code: str):
+    """Ko'rishni xotirada hisoblash (DB so'rovisiz)"""
+    with _lock:
+        _pending[movie_code] = _pending.get(movie_code, 0) + 1
+        bucket = _pending_hours.setdefault(current_hour(), {})
+        bucket[movie_code] = bucket.get(movie_code, 0) + 1
+        # Shu lock ostida - reload_trending dagi pending nusxasi bilan to'qnashmaydi
+        record_delivery(movie_code)
+
+def _merge(target: Dict[str, int], counts: Dict[str, int]):
+    for code, count in counts.items():
+        target[code] = target.get(code, 0) + count
+
+def flush_views() -> int:
+    """Yig'ilgan ko'rishlarni (soatlik bo'linishi bilan) bitta tranzaksiyada DB ga yozish"""
+    global _pending, _pending_hours
+    with _lock:
+        batch, _pending = _pending, {}
+        hours, _pending_hours = _pending_hours, {}
+    if batch and not add_movie_views(batch, hours):
+        # Yozilmadi - keyingi urinishda qayta yuborish uchun qaytarib qo'yamiz
+        with _lock:
+            _merge(_pending, batch)
+            for hour, counts in hours.items():
+                _merge(_pending_hours.setdefault(hour, {}), counts)
+        return 0
+    if batch:
+        apply_views(batch)
+    if needs_reload():
+        reload_trending()
+    return sum(batch.values())
+
+def reload_trending():
+    """Yangi soat: eskirgan soatlik qatorlarni o'chirib, trend oynalarini DB dan qayta
+    yig'ish (boshqa workerlarniki ham). Bloklovchi - flush_views ichida"""
+    prune_hourly_views(current_hour() - WEEK_HOURS + 1)
+    with _lock:
+        pending = {hour: dict(counts) for hour, counts in _pending_hours.items()}
+        begin_reload()
+    load_trending(pending)
+
+async def _flush_loop(interval: int):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_db(flush_views)
+        except Exception as e:
+            logger.error(f"Views flush error: {e}")
+
+def start_flush_loop(interval: int = VIEWS_FLUSH_INTERVAL):
+    """Davriy yozishni ishga tushirish (event loop ichida chaqiriladi)"""
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_loop(interval))
+
+async def stop_flush_loop():
+    """Davriy yozishni to'xtatib, qolgan ko'rishlarni yozish"""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    await run_db(flush_views)
@@ -0,0 +1,178 @@
+"""Webhook rejimini lokal o'lchash.
+
+Soxta Bot API server ko'taradi, bot.py ni webhook rejimida (SQLite bilan) ishga
+tushiradi, sintetik /start updatelarini POST qiladi va update yuborilgandan
+botning sendMessage javobi kelguncha bo'lgan vaqtni o'lchaydi.
+
+    python webhook_harness.py --count 500 --concurrency 50
+
+Tayyor ishlab turgan botga (masalan load balancer ortida) yuborish uchun:
+
+    python webhook_harness.py --no-spawn --webhook http://host:8443/telegram --secret ...
+    (bot BOT_API_URL=http://<harness>:8081/bot bilan ishga tushirilgan bo'lishi kerak)
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.web import Application, RequestHandler
+
+FAKE_TOKEN = "123456789:HARNESS_TOKEN_abcdefghijklmnopqrstuv"
+BOT_USER = {"id": 123456789, "is_bot": True, "first_name": "Harness", "username": "harness_bot"}
+
+# chat_id -> javob kutayotgan future
+_waiting = {}
+_message_id = 0
+
+def _message(chat_id) -> dict:
+    global _message_id
+    _message_id += 1
+    return {
+        "message_id": _message_id,
+        "date": int(time.time()),
+        "chat": {"id": int(chat_id), "type": "private"},
+        "text": "ok",
+    }
+
+class FakeBotApi(RequestHandler):
+    """Bot API metodlariga minimal javoblar"""
+
+    def post(self, token, method):
+        params = {k: self.get_argument(k) for k in self.request.arguments}
+        if not params and self.request.body:
+            try:
+                params = json.loads(self.request.body)
+            except ValueError:
+                params = {}
+        chat_id = params.get("chat_id")
+
+        if method == "getMe":
+            result = BOT_USER
+        elif method in ("sendMessage", "forwardMessage", "sendDocument", "sendPhoto"):
+            result = _message(chat_id)
+            future = _waiting.pop(str(chat_id), None)
+            if future is not None and not future.done():
+                future.set_result(time.perf_counter())
+        elif method == "copyMessage":
+            result = {"message_id": _message(chat_id)["message_id"]}
+        elif method == "getChatMember":
+            result = {"status": "member", "user": {"id": int(params.get("user_id", 0)), "is_bot": False, "first_name": "U"}}
+        else:
+            result = True
+        self.write({"ok": True, "result": result})
+
+def _start_update(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Test"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+async def _send_one(client, args, update_id: int, user_id: int):
+    future = asyncio.get_running_loop().create_future()
+    _waiting[str(user_id)] = future
+    request = HTTPRequest(
+        args.webhook, method="POST",
+        body=json.dumps(_start_update(update_id, user_id)),
+        headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": args.secret},
+    )
+    started = time.perf_counter()
+    response = await client.fetch(request, raise_error=False)
+    if response.code != 200:
+        _waiting.pop(str(user_id), None)
+        return None, response.code
+    try:
+        replied = await asyncio.wait_for(future, args.timeout)
+    except asyncio.TimeoutError:
+        _waiting.pop(str(user_id), None)
+        return None, "timeout"
+    return replied - started, 200
+
+async def _wait_for_port(host: str, port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return True
+        except OSError:
+            await asyncio.sleep(0.2)
+    return False
+
+def _percentile(values, p):
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+async def main(args):
+    Application([(r"/bot([^/]+)/(\w+)", FakeBotApi)]).listen(args.api_port, "127.0.0.1")
+
+    bot = None
+    if not args.no_spawn:
+        env = dict(
+            os.environ,
+            BOT_TOKEN=FAKE_TOKEN,
+            BOT_MODE="webhook",
+            BOT_API_URL=f"http://127.0.0.1:{args.api_port}/bot",
+            # Soxta API setWebhook ga True qaytaradi
+            WEBHOOK_URL=f"http://127.0.0.1:{args.webhook_port}",
+            WEBHOOK_LISTEN="127.0.0.1",
+            WEBHOOK_PORT=str(args.webhook_port),
+            WEBHOOK_PATH="telegram",
+            WEBHOOK_SECRET=args.secret,
+            DB_BACKEND="sqlite",
+            SQLITE_PATH=os.path.join(tempfile.mkdtemp(), "harness.db"),
+        )
+        bot = subprocess.Popen([sys.executable, "bot.py"], env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+        args.webhook = f"http://127.0.0.1:{args.webhook_port}/telegram"
+        if not await _wait_for_port("127.0.0.1", args.webhook_port, 30):
+            bot.terminate()
+            sys.exit("Bot webhook porti ochilmadi")
+
+    client = AsyncHTTPClient(max_clients=args.concurrency)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run(i):
+        async with semaphore:
+            return await _send_one(client, args, i + 1, 1_000_000 + i)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run(i) for i in range(args.count)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(r[0] * 1000 for r in results if r[0] is not None)
+    errors = [r[1] for r in results if r[0] is None]
+    print(f"Updatelar: {args.count}, javob: {len(latencies)}, xato: {len(errors)} {sorted(set(map(str, errors)))}")
+    print(f"Throughput: {args.count / elapsed:.1f} update/s")
+    if latencies:
+        print(
+            f"Latency ms: p50={_percentile(latencies, 50):.1f} p95={_percentile(latencies, 95):.1f} "
+            f"p99={_percentile(latencies, 99):.1f} max={latencies[-1]:.1f}"
+        )
+
+    if bot is not None:
+        bot.terminate()
+        bot.wait(10)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Webhook update -> javob latency o'lchovi")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--webhook-port", type=int, default=8443)
+    parser.add_argument("--webhook", default="")
+    parser.add_argument("--secret", default="harness-secret")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--no-spawn", action="store_true", help="bot.py ni ishga tushirmaslik")
+    asyncio.run(main(parser.parse_args()))